@@ -1,8 +1,40 @@
 #
 
-"""deptree app."""
+"""deptree app.
+
+The public names are imported on first access, so that the command line
+interface starts without importing the library.
+"""
+
+from __future__ import annotations
+
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from . import cli
+    from ._api import DependencyGraph
+    from ._api import UnknownProject
+
+__all__ = ['DependencyGraph', 'UnknownProject', 'cli']
+
+# Module of each public name that is not a module itself
+_MODULE_NAMES = {
+    'DependencyGraph': '._api',
+    'UnknownProject': '._api',
+}
+_SUBMODULE_NAMES = ('cli', )
+
+
+def __getattr__(name: str) -> object:
+    """Import the public name on first access."""
+    if name in _SUBMODULE_NAMES:
+        return importlib.import_module(f'.{name}', __name__)
+    module_name = _MODULE_NAMES.get(name, None)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(module_name, __name__)
+    return typing.cast(object, getattr(module, name))
 
-from . import _meta
-from . import cli
 
 # EOF
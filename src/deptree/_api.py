@@ -0,0 +1,196 @@
+#
+
+"""Graph of the installed projects, for use as a library."""
+
+from __future__ import annotations
+
+import typing
+
+from . import _core
+from . import _importlib_metadata
+from . import _reachability
+from . import _snapshot
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+
+class UnknownProject(_core.DeptreeException):
+    """Project not in the graph."""
+
+
+class DependencyGraph:
+    """Installed projects and their dependencies, discovered only once.
+
+    All queries are answered from the graph in memory. The reachability
+    index of each direction is built on the first transitive query, and the
+    cycles are found on the first query, so that repeated queries do not
+    walk the graph again.
+    """
+
+    def __init__(self, distributions: _core.Distributions) -> None:
+        """Initialize."""
+        self._distributions = distributions
+        self._indexes: typing.Dict[bool, typing.List[int]] = {}
+        self._cycles: typing.Optional[typing.List[typing.List[_core.ProjectKey]
+                                                  ]] = None
+
+    @classmethod
+    def from_importlib_metadata(
+        cls,
+        is_cached: bool = True,
+    ) -> DependencyGraph:
+        """Discover the installed projects with ``importlib.metadata``."""
+        (distributions, _) = _importlib_metadata.discover([], False, is_cached)
+        return cls(distributions)
+
+    @classmethod
+    def from_pkg_resources(cls) -> DependencyGraph:
+        """Discover the installed projects with ``pkg_resources``."""
+        # Import only on demand, since importing is slow
+        from . import _pkg_resources  # pylint: disable=import-outside-toplevel
+        (distributions, _) = _pkg_resources.discover([], False)
+        return cls(distributions)
+
+    @classmethod
+    def from_snapshot(cls, file_path: str) -> DependencyGraph:
+        """Read the projects from a snapshot, see ``--save-snapshot``."""
+        return cls(_snapshot.SnapshotGraph(file_path))
+
+    def __contains__(self, project_name: object) -> bool:
+        """Tell if the project is in the graph, installed or not."""
+        return (
+            isinstance(project_name, str)
+            and _importlib_metadata.get_project_key(project_name)
+            in self._distributions
+        )
+
+    def __iter__(self) -> collections.abc.Iterator[_core.ProjectKey]:
+        """Iterate over the keys of the projects, installed or not."""
+        return iter(self._distributions)
+
+    def __len__(self) -> int:
+        """Get the count of projects, installed or not."""
+        return len(self._distributions)
+
+    def _get_id(self, project_name: str) -> int:
+        node_id = self._distributions.get_id(
+            _importlib_metadata.get_project_key(project_name),
+        )
+        if node_id is None:
+            raise UnknownProject(project_name)
+        return node_id
+
+    def _get_requirements(
+        self,
+        edges_ids: collections.abc.Iterable[int],
+    ) -> collections.abc.Iterator[_core.Requirement]:
+        # The same dependency can be found more than once in the dependents
+        for edge_id in dict.fromkeys(edges_ids, True):
+            yield _core.get_requirement(self._distributions, edge_id)
+
+    def _get_closure(
+        self,
+        project_names: typing.Tuple[str, ...],
+        is_reverse: bool,
+    ) -> collections.abc.Iterator[_core.ProjectKey]:
+        node_ids = [
+            self._get_id(project_name) for project_name in project_names
+        ]
+        index = self._indexes.get(is_reverse, None)
+        if index is None:
+            index = _reachability.build(self._distributions, is_reverse)
+            self._indexes[is_reverse] = index
+        reached = _reachability.get_reached(index, node_ids)
+        return (
+            self._distributions.get_key(node_id)
+            for node_id in _reachability.iter_ids(reached)
+        )
+
+    def get_distribution(self, project_name: str) -> _core.Distribution:
+        """Get the distribution of the project."""
+        self._get_id(project_name)
+        return typing.cast(
+            _core.Distribution,
+            _core.get_distribution(
+                self._distributions,
+                _importlib_metadata.get_project_key(project_name),
+            ),
+        )
+
+    def dependencies(
+        self,
+        project_name: str,
+    ) -> collections.abc.Iterator[_core.Requirement]:
+        """Iterate over the requirements of the project."""
+        return self._get_requirements(
+            self._distributions.get_dependencies_edges(
+                self._get_id(project_name),
+            ),
+        )
+
+    def dependents(
+        self,
+        project_name: str,
+    ) -> collections.abc.Iterator[_core.Requirement]:
+        """Iterate over the requirements of other projects on the project."""
+        return self._get_requirements(
+            self._distributions.get_dependents_edges(
+                self._get_id(project_name),
+            ),
+        )
+
+    def transitive_dependencies(
+        self,
+        project_name: str,
+        *project_names: str,
+    ) -> collections.abc.Iterator[_core.ProjectKey]:
+        """Iterate over the keys of all the projects the projects need.
+
+        A project given is listed only if another one of them needs it.
+        """
+        return self._get_closure((project_name, *project_names), False)
+
+    def transitive_dependents(
+        self,
+        project_name: str,
+        *project_names: str,
+    ) -> collections.abc.Iterator[_core.ProjectKey]:
+        """Iterate over the keys of all the projects that need the projects.
+
+        A project given is listed only if it needs another one of them.
+        """
+        return self._get_closure((project_name, *project_names), True)
+
+    def conflicts(self) -> collections.abc.Iterator[_core.Requirement]:
+        """Iterate over the requirements not satisfied by the version."""
+        distributions = self._distributions
+        for node_id in range(len(distributions)):
+            node = distributions.get_node(node_id)
+            if node.conflicts:
+                yield from self._get_requirements(
+                    edge_id
+                    for edge_id in distributions.get_dependents_edges(node_id)
+                    if distributions.get_dependent_id(edge_id) in
+                    node.conflicts
+                )
+
+    def missing(self) -> collections.abc.Iterator[_core.Requirement]:
+        """Iterate over the requirements on projects not installed."""
+        distributions = self._distributions
+        for node_id in range(len(distributions)):
+            if not distributions.get_node(node_id).found:
+                yield from self._get_requirements(
+                    distributions.get_dependents_edges(node_id),
+                )
+
+    def cycles(
+        self,
+    ) -> collections.abc.Iterator[typing.List[_core.ProjectKey]]:
+        """Iterate over the cycles, each as the list of its project keys."""
+        if self._cycles is None:
+            self._cycles = _core.find_cycles(self._distributions)
+        return (list(cycle) for cycle in self._cycles)
+
+
+# EOF
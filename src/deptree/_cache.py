@@ -0,0 +1,255 @@
+#
+
+"""Persistent cache of the metadata of the installed distributions."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import typing
+
+from . import _markers
+
+if typing.TYPE_CHECKING:
+    Stamp = typing.Tuple[int, int]
+    Entry = typing.Tuple[Stamp, object]
+
+CACHE_FORMAT_VERSION = 1
+
+# The entries, and their stamps, are stored as pairs
+_PAIR_SIZE = 2
+
+
+def get_stamp(stat_result: os.stat_result) -> Stamp:
+    """Get the stamp used to detect a change of a metadata path."""
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def get_cache_file_path(
+    path_items: typing.Optional[typing.Sequence[str]] = None,
+) -> str:
+    """Get the path of the cache file for the current environment.
+
+    With path items, the cache file is the one for the distributions found
+    in these path items instead of ``sys.path``.
+    """
+    cache_home = (
+        os.environ.get('XDG_CACHE_HOME')
+        or os.path.join(os.path.expanduser('~'), '.cache')
+    )
+    environment = [sys.prefix, sys.executable, sys.version]
+    if path_items is not None:
+        environment.extend(path_items)
+    # The records depend on the environment the markers are evaluated for
+    target_environment = _markers.get_target_environment()
+    if target_environment is not None:
+        environment.append(json.dumps(target_environment, sort_keys=True))
+    environment_json = json.dumps(environment)
+    digest = hashlib.sha256(environment_json.encode('utf_8')).hexdigest()
+    return os.path.join(cache_home, 'deptree', f'{digest[:16]}.json')
+
+
+def _as_pair(value: object) -> typing.Optional[typing.Tuple[object, object]]:
+    #
+    pair = None
+    if isinstance(value, list):
+        items = typing.cast('typing.List[object]', value)
+        if len(items) == _PAIR_SIZE:
+            pair = (items[0], items[1])
+    return pair
+
+
+def _parse_entry(value: object) -> typing.Optional[Entry]:
+    #
+    entry = None
+    pair = _as_pair(value)
+    stamp = None if pair is None else _as_pair(pair[0])
+    if pair is not None and stamp is not None:
+        (mtime_ns, size) = stamp
+        if isinstance(mtime_ns, int) and isinstance(size, int):
+            entry = ((mtime_ns, size), pair[1])
+    return entry
+
+
+def _parse_content(content: object) -> typing.Dict[str, Entry]:
+    """Get the entries of the content of a cache file.
+
+    Content that is not as expected, for example written by hand or by
+    another version, is an empty cache, as is content that is not JSON.
+    """
+    entries: typing.Dict[str, typing.Optional[Entry]] = {}
+    if isinstance(content, dict):
+        content_dict = typing.cast('typing.Dict[str, object]', content)
+        values = content_dict.get('entries', None)
+        is_current = content_dict.get('version') == CACHE_FORMAT_VERSION
+        if is_current and isinstance(values, dict):
+            values_dict = typing.cast('typing.Dict[str, object]', values)
+            entries = {
+                metadata_path: _parse_entry(value)
+                for (metadata_path, value) in values_dict.items()
+            }
+    valid_entries = {
+        metadata_path: entry
+        for (metadata_path, entry) in entries.items() if entry is not None
+    }
+    return valid_entries if len(valid_entries) == len(entries) else {}
+
+
+class SharedRecords(typing.Dict[str, object]):
+    """Records keyed by content, shared between processes by a manager.
+
+    The records are got and updated in batches, each call to the manager
+    being a round trip between processes.
+    """
+
+    def get_many(
+        self,
+        content_keys: typing.List[str],
+    ) -> typing.Dict[str, object]:
+        """Get the records for the contents, the ones that are known."""
+        return {
+            content_key: self[content_key]
+            for content_key in content_keys if content_key in self
+        }
+
+
+class MetadataCache:
+    """Cache of metadata records keyed by metadata path.
+
+    An entry is valid only as long as the modification time and the size of
+    its metadata path do not change. Without a cache file, the entries are
+    only kept in memory. Records can also be shared by content, for example
+    between processes, whatever their metadata path. The shared records are
+    fetched at once, and the new ones are shared when saving.
+    """
+
+    def __init__(
+        self,
+        file_path: typing.Optional[str],
+        shared_records: typing.Optional[SharedRecords] = None,
+    ) -> None:
+        """Initialize."""
+        self._file_path = file_path
+        self._shared_records = shared_records
+        # Content key, and shared record if any, of each metadata path
+        self._shared_entries: typing.Dict[
+            str,
+            typing.Tuple[str, typing.Optional[object]],
+        ] = {}
+        self._new_shared_records: typing.Dict[str, object] = {}
+        self._entries: typing.Dict[str, Entry] = {}
+        self._used_entries: typing.Dict[str, Entry] = {}
+        self._is_modified = False
+
+    def load(self) -> None:
+        """Load the entries from the cache file, if any."""
+        text = '{}'
+        if self._file_path is not None:
+            try:
+                text = pathlib.Path(self._file_path
+                                    ).read_text(encoding='utf_8', )
+            except OSError:
+                pass
+        content: object = None
+        try:
+            content = json.loads(text)
+        except ValueError:
+            pass
+        self._entries = _parse_content(content)
+
+    def get(self, metadata_path: str, stamp: Stamp) -> typing.Optional[object]:
+        """Get the record for the metadata path, if it is still valid."""
+        record = None
+        entry = self._entries.get(metadata_path, None)
+        if entry is not None and entry[0] == stamp:
+            record = entry[1]
+            self._used_entries[metadata_path] = entry
+        return record
+
+    def set(self, metadata_path: str, stamp: Stamp, record: object) -> None:
+        """Set the record for the metadata path."""
+        entry = (stamp, record)
+        self._entries[metadata_path] = entry
+        self._used_entries[metadata_path] = entry
+        self._is_modified = True
+
+    def is_shared(self) -> bool:
+        """Tell if the records are shared by content."""
+        return self._shared_records is not None
+
+    def fetch_shared(self, content_keys: typing.Dict[str, str]) -> None:
+        """Fetch the shared records for the content of the metadata paths."""
+        records: typing.Dict[str, object] = {}
+        if self._shared_records is not None and content_keys:
+            records = self._shared_records.get_many(
+                list(content_keys.values()),
+            )
+        for (metadata_path, content_key) in content_keys.items():
+            self._shared_entries[metadata_path] = (
+                content_key,
+                records.get(content_key, None),
+            )
+
+    def get_shared(self, metadata_path: str) -> typing.Optional[object]:
+        """Get the shared record for the content of the metadata path."""
+        record = None
+        shared_entry = self._shared_entries.get(metadata_path, None)
+        if shared_entry is not None:
+            record = shared_entry[1]
+        return record
+
+    def set_shared(self, metadata_path: str, record: object) -> None:
+        """Set the record for the content, it is shared when saving."""
+        shared_entry = self._shared_entries.get(metadata_path, None)
+        if shared_entry is not None:
+            content_key = shared_entry[0]
+            self._shared_entries[metadata_path] = (content_key, record)
+            self._new_shared_records[content_key] = record
+
+    def save(self) -> None:
+        """Write the entries used since loading (or saving) to the cache file.
+
+        The file is written only if it would change, entries that were not
+        used are dropped. The new records are shared, all at once.
+        """
+        if self._shared_records is not None and self._new_shared_records:
+            self._shared_records.update(self._new_shared_records)
+            self._new_shared_records = {}
+        is_changed = (self._is_modified or self._used_entries != self._entries)
+        if self._file_path is not None and is_changed:
+            content = {
+                'version': CACHE_FORMAT_VERSION,
+                'entries': self._used_entries,
+            }
+            try:
+                self._write(
+                    self._file_path,
+                    json.dumps(content, separators=(',', ':')),
+                )
+            except OSError:
+                pass
+            self._is_modified = False
+        # The entries are only used again if they are found again
+        self._entries = self._used_entries
+        self._used_entries = {}
+
+    @staticmethod
+    def _write(file_path: str, text: str) -> None:
+        directory_path = os.path.dirname(file_path)
+        os.makedirs(directory_path, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            'w',
+            delete=False,
+            dir=directory_path,
+            encoding='utf_8',
+            suffix='.tmp',
+        ) as file_:
+            file_.write(text)
+        os.replace(file_.name, file_path)
+
+
+# EOF
@@ -0,0 +1,952 @@
+#
+
+"""Implementation independent of the distributions discovery backend."""
+
+from __future__ import annotations
+
+import copy
+import dataclasses
+import enum
+import functools
+import itertools
+import sys
+import typing
+
+from . import _json
+from . import _output
+from . import _pruning
+from . import _timings
+from . import _traversal
+from . import _versions
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    from . import _graph
+    #
+    Extra = typing.NewType('Extra', str)
+    Extras = typing.Tuple[Extra, ...]
+    ProjectKey = typing.NewType('ProjectKey', str)
+    ProjectLabel = typing.NewType('ProjectLabel', str)
+    ProjectVersion = typing.NewType('ProjectVersion', str)
+    #
+    Distributions = _graph.Graph
+    Requirements = typing.NewType(
+        'Requirements',
+        typing.Dict[ProjectKey, 'Requirement'],
+    )
+    Selection = typing.NewType(
+        'Selection',
+        typing.Dict[ProjectKey, 'Requirement'],
+    )
+    Step = typing.Tuple[int, int, typing.Optional[int], bool]
+
+INDENTATION = 2
+
+
+class DeptreeException(Exception):
+    """Base exception."""
+
+
+class ImpossibleCase(DeptreeException):
+    """Impossible case."""
+
+
+class UnknownDistributionInChain(ImpossibleCase):
+    """Distribution not found although it is in chain."""
+
+
+class InvalidForwardRequirement(ImpossibleCase):
+    """Invalid forward requirement."""
+
+
+class InvalidReverseRequirement(ImpossibleCase):
+    """Invalid reverse requirement."""
+
+
+@dataclasses.dataclass
+class Requirement:
+    """Dependency requirement."""
+
+    dependent_project_key: typing.Optional[ProjectKey]
+    dependency_project_key: typing.Optional[ProjectKey]
+    extras: Extras
+    str_repr: str
+    specifier: str = ''
+
+
+@dataclasses.dataclass
+class Distribution:
+    """Distribution of a specific project for a specific version."""
+
+    conflicts: typing.List[ProjectKey] = (
+        dataclasses.field(default_factory=list)
+    )
+    dependencies: Requirements = typing.cast(
+        'Requirements',
+        dataclasses.field(default_factory=dict),
+    )
+    dependents: typing.List[ProjectKey] = (
+        dataclasses.field(default_factory=list)
+    )
+    found: bool = False
+    project_name: typing.Optional[ProjectLabel] = None
+    version: typing.Optional[ProjectVersion] = None
+
+
+@dataclasses.dataclass
+class Options:
+    """Options of the selection and display of the distributions."""
+
+    excluded_patterns: typing.Tuple[str, ...] = ()
+    is_compact: bool = False
+    is_cycles: bool = False
+    is_flat: bool = False
+    is_reverse: bool = False
+    max_depth: typing.Optional[int] = None
+    output_format: str = _output.FORMAT_TEXT
+
+
+class Status(enum.Enum):
+    """State of a project reached while rendering."""
+
+    CIRCULAR = 'circular'
+    CONFLICT = 'conflict'
+    FOUND = 'found'
+    MISSING = 'missing'
+    REPEATED = 'repeated'
+    UNKNOWN = 'unknown'
+
+
+@dataclasses.dataclass
+class Entry:
+    """Project reached while rendering, with the requirement leading to it."""
+
+    depth: int
+    parent_key: typing.Optional[ProjectKey]
+    project_key: ProjectKey
+    project_label: typing.Optional[ProjectLabel]
+    requirement: Requirement
+    status: Status
+    version: typing.Optional[ProjectVersion]
+
+
+def _format_conflict(entry: Entry) -> str:
+    #
+    return (
+        f"{' ' * INDENTATION * entry.depth}"
+        f"{entry.project_label}=={entry.version}"
+        f"  # !!! CONFLICT {entry.requirement.str_repr}"
+    )
+
+
+def _format_circular(entry: Entry) -> str:
+    #
+    return (
+        f"{' ' * INDENTATION * entry.depth}"
+        f"{entry.project_label}"
+        f"  # !!! CIRCULAR {entry.requirement.str_repr}"
+    )
+
+
+def _format_flat(entry: Entry) -> str:
+    #
+    return f"{entry.project_label}=={entry.version}"
+
+
+def _format_flat_dependency(entry: Entry) -> str:
+    #
+    return f"# {entry.requirement.str_repr}"
+
+
+def _format_flat_dependent(entry: Entry) -> str:
+    #
+    return f"# {entry.project_label}: {entry.requirement.str_repr}"
+
+
+def _format_good(entry: Entry) -> str:
+    #
+    return (
+        f"{' ' * INDENTATION * entry.depth}"
+        f"{entry.project_label}=={entry.version}"
+        f"  # {entry.requirement.str_repr}"
+    )
+
+
+def _format_missing(entry: Entry) -> str:
+    #
+    return (
+        f"{' ' * INDENTATION * entry.depth}"
+        f"{entry.project_key}"
+        f"  # !!! MISSING {entry.requirement.str_repr}"
+    )
+
+
+def _format_repeated(entry: Entry) -> str:
+    #
+    return (
+        f"{' ' * INDENTATION * entry.depth}"
+        f"{entry.project_label or entry.project_key}"
+        f"  # !!! SEE ABOVE {entry.requirement.str_repr}"
+    )
+
+
+def _format_unknown(entry: Entry) -> str:
+    #
+    return (
+        f"{' ' * INDENTATION * entry.depth}"
+        f"{entry.project_key}"
+        f"  # !!! UNKNOWN {entry.requirement.str_repr}"
+    )
+
+
+_FORMATTERS: typing.Dict[Status, collections.abc.Callable[[Entry], str]] = {
+    Status.CIRCULAR: _format_circular,
+    Status.CONFLICT: _format_conflict,
+    Status.FOUND: _format_good,
+    Status.MISSING: _format_missing,
+    Status.REPEATED: _format_repeated,
+    Status.UNKNOWN: _format_unknown,
+}
+
+
+def _format_entry(entry: Entry) -> str:
+    #
+    return _FORMATTERS[entry.status](entry)
+
+
+def _format_flat_entry(entry: Entry) -> str:
+    #
+    line = (
+        _format_flat(entry)
+        if entry.status is Status.FOUND else _format_entry(entry)
+    )
+    return line
+
+
+def _get_dependency_key(requirement: Requirement) -> ProjectKey:
+    #
+    project_key = requirement.dependency_project_key
+    if project_key is None:
+        raise InvalidForwardRequirement(requirement)
+    return project_key
+
+
+def _get_dependent_key(requirement: Requirement) -> ProjectKey:
+    #
+    project_key = requirement.dependent_project_key
+    if project_key is None:
+        raise InvalidReverseRequirement(requirement)
+    return project_key
+
+
+def get_requirement(
+    distributions: Distributions,
+    edge_id: int,
+) -> Requirement:
+    """Get a dependency of the graph as a requirement."""
+    #
+    requirement = Requirement(
+        dependent_project_key=distributions.get_key(
+            distributions.get_dependent_id(edge_id),
+        ),
+        dependency_project_key=distributions.get_key(
+            distributions.get_dependency_id(edge_id),
+        ),
+        extras=distributions.get_extras(edge_id),
+        str_repr=distributions.get_str_repr(edge_id),
+        specifier=distributions.get_specifier(edge_id),
+    )
+    return requirement
+
+
+def get_distribution(
+    distributions: Distributions,
+    project_key: ProjectKey,
+) -> typing.Optional[Distribution]:
+    """Get a project of the graph as a distribution, if it is in the graph."""
+    #
+    distribution = None
+    node_id = distributions.get_id(project_key)
+    if node_id is not None:
+        node = distributions.get_node(node_id)
+        dependencies = typing.cast('Requirements', {})
+        for edge_id in distributions.get_dependencies_edges(node_id):
+            requirement = get_requirement(distributions, edge_id)
+            dependencies[_get_dependency_key(requirement)] = requirement
+        distribution = Distribution(
+            conflicts=[
+                distributions.get_key(dependent_id)
+                for dependent_id in node.conflicts
+            ],
+            dependencies=dependencies,
+            dependents=[
+                distributions.get_key(distributions.get_dependent_id(edge_id))
+                for edge_id in distributions.get_dependents_edges(node_id)
+            ],
+            found=node.found,
+            project_name=node.project_name,
+            version=node.version,
+        )
+    return distribution
+
+
+def _get_children(
+    distributions: Distributions,
+    node_id: int,
+    is_reverse: bool,
+) -> collections.abc.Sequence[int]:
+    #
+    children = (
+        distributions.get_dependents_edges(node_id)
+        if is_reverse else distributions.get_dependencies_edges(node_id)
+    )
+    return children
+
+
+def _get_kept_children(
+    distributions: Distributions,
+    node_id: int,
+    is_reverse: bool,
+    pruning: _pruning.Pruning,
+) -> collections.abc.Sequence[int]:
+    """Get the edges to the children that are not excluded."""
+    if pruning.excluded is None:
+        return _get_children(distributions, node_id, is_reverse)
+    get_child_id = (
+        distributions.get_dependent_id
+        if is_reverse else distributions.get_dependency_id
+    )
+    kept_edge_ids = []
+    for edge_id in _get_children(distributions, node_id, is_reverse):
+        child_key = distributions.get_key(get_child_id(edge_id))
+        if not _pruning.is_excluded(pruning, child_key):
+            kept_edge_ids.append(edge_id)
+    return kept_edge_ids
+
+
+def _walk(
+    distributions: Distributions,
+    node_id: int,
+    is_reverse: bool,
+    visited: typing.Optional[typing.Set[int]],
+    pruning: _pruning.Pruning,
+) -> collections.abc.Iterator[Step]:
+    """Walk from the project, stop where pruned instead of filtering."""
+    get_child_id = (
+        distributions.get_dependent_id
+        if is_reverse else distributions.get_dependency_id
+    )
+    return _traversal.walk(
+        node_id,
+        functools.partial(
+            _get_kept_children,
+            distributions,
+            is_reverse=is_reverse,
+            pruning=pruning,
+        ),
+        get_child_id,
+        visited,
+        pruning.max_depth,
+    )
+
+
+def _is_repeated(
+    distributions: Distributions,
+    node_id: int,
+    is_reverse: bool,
+    visited: typing.Optional[typing.Set[int]],
+) -> bool:
+    """Tell if the subtree of the distribution was already displayed.
+
+    Nodes without a subtree are never considered repeated.
+    """
+    return (
+        visited is not None and node_id in visited
+        and bool(_get_children(distributions, node_id, is_reverse))
+    )
+
+
+def _get_status(node: typing.Optional[_graph.Node]) -> Status:
+    #
+    if node is None:
+        status = Status.UNKNOWN
+    elif node.found is not True:
+        status = Status.MISSING
+    elif node.conflicts:
+        status = Status.CONFLICT
+    else:
+        status = Status.FOUND
+    return status
+
+
+def _make_entry(
+    distributions: Distributions,
+    project_key: ProjectKey,
+    requirement: Requirement,
+    ancestor_keys: typing.List[ProjectKey],
+    status: typing.Optional[Status] = None,
+) -> Entry:
+    #
+    node_id = distributions.get_id(project_key)
+    node = None if node_id is None else distributions.get_node(node_id)
+    entry = Entry(
+        depth=len(ancestor_keys),
+        parent_key=ancestor_keys[-1] if ancestor_keys else None,
+        project_key=project_key,
+        project_label=None if node is None else node.project_name,
+        requirement=requirement,
+        status=_get_status(node) if status is None else status,
+        version=None if node is None else node.version,
+    )
+    return entry
+
+
+def _get_step_status(
+    distributions: Distributions,
+    node_id: int,
+    is_reverse: bool,
+    visited: typing.Optional[typing.Set[int]],
+    is_circular: bool,
+) -> typing.Optional[Status]:
+    """Get the status of a step of a tree, if it depends on the path."""
+    status = None
+    if is_circular:
+        status = Status.CIRCULAR
+    elif _is_repeated(distributions, node_id, is_reverse, visited):
+        status = Status.REPEATED
+    return status
+
+
+def _iter_tree_entries(
+    distributions: Distributions,
+    requirement: Requirement,
+    is_reverse: bool,
+    visited: typing.Optional[typing.Set[int]],
+    pruning: _pruning.Pruning,
+) -> collections.abc.Iterator[Entry]:
+    #
+    project_key = (
+        _get_dependent_key(requirement)
+        if is_reverse else _get_dependency_key(requirement)
+    )
+    root_id = distributions.get_id(project_key)
+    if root_id is None:
+        yield _make_entry(distributions, project_key, requirement, [])
+    else:
+        ancestor_keys: typing.List[ProjectKey] = []
+        steps = _walk(distributions, root_id, is_reverse, visited, pruning)
+        for (depth, node_id, edge_id, is_circular) in steps:
+            del ancestor_keys[depth:]
+            requirement_ = (
+                requirement if edge_id is None else
+                get_requirement(distributions, edge_id)
+            )
+            project_key_ = distributions.get_key(node_id)
+            yield _make_entry(
+                distributions,
+                project_key_,
+                requirement_,
+                ancestor_keys,
+                _get_step_status(
+                    distributions,
+                    node_id,
+                    is_reverse,
+                    visited,
+                    is_circular,
+                ),
+            )
+            ancestor_keys.append(project_key_)
+
+
+def _iter_flat_entries(
+    distributions: Distributions,
+    requirement: Requirement,
+    is_reverse: bool,
+    pruning: _pruning.Pruning,
+) -> collections.abc.Iterator[Entry]:
+    """Iterate over the project and its direct dependencies (or dependents).
+
+    All the dependencies (or dependents) of the project are already in the
+    selection, so that only one level is needed. The excluded ones are left
+    out.
+    """
+    project_key = (
+        _get_dependent_key(requirement)
+        if is_reverse else _get_dependency_key(requirement)
+    )
+    yield _make_entry(distributions, project_key, requirement, [])
+    node_id = distributions.get_id(project_key)
+    if node_id is not None:
+        get_child_id = (
+            distributions.get_dependent_id
+            if is_reverse else distributions.get_dependency_id
+        )
+        for edge_id in _get_kept_children(
+            distributions,
+            node_id,
+            is_reverse,
+            pruning,
+        ):
+            yield _make_entry(
+                distributions,
+                distributions.get_key(get_child_id(edge_id)),
+                get_requirement(distributions, edge_id),
+                [project_key],
+            )
+
+
+def _iter_cycle_entries(
+    distributions: Distributions,
+    cycle: typing.List[ProjectKey],
+) -> collections.abc.Iterator[Entry]:
+    #
+    node_ids = {distributions.get_id(project_key) for project_key in cycle}
+    for project_key in cycle:
+        yield _make_entry(
+            distributions,
+            project_key,
+            make_requirement(project_key, False),
+            [],
+        )
+        node_id = typing.cast(int, distributions.get_id(project_key))
+        for edge_id in distributions.get_dependencies_edges(node_id):
+            dependency_id = distributions.get_dependency_id(edge_id)
+            if dependency_id in node_ids:
+                yield _make_entry(
+                    distributions,
+                    distributions.get_key(dependency_id),
+                    get_requirement(distributions, edge_id),
+                    [project_key],
+                )
+
+
+def make_requirement(
+    project_key: ProjectKey,
+    is_reverse: bool,
+) -> Requirement:
+    """Make a requirement for a selected project."""
+    #
+    requirement = Requirement(
+        dependent_project_key=project_key if is_reverse else None,
+        dependency_project_key=None if is_reverse else project_key,
+        extras=typing.cast('Extras', ()),
+        str_repr='-' if is_reverse else project_key,
+    )
+    return requirement
+
+
+def _select_flat(
+    distributions: Distributions,
+    is_reverse: bool,
+    preselection: Selection,
+    selection: Selection,
+    pruning: _pruning.Pruning,
+) -> None:
+    #
+    visited: typing.Set[int] = set()
+    for requirement in preselection.values():
+        project_key = (
+            _get_dependent_key(requirement)
+            if is_reverse else _get_dependency_key(requirement)
+        )
+        root_id = distributions.get_id(project_key)
+        if root_id is not None:
+            steps = _walk(
+                distributions,
+                root_id,
+                is_reverse,
+                visited,
+                pruning,
+            )
+            for (_, node_id, _, _) in steps:
+                node_key = distributions.get_key(node_id)
+                if node_key not in selection:
+                    selection[node_key] = make_requirement(
+                        node_key,
+                        is_reverse,
+                    )
+
+
+def _get_child_ids(
+    distributions: Distributions,
+    is_reverse: bool,
+    node_id: int,
+) -> typing.List[int]:
+    #
+    child_ids = (
+        [
+            distributions.get_dependent_id(edge_id)
+            for edge_id in distributions.get_dependents_edges(node_id)
+        ] if is_reverse else [
+            distributions.get_dependency_id(edge_id)
+            for edge_id in distributions.get_dependencies_edges(node_id)
+        ]
+    )
+    return child_ids
+
+
+def _find_components(
+    distributions: Distributions,
+    is_reverse: bool,
+) -> typing.List[typing.List[int]]:
+    #
+    return _traversal.find_strongly_connected_components(
+        range(len(distributions)),
+        functools.partial(_get_child_ids, distributions, is_reverse),
+    )
+
+
+def _select_roots(
+    distributions: Distributions,
+    selection: Selection,
+    is_reverse: bool,
+) -> None:
+    """Select one project of each component no other component leads to.
+
+    Such a component is either a single project nothing leads to, or a
+    cycle of projects that would not be displayed otherwise.
+    """
+    components = _find_components(distributions, is_reverse)
+    component_indexes = [0] * len(distributions)
+    for (component_index, component) in enumerate(components):
+        for node_id in component:
+            component_indexes[node_id] = component_index
+    reached_indexes = set()
+    for (component_index, component) in enumerate(components):
+        for node_id in component:
+            for child_id in _get_child_ids(distributions, is_reverse, node_id):
+                child_index = component_indexes[child_id]
+                if child_index != component_index:
+                    reached_indexes.add(child_index)
+    #
+    for (component_index, component) in enumerate(components):
+        if component_index not in reached_indexes:
+            project_key = distributions.get_key(component[0])
+            if project_key not in selection:
+                selection[project_key] = make_requirement(
+                    project_key,
+                    is_reverse,
+                )
+
+
+def find_cycles(
+    distributions: Distributions,
+) -> typing.List[typing.List[ProjectKey]]:
+    """Find the dependency cycles, each as the sorted keys of its projects."""
+    #
+    cycles = []
+    for component in _find_components(distributions, False):
+        node_id = component[0]
+        if len(component) > 1 or (
+            node_id in _get_child_ids(distributions, False, node_id)
+        ):
+            cycles.append(
+                sorted(
+                    distributions.get_key(node_id) for node_id in component
+                ),
+            )
+    return sorted(cycles)
+
+
+class _SelectType(enum.Enum):
+    ALL = enum.auto()
+    BOTTOM = enum.auto()
+    FLAT = enum.auto()
+    USER = enum.auto()
+    TOP = enum.auto()
+
+
+def _get_select_type(
+    has_preselection: bool,
+    is_flat: bool,
+    is_reverse: bool,
+) -> _SelectType:
+    #
+    selections = {
+        (False, False, False): _SelectType.TOP,
+        (False, False, True): _SelectType.BOTTOM,
+        (False, True, False): _SelectType.ALL,
+        (False, True, True): _SelectType.ALL,
+        (True, False, False): _SelectType.USER,
+        (True, False, True): _SelectType.USER,
+        (True, True, False): _SelectType.FLAT,
+        (True, True, True): _SelectType.FLAT,
+    }
+    select_type = selections[(has_preselection, is_flat, is_reverse)]
+    return select_type
+
+
+def add_distribution(
+    distributions: Distributions,
+    project_key: ProjectKey,
+    project_name: ProjectLabel,
+    version: typing.Optional[ProjectVersion],
+) -> _graph.Node:
+    """Add a distribution found in the environment to the graph."""
+    #
+    node = distributions.add_node(project_key)
+    node.found = True
+    node.project_name = project_name
+    node.version = version
+    return node
+
+
+def add_dependency(
+    distributions: Distributions,
+    requirement: Requirement,
+) -> None:
+    """Add the dependency described by the requirement to the graph."""
+    #
+    distributions.add_edge(
+        _get_dependent_key(requirement),
+        _get_dependency_key(requirement),
+        requirement.extras,
+        requirement.str_repr,
+        requirement.specifier,
+    )
+
+
+@_timings.phase('detect conflicts')
+def detect_conflicts(distributions: Distributions) -> None:
+    """Detect dependencies whose version does not satisfy the requirement.
+
+    A dependency added more than once is checked against the requirement of
+    each of its additions.
+    """
+    #
+    version_index = _versions.make_version_index(distributions)
+    for (node_id, project_key) in enumerate(distributions):
+        version = _versions.get_version(version_index, project_key)
+        if version is not None:
+            node = distributions.get_node(node_id)
+            # The additions of an edge come in order in the dependents
+            positions: typing.Dict[int, int] = {}
+            for edge_id in distributions.get_dependents_edges(node_id):
+                position = positions.get(edge_id, 0)
+                positions[edge_id] = position + 1
+                specifier = distributions.get_specifiers(edge_id)[position]
+                if not _versions.is_satisfied(specifier, version):
+                    node.conflicts.append(
+                        distributions.get_dependent_id(edge_id),
+                    )
+
+
+def make_preselection(
+    requirements: collections.abc.Iterable[Requirement],
+    is_reverse: bool,
+) -> Selection:
+    """Make the preselection from the requirements selected by the user."""
+    #
+    preselection = typing.cast('Selection', {})
+    for requirement in requirements:
+        project_key = requirement.dependency_project_key
+        if project_key is None:
+            raise InvalidForwardRequirement(requirement)
+        preselection[project_key] = (
+            make_requirement(project_key, True) if is_reverse else requirement
+        )
+    return preselection
+
+
+def _select(
+    distributions: Distributions,
+    preselection: Selection,
+    is_reverse: bool,
+    is_flat: bool,
+    pruning: typing.Optional[_pruning.Pruning] = None,
+) -> Selection:
+    """Select the projects to show, the excluded ones only if preselected."""
+    pruning = _pruning.Pruning() if pruning is None else pruning
+    selection = copy.deepcopy(preselection)
+    #
+    select_type = _get_select_type(bool(preselection), is_flat, is_reverse)
+    #
+    if select_type == _SelectType.ALL:
+        for project_key in distributions:
+            if project_key not in selection:
+                selection[project_key] = make_requirement(
+                    project_key,
+                    is_reverse,
+                )
+    elif select_type == _SelectType.FLAT:
+        _select_flat(
+            distributions,
+            is_reverse,
+            preselection,
+            selection,
+            pruning,
+        )
+    elif select_type in (_SelectType.BOTTOM, _SelectType.TOP):
+        with _timings.phase('select roots and cycles'):
+            _select_roots(distributions, selection, is_reverse)
+    #
+    for project_key in list(selection):
+        if project_key not in preselection and _pruning.is_excluded(
+            pruning,
+            project_key,
+        ):
+            del selection[project_key]
+    #
+    return selection
+
+
+def _iter_blocks(
+    distributions: Distributions,
+    selection: Selection,
+    options: Options,
+) -> collections.abc.Iterator[collections.abc.Iterator[Entry]]:
+    """Iterate over the entries of each tree, flat list, or cycle.
+
+    The entries of a block have to be consumed before the next block. The
+    cycles are shown if any of their projects is selected, or if there is
+    no selection at all.
+    """
+    if options.is_cycles:
+        for cycle in find_cycles(distributions):
+            if not selection or any(key in selection for key in cycle):
+                yield _iter_cycle_entries(distributions, cycle)
+    else:
+        pruning = _pruning.make_pruning(options)
+        # Subtrees already displayed, shared by all the trees in compact mode
+        visited: typing.Optional[typing.Set[int]]
+        visited = set() if options.is_compact else None
+        for requirement_key in sorted(selection):
+            requirement = selection[requirement_key]
+            if options.is_flat:
+                yield _iter_flat_entries(
+                    distributions,
+                    requirement,
+                    options.is_reverse,
+                    pruning,
+                )
+            else:
+                yield _iter_tree_entries(
+                    distributions,
+                    requirement,
+                    options.is_reverse,
+                    visited,
+                    pruning,
+                )
+
+
+def _render_forward_flat(
+    entries: collections.abc.Iterator[Entry],
+) -> collections.abc.Iterator[str]:
+    #
+    for entry in entries:
+        yield (
+            _format_flat_entry(entry)
+            if entry.depth == 0 else _format_flat_dependency(entry)
+        )
+    #
+    yield ""
+
+
+def _render_reverse_flat(
+    entries: collections.abc.Iterator[Entry],
+) -> collections.abc.Iterator[str]:
+    #
+    # Dependents are listed above the project
+    root_line = ""
+    for entry in entries:
+        if entry.depth == 0:
+            root_line = _format_flat_entry(entry)
+        else:
+            yield _format_flat_dependent(entry)
+    yield root_line
+    #
+    yield ""
+
+
+def _render_cycle(
+    entries: collections.abc.Iterator[Entry],
+) -> collections.abc.Iterator[str]:
+    #
+    for entry in entries:
+        yield (
+            _format_flat(entry)
+            if entry.depth == 0 else _format_flat_dependency(entry)
+        )
+    #
+    yield ""
+
+
+def _render_text(
+    blocks: collections.abc.Iterator[collections.abc.Iterator[Entry]],
+    options: Options,
+) -> collections.abc.Iterator[str]:
+    #
+    for entries in blocks:
+        if options.is_cycles:
+            yield from _render_cycle(entries)
+        elif options.is_flat and options.is_reverse:
+            yield from _render_reverse_flat(entries)
+        elif options.is_flat:
+            yield from _render_forward_flat(entries)
+        else:
+            for entry in entries:
+                yield _format_entry(entry)
+
+
+def _render_selection(
+    distributions: Distributions,
+    selection: Selection,
+    options: Options,
+) -> collections.abc.Iterator[str]:
+    #
+    blocks = _iter_blocks(distributions, selection, options)
+    children_name = (
+        'dependents'
+        if options.is_reverse and not options.is_cycles else 'dependencies'
+    )
+    lines: collections.abc.Iterator[str]
+    if options.output_format == _output.FORMAT_JSON and options.is_cycles:
+        lines = _json.render_json_groups(blocks, children_name)
+    elif options.output_format == _output.FORMAT_JSON:
+        lines = _json.render_json(
+            itertools.chain.from_iterable(blocks),
+            children_name,
+        )
+    elif options.output_format == _output.FORMAT_NDJSON:
+        lines = _json.render_ndjson(itertools.chain.from_iterable(blocks))
+    else:
+        lines = _render_text(blocks, options)
+    return lines
+
+
+def render(
+    distributions: Distributions,
+    preselection: Selection,
+    options: Options,
+) -> collections.abc.Iterator[str]:
+    """Select the discovered distributions, and render them lazily."""
+    #
+    selection = preselection
+    if not options.is_cycles:
+        with _timings.phase('select'):
+            selection = _select(
+                distributions,
+                preselection,
+                options.is_reverse,
+                options.is_flat,
+                _pruning.make_pruning(options),
+            )
+    return _render_selection(distributions, selection, options)
+
+
+def main(
+    distributions: Distributions,
+    preselection: Selection,
+    options: Options,
+) -> int:
+    """Select and display the discovered distributions."""
+    #
+    lines = render(distributions, preselection, options)
+    # The output is only a view, a reader that stops early is not a failure
+    with _timings.phase('render and write'):
+        _output.write_lines(lines, sys.stdout)
+    return 0
+
+
+# EOF
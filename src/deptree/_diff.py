@@ -0,0 +1,241 @@
+#
+
+"""Changes between the dependency graphs of two environments.
+
+Each side is either the path of an environment, scanned, or a snapshot
+file. The graphs are reduced to mappings and sets keyed by project keys,
+and compared with set operations, never by their rendered text.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import sys
+import typing
+
+from . import _core
+from . import _environments
+from . import _json
+from . import _output
+from . import _problems
+from . import _snapshot
+from . import _timings
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    from . import _graph
+    #
+    Values = typing.Dict[str, str]
+
+KIND_PROJECT = 'project'
+KIND_DEPENDENCY = 'dependency'
+KIND_CONFLICT = 'conflict'
+KIND_MISSING = 'missing'
+KIND_CYCLE = 'cycle'
+
+_SIGNS = {'added': '+', 'removed': '-', 'changed': '~'}
+
+
+@dataclasses.dataclass(frozen=True)
+class Change:
+    """Addition, removal, or change of a project, a dependency, or a problem.
+
+    The old value is ``None`` for an addition, the new value is ``None`` for
+    a removal.
+    """
+
+    kind: str
+    subject: str
+    old: typing.Optional[str]
+    new: typing.Optional[str]
+
+    def get_type(self) -> str:
+        """Tell if added, removed, or changed."""
+        return (
+            'added' if self.old is None else
+            'removed' if self.new is None else 'changed'
+        )
+
+
+@dataclasses.dataclass
+class _Summary:
+    """Graph reduced to what is compared, keyed by subject.
+
+    The subject of a project is its key, the one of a dependency is made of
+    the keys of the dependent and of the dependency.
+    """
+
+    projects: Values
+    requirements: Values
+    conflicts: typing.Set[str]
+    missing: typing.Set[str]
+    cycles: typing.Set[str]
+
+
+def _format_project(node: _graph.Node) -> str:
+    #
+    label = str(node.project_name)
+    return f'{label}=={node.version}' if node.version else label
+
+
+def _summarize(distributions: _core.Distributions) -> _Summary:
+    #
+    summary = _Summary({}, {}, set(), set(), set())
+    for node_id in range(len(distributions)):
+        node = distributions.get_node(node_id)
+        if node.found:
+            project_key = distributions.get_key(node_id)
+            summary.projects[project_key] = _format_project(node)
+    for edge_id in range(distributions.get_edges_count()):
+        subject = _problems.get_subject(
+            distributions,
+            distributions.get_dependent_id(edge_id),
+            distributions.get_dependency_id(edge_id),
+        )
+        summary.requirements[subject] = distributions.get_str_repr(edge_id)
+    problems_subjects = {
+        _core.Status.CIRCULAR: summary.cycles,
+        _core.Status.CONFLICT: summary.conflicts,
+        _core.Status.MISSING: summary.missing,
+    }
+    for problem in _problems.find_problems(distributions):
+        problems_subjects[problem.status].add(problem.subject)
+    return summary
+
+
+def _compare_values(
+    kind: str,
+    old_values: Values,
+    new_values: Values,
+) -> collections.abc.Iterator[Change]:
+    """Compare the values of the subjects found on either side."""
+    for subject in sorted(old_values.keys() | new_values.keys()):
+        old = old_values.get(subject, None)
+        new = new_values.get(subject, None)
+        if old != new:
+            yield Change(kind, subject, old, new)
+
+
+def _compare_problems(
+    kind: str,
+    old_subjects: typing.Set[str],
+    new_subjects: typing.Set[str],
+    summaries: typing.Tuple[_Summary, _Summary],
+) -> collections.abc.Iterator[Change]:
+    """Compare the problems, with the requirement involved if any."""
+    for subject in sorted(old_subjects ^ new_subjects):
+        yield (
+            Change(
+                kind,
+                subject,
+                None,
+                summaries[1].requirements.get(subject, ''),
+            ) if subject in new_subjects else Change(
+                kind,
+                subject,
+                summaries[0].requirements.get(subject, ''),
+                None,
+            )
+        )
+
+
+@_timings.phase('diff')
+def diff(
+    old_distributions: _core.Distributions,
+    new_distributions: _core.Distributions,
+) -> typing.List[Change]:
+    """List the changes from the old graph to the new one, by kind."""
+    summaries = (
+        _summarize(old_distributions),
+        _summarize(new_distributions),
+    )
+    (old, new) = summaries
+    changes = list(_compare_values(KIND_PROJECT, old.projects, new.projects))
+    changes.extend(
+        _compare_values(KIND_DEPENDENCY, old.requirements, new.requirements),
+    )
+    changes.extend(
+        _compare_problems(
+            KIND_CONFLICT,
+            old.conflicts,
+            new.conflicts,
+            summaries,
+        ),
+    )
+    changes.extend(
+        _compare_problems(KIND_MISSING, old.missing, new.missing, summaries),
+    )
+    changes.extend(
+        _compare_problems(KIND_CYCLE, old.cycles, new.cycles, summaries),
+    )
+    return changes
+
+
+def _format_change(change: Change) -> str:
+    #
+    line = f'{_SIGNS[change.get_type()]} {change.kind} {change.subject}'
+    if change.old and change.new:
+        line += f': {change.old} -> {change.new}'
+    elif change.old or change.new:
+        line += f': {change.old or change.new}'
+    return line
+
+
+def _make_record(change: Change) -> typing.Dict[str, typing.Optional[str]]:
+    #
+    record: typing.Dict[str, typing.Optional[str]] = {
+        'change': change.get_type(),
+        'kind': change.kind,
+        'subject': change.subject,
+        'old': change.old,
+        'new': change.new,
+    }
+    return record
+
+
+def render(
+    changes: typing.List[Change],
+    output_format: str,
+) -> collections.abc.Iterator[str]:
+    """Render the changes, one per line."""
+    if output_format == _output.FORMAT_TEXT:
+        yield from (_format_change(change) for change in changes)
+    else:
+        yield from _json.render_records(
+            (json.dumps(_make_record(change)) for change in changes),
+            output_format,
+        )
+
+
+def load(path: str, is_cached: bool) -> _core.Distributions:
+    """Scan the environment, or read the whole snapshot file."""
+    distributions: _core.Distributions
+    if os.path.isdir(path):
+        distributions = _environments.discover(
+            path,
+            typing.cast('_core.Selection', {}),
+            is_cached,
+        )
+    else:
+        snapshot_graph = _snapshot.SnapshotGraph(path)
+        snapshot_graph.read_all()
+        distributions = snapshot_graph
+    return distributions
+
+
+def main(
+    old_distributions: _core.Distributions,
+    new_distributions: _core.Distributions,
+    output_format: str,
+) -> int:
+    """Display the changes from the old graph to the new one."""
+    changes = diff(old_distributions, new_distributions)
+    with _timings.phase('render and write'):
+        _output.write_lines(render(changes, output_format), sys.stdout)
+    return 0
+
+
+# EOF
@@ -0,0 +1,210 @@
+#
+
+"""Scan of several environments, each in a worker process.
+
+The records of the metadata are shared by content between the workers, so
+that the metadata of the same wheel installed in several environments is
+parsed only once. The workers only discover the distributions, the trees
+are rendered lazily in the main process, so that the workers still running
+are terminated as soon as the output is closed by the reader.
+"""
+
+from __future__ import annotations
+
+import glob
+import multiprocessing
+import multiprocessing.managers
+import os
+import sys
+import typing
+
+from . import _cache
+from . import _core
+from . import _importlib_metadata
+from . import _json
+from . import _output
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    Report = typing.Tuple[str, collections.abc.Iterable[str]]
+    Scan = typing.Tuple[_core.Distributions, _core.Selection]
+
+# Directories of distributions relative to the root of an environment,
+# either a virtual environment or the root file system of a container
+SITE_PATTERNS = (
+    os.path.join('lib', 'python*', 'site-packages'),
+    os.path.join('lib', 'python*', 'dist-packages'),
+    os.path.join('lib64', 'python*', 'site-packages'),
+    os.path.join('Lib', 'site-packages'),
+    os.path.join('usr', 'lib', 'python*', 'site-packages'),
+    os.path.join('usr', 'lib', 'python*', 'dist-packages'),
+    os.path.join('usr', 'local', 'lib', 'python*', 'site-packages'),
+    os.path.join('usr', 'local', 'lib', 'python*', 'dist-packages'),
+)
+
+
+class InvalidEnvironment(_core.DeptreeException):
+    """Path of an environment that is not a directory."""
+
+
+class _Manager(multiprocessing.managers.BaseManager):
+    """Manager of the records shared by the workers."""
+
+
+_Manager.register(
+    'SharedRecords',
+    _cache.SharedRecords,
+    exposed=('get_many', 'update'),
+)
+
+
+def read_environments_list(file_path: str) -> typing.List[str]:
+    """Read the paths of the environments, one per line.
+
+    Empty lines and lines starting with ``#`` are ignored.
+    """
+    with open(file_path, encoding='utf_8') as file_:
+        lines = [line.strip() for line in file_]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def _get_path_items(environment_path: str) -> typing.List[str]:
+    """Get the directories of distributions of the environment.
+
+    A path that is not the root of an environment is used as is, as a
+    directory of distributions.
+    """
+    root_path = glob.escape(environment_path)
+    path_items = [
+        path_item for pattern in SITE_PATTERNS
+        for path_item in sorted(glob.glob(os.path.join(root_path, pattern)))
+        if os.path.isdir(path_item)
+    ]
+    return path_items or [environment_path]
+
+
+def discover(
+    environment_path: str,
+    preselection: _core.Selection,
+    is_cached: bool,
+    shared_records: typing.Optional[_cache.SharedRecords] = None,
+) -> _core.Distributions:
+    """Discover the distributions of one environment."""
+    path_items = _get_path_items(environment_path)
+    cache = _cache.MetadataCache(
+        _cache.get_cache_file_path(path_items) if is_cached else None,
+        shared_records,
+    )
+    cache.load()
+    distributions = _importlib_metadata.discover_distributions(
+        preselection,
+        cache,
+        path_items,
+    )
+    cache.save()
+    return distributions
+
+
+def _scan(
+    environment_path: str,
+    user_selection: typing.List[str],
+    options: _core.Options,
+    is_cached: bool,
+    shared_records: _cache.SharedRecords,
+) -> Scan:
+    """Discover the distributions of one environment."""
+    preselection = _importlib_metadata.make_preselection(
+        user_selection,
+        options.is_reverse,
+    )
+    distributions = discover(
+        environment_path,
+        preselection,
+        is_cached,
+        shared_records,
+    )
+    return (distributions, preselection)
+
+
+def _make_report(
+    environment_path: str,
+    scan: Scan,
+    options: _core.Options,
+) -> Report:
+    #
+    (distributions, preselection) = scan
+    return (
+        environment_path,
+        _core.render(distributions, preselection, options),
+    )
+
+
+def _render_reports(
+    reports: collections.abc.Iterable[Report],
+    output_format: str,
+) -> collections.abc.Iterator[str]:
+    #
+    if output_format == _output.FORMAT_JSON:
+        yield from _json.render_labeled_json(reports)
+    elif output_format == _output.FORMAT_NDJSON:
+        yield from _json.render_labeled_ndjson(reports)
+    else:
+        for (environment_path, lines) in reports:
+            yield f"==> {environment_path} <=="
+            last_line = ''
+            for line in lines:
+                yield line
+                last_line = line
+            if last_line:
+                yield ""
+
+
+def main(
+    environment_paths: typing.List[str],
+    user_selection: typing.List[str],
+    options: _core.Options,
+    is_cached: bool,
+) -> int:
+    """Display the distributions of each environment, in order.
+
+    All the paths are checked before any environment is scanned.
+    """
+    for environment_path in environment_paths:
+        if not os.path.isdir(environment_path):
+            raise InvalidEnvironment(environment_path)
+    with _Manager() as manager:
+        shared_records = typing.cast(
+            '_cache.SharedRecords',
+            getattr(manager, 'SharedRecords')(),
+        )
+        # Leaving the pool terminates the workers, even the ones still
+        # running if the output was closed early
+        with multiprocessing.Pool() as pool:
+            results = [
+                pool.apply_async(
+                    _scan,
+                    (
+                        environment_path,
+                        user_selection,
+                        options,
+                        is_cached,
+                        shared_records,
+                    ),
+                ) for environment_path in environment_paths
+            ]
+            reports = (
+                _make_report(environment_path, result.get(), options)
+                for (environment_path, result) in zip(
+                    environment_paths,
+                    results,
+                )
+            )
+            _output.write_lines(
+                _render_reports(reports, options.output_format),
+                sys.stdout,
+            )
+    return 0
+
+
+# EOF
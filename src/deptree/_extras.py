@@ -0,0 +1,87 @@
+#
+
+"""Propagation of the extras required along the dependency graph.
+
+The backends apply the extras selected by the user to the selected
+projects only. The extras that a requirement asks of its dependency are
+applied here, transitively. Each extra of a project is applied at most
+once, so that the cost stays linear in the count of dependencies instead of
+growing with the count of paths.
+"""
+
+from __future__ import annotations
+
+import typing
+
+from . import _core
+from . import _timings
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    Applied = typing.Set[typing.Tuple[_core.ProjectKey, _core.Extra]]
+    GetExtraRequirements = collections.abc.Callable[
+        [_core.ProjectKey, _core.Extra],
+        collections.abc.Iterable[_core.Requirement],
+    ]
+
+
+def get_selected_extras(selection: _core.Selection) -> Applied:
+    """Get the extras already applied, the ones selected by the user."""
+    return {
+        (project_key, extra)
+        for (project_key, requirement) in selection.items()
+        for extra in requirement.extras
+    }
+
+
+def _get_required_extras(
+    distributions: _core.Distributions,
+) -> collections.abc.Iterator[typing.Tuple[_core.ProjectKey, _core.Extra]]:
+    #
+    for edge_id in range(distributions.get_edges_count()):
+        dependency_id = distributions.get_dependency_id(edge_id)
+        for extra in distributions.get_extras(edge_id):
+            yield (distributions.get_key(dependency_id), extra)
+
+
+def _is_found(
+    distributions: _core.Distributions,
+    project_key: _core.ProjectKey,
+) -> bool:
+    #
+    node_id = distributions.get_id(project_key)
+    return node_id is not None and distributions.get_node(node_id).found
+
+
+@_timings.phase('apply extras')
+def apply_extras(
+    distributions: _core.Distributions,
+    get_extra_requirements: GetExtraRequirements,
+    applied: Applied,
+) -> None:
+    """Add the dependencies of the extras required by the dependencies.
+
+    The function gets the requirements of a single extra of a project,
+    without the requirements common to all the extras.
+    """
+    pending = list(_get_required_extras(distributions))
+    # pylint: disable-next=while-used
+    while pending:
+        (project_key, extra) = pending.pop()
+        if (
+            (project_key, extra) not in applied
+            and _is_found(distributions, project_key)
+        ):
+            applied.add((project_key, extra))
+            for requirement in get_extra_requirements(project_key, extra):
+                _core.add_dependency(distributions, requirement)
+                dependency_key = requirement.dependency_project_key
+                if dependency_key is not None:
+                    pending.extend(
+                        (dependency_key, extra_)
+                        for extra_ in requirement.extras
+                    )
+
+
+# EOF
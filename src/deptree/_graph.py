@@ -0,0 +1,279 @@
+#
+
+"""Compact store of the dependency graph.
+
+Project keys are interned to integer identifiers, the dependencies are
+stored as edges in flat arrays, and the edges of each project are found
+through offsets in arrays sorted by project (compressed sparse rows), in
+both directions.
+"""
+
+from __future__ import annotations
+
+import array
+import dataclasses
+import typing
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    from . import _core
+
+_ID_BITS = 32
+
+
+@dataclasses.dataclass
+class Node:
+    """Distribution of a project."""
+
+    __slots__ = ('conflicts', 'found', 'project_name', 'version')
+
+    # Identifiers of the dependents whose requirement is not satisfied
+    conflicts: typing.List[int]
+    found: bool
+    project_name: typing.Optional[_core.ProjectLabel]
+    version: typing.Optional[_core.ProjectVersion]
+
+
+@dataclasses.dataclass
+# pylint: disable-next=too-many-instance-attributes
+class _Edges:
+    """Dependencies as parallel arrays indexed by edge identifier."""
+
+    __slots__ = (
+        'additions_dependencies',
+        'additions_edges',
+        'dependencies',
+        'dependents',
+        'extras',
+        'replaced_specifiers',
+        'specifiers',
+        'str_reprs',
+    )
+
+    # Every addition of a dependency counts as a dependent, even if it
+    # replaces the requirement of an existing edge
+    additions_dependencies: array.array[int]
+    additions_edges: array.array[int]
+    dependencies: array.array[int]
+    dependents: array.array[int]
+    extras: typing.List[_core.Extras]
+    # Specifiers of the earlier additions of an edge, in order, only for the
+    # edges added more than once (for example once more by an extra)
+    replaced_specifiers: typing.Dict[int, typing.List[str]]
+    specifiers: typing.List[str]
+    str_reprs: typing.List[str]
+
+
+@dataclasses.dataclass
+class _Rows:
+    """Values sorted by row, and the offset of each row."""
+
+    __slots__ = ('offsets', 'values')
+
+    offsets: array.array[int]
+    values: array.array[int]
+
+    def get_row(self, row: int) -> array.array[int]:
+        """Get the values of the row."""
+        return self.values[self.offsets[row]:self.offsets[row + 1]]
+
+
+def _get_edge_key(dependent_id: int, dependency_id: int) -> int:
+    #
+    return (dependent_id << _ID_BITS) | dependency_id
+
+
+def _make_rows(
+    rows_count: int,
+    rows: collections.abc.Sequence[int],
+    values: collections.abc.Iterable[int],
+) -> _Rows:
+    """Sort the values by row, keeping their order within each row."""
+    offsets = array.array('l', [0]) * (rows_count + 1)
+    for row in rows:
+        offsets[row + 1] += 1
+    for row in range(rows_count):
+        offsets[row + 1] += offsets[row]
+    positions = offsets[:-1]
+    sorted_values = array.array('l', [0]) * len(rows)
+    for (row, value) in zip(rows, values):
+        sorted_values[positions[row]] = value
+        positions[row] += 1
+    return _Rows(offsets, sorted_values)
+
+
+class Graph:
+    """Graph of the distributions and their dependencies.
+
+    Dependencies are added one at a time, the rows of edges of all the
+    projects are built on the first query that follows.
+    """
+
+    __slots__ = ('_edges', '_edges_ids', '_ids', '_keys', '_nodes', '_rows')
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._ids: typing.Dict[_core.ProjectKey, int] = {}
+        self._keys: typing.List[_core.ProjectKey] = []
+        self._nodes: typing.List[Node] = []
+        self._edges = _Edges(
+            additions_dependencies=array.array('l'),
+            additions_edges=array.array('l'),
+            dependencies=array.array('l'),
+            dependents=array.array('l'),
+            extras=[],
+            replaced_specifiers={},
+            specifiers=[],
+            str_reprs=[],
+        )
+        # Only needed while adding edges, dropped once the rows are built
+        self._edges_ids: typing.Optional[typing.Dict[int, int]] = {}
+        # Rows of the edges to the dependencies, and from the dependents
+        self._rows: typing.Optional[typing.Tuple[_Rows, _Rows]] = None
+
+    def __contains__(self, project_key: object) -> bool:
+        """Tell if the project is in the graph."""
+        return project_key in self._ids
+
+    def __iter__(self) -> collections.abc.Iterator[_core.ProjectKey]:
+        """Iterate over the project keys, in order of addition."""
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        """Get the count of projects."""
+        return len(self._keys)
+
+    def _intern(self, project_key: _core.ProjectKey) -> int:
+        node_id = self._ids.get(project_key, None)
+        if node_id is None:
+            node_id = len(self._keys)
+            self._ids[project_key] = node_id
+            self._keys.append(project_key)
+            self._nodes.append(Node([], False, None, None))
+        return node_id
+
+    def add_node(self, project_key: _core.ProjectKey) -> Node:
+        """Get the node of the project, add it first if needed."""
+        return self._nodes[self._intern(project_key)]
+
+    def add_edge(
+        self,
+        dependent_key: _core.ProjectKey,
+        dependency_key: _core.ProjectKey,
+        extras: _core.Extras,
+        str_repr: str,
+        specifier: str,
+    ) -> int:
+        """Add a dependency, or replace the one between the same projects."""
+        edges = self._edges
+        edges_ids = self._get_edges_ids()
+        dependent_id = self._intern(dependent_key)
+        dependency_id = self._intern(dependency_key)
+        edge_key = _get_edge_key(dependent_id, dependency_id)
+        edge_id = edges_ids.get(edge_key, None)
+        if edge_id is None:
+            edge_id = len(edges.dependents)
+            edges_ids[edge_key] = edge_id
+            edges.dependents.append(dependent_id)
+            edges.dependencies.append(dependency_id)
+            edges.extras.append(extras)
+            edges.specifiers.append(specifier)
+            edges.str_reprs.append(str_repr)
+        else:
+            edges.replaced_specifiers.setdefault(edge_id, []).append(
+                edges.specifiers[edge_id],
+            )
+            edges.extras[edge_id] = extras
+            edges.specifiers[edge_id] = specifier
+            edges.str_reprs[edge_id] = str_repr
+        edges.additions_dependencies.append(dependency_id)
+        edges.additions_edges.append(edge_id)
+        self._rows = None
+        return edge_id
+
+    def _get_edges_ids(self) -> typing.Dict[int, int]:
+        if self._edges_ids is None:
+            self._edges_ids = {
+                _get_edge_key(dependent_id, dependency_id): edge_id
+                for (edge_id, (dependent_id, dependency_id)) in enumerate(
+                    zip(self._edges.dependents, self._edges.dependencies),
+                )
+            }
+        return self._edges_ids
+
+    def _get_rows(self) -> typing.Tuple[_Rows, _Rows]:
+        if self._rows is None:
+            self._edges_ids = None
+            self._rows = (
+                _make_rows(
+                    len(self._keys),
+                    self._edges.dependents,
+                    range(len(self._edges.dependents)),
+                ),
+                _make_rows(
+                    len(self._keys),
+                    self._edges.additions_dependencies,
+                    self._edges.additions_edges,
+                ),
+            )
+        return self._rows
+
+    def get_id(
+        self,
+        project_key: _core.ProjectKey,
+    ) -> typing.Optional[int]:
+        """Get the identifier of the project, if it is in the graph."""
+        return self._ids.get(project_key, None)
+
+    def get_key(self, node_id: int) -> _core.ProjectKey:
+        """Get the key of the project."""
+        return self._keys[node_id]
+
+    def get_node(self, node_id: int) -> Node:
+        """Get the node of the project."""
+        return self._nodes[node_id]
+
+    def get_dependencies_edges(self, node_id: int) -> array.array[int]:
+        """Get the edges to the dependencies, in order of addition."""
+        return self._get_rows()[0].get_row(node_id)
+
+    def get_dependents_edges(self, node_id: int) -> array.array[int]:
+        """Get the edges from the dependents, in order of addition."""
+        return self._get_rows()[1].get_row(node_id)
+
+    def get_dependent_id(self, edge_id: int) -> int:
+        """Get the identifier of the dependent project of the edge."""
+        return self._edges.dependents[edge_id]
+
+    def get_dependency_id(self, edge_id: int) -> int:
+        """Get the identifier of the dependency project of the edge."""
+        return self._edges.dependencies[edge_id]
+
+    def get_edges_count(self) -> int:
+        """Get the count of dependencies."""
+        return len(self._edges.dependents)
+
+    def get_extras(self, edge_id: int) -> _core.Extras:
+        """Get the extras required by the edge."""
+        return self._edges.extras[edge_id]
+
+    def get_specifier(self, edge_id: int) -> str:
+        """Get the version specifier required by the edge."""
+        return self._edges.specifiers[edge_id]
+
+    def get_specifiers(self, edge_id: int) -> typing.List[str]:
+        """Get the version specifiers of every addition of the edge, in order.
+
+        The last one is the one required by the edge.
+        """
+        specifiers = list(self._edges.replaced_specifiers.get(edge_id, ()))
+        specifiers.append(self._edges.specifiers[edge_id])
+        return specifiers
+
+    def get_str_repr(self, edge_id: int) -> str:
+        """Get the requirement of the edge as written."""
+        return self._edges.str_reprs[edge_id]
+
+
+# EOF
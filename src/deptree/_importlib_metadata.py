@@ -0,0 +1,714 @@
+#
+
+"""Implementation based on ``importlib.metadata``.
+
+The distributions are discovered following the same rules as the
+``working_set`` of ``pkg_resources``, so that the output is the same,
+but without the cost of importing ``pkg_resources``.
+"""
+
+from __future__ import annotations
+
+import email.message
+import email.parser
+import functools
+import hashlib
+import itertools
+import os
+import re
+import sys
+import typing
+
+import importlib_metadata
+import packaging.requirements
+import packaging.version
+
+from . import _cache
+from . import _core
+from . import _extras
+from . import _graph
+from . import _markers
+from . import _timings
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    DependencyMap = typing.Dict[
+        typing.Optional[str],
+        typing.List[packaging.requirements.Requirement],
+    ]
+    Section = typing.Tuple[typing.Optional[str], typing.List[str]]
+    #
+    # Key, extras, string representation, and specifier
+    RequirementRecord = typing.Tuple[str, typing.List[str], str, str]
+    # Extra, and its requirements
+    ExtraRecord = typing.Tuple[
+        typing.Optional[str],
+        typing.List[RequirementRecord],
+    ]
+    # Project name, version, and requirements for each extra
+    DistributionRecord = typing.Tuple[
+        str,
+        typing.Optional[str],
+        typing.List[ExtraRecord],
+    ]
+    #
+    # Base name, metadata path, and stamp
+    MetadataPath = typing.Tuple[str, str, _cache.Stamp]
+    GetDistributionRecord = collections.abc.Callable[
+        [str, str, _cache.Stamp],
+        typing.Optional[DistributionRecord],
+    ]
+
+DIST_INFO_EXTENSION = '.dist-info'
+EGG_EXTENSION = '.egg'
+EGG_INFO_EXTENSION = '.egg-info'
+
+_EGG_NAME = re.compile(r'(?P<name>[^-]+)(-(?P<version>[^-]+))?')
+
+_VERSION_KEYS: typing.Dict[str, typing.List[packaging.version.Version]] = {}
+
+
+def _safe_name(name: str) -> str:
+    return re.sub('[^A-Za-z0-9.]+', '-', name)
+
+
+def _safe_version(version: str) -> str:
+    safe_version = None
+    try:
+        safe_version = str(packaging.version.Version(version))
+    except packaging.version.InvalidVersion:
+        safe_version = re.sub('[^A-Za-z0-9.]+', '-', version.replace(' ', '.'))
+    return safe_version
+
+
+def _safe_extra(extra: str) -> str:
+    return re.sub('[^A-Za-z0-9.-]+', '_', extra).lower()
+
+
+def get_project_key(project_name: str) -> _core.ProjectKey:
+    """Get the key of the project, as used in the graph."""
+    project_key = _safe_name(project_name).lower()
+    return typing.cast('_core.ProjectKey', project_key)
+
+
+def _get_project_key(
+    requirement_: packaging.requirements.Requirement,
+) -> _core.ProjectKey:
+    #
+    return get_project_key(requirement_.name)
+
+
+def _format_requirement(
+    requirement_: packaging.requirements.Requirement,
+) -> str:
+    #
+    parts = [requirement_.name]
+    if requirement_.extras:
+        extras = sorted(_safe_extra(extra) for extra in requirement_.extras)
+        parts.append(f"[{','.join(extras)}]")
+    if requirement_.specifier:
+        parts.append(str(requirement_.specifier))
+    if requirement_.url:
+        parts.append(f"@ {requirement_.url}")
+        if requirement_.marker:
+            parts.append(' ')
+    if requirement_.marker:
+        parts.append(f"; {requirement_.marker}")
+    return ''.join(parts)
+
+
+def _get_requirement_hash_key(
+    requirement_: packaging.requirements.Requirement,
+) -> typing.Tuple[object, ...]:
+    #
+    return (
+        _get_project_key(requirement_),
+        requirement_.url,
+        requirement_.specifier,
+        frozenset(_safe_extra(extra) for extra in requirement_.extras),
+        str(requirement_.marker) if requirement_.marker else None,
+    )
+
+
+def _make_requirement_record(
+    requirement_: packaging.requirements.Requirement,
+) -> RequirementRecord:
+    #
+    return (
+        _get_project_key(requirement_),
+        [_safe_extra(extra) for extra in requirement_.extras],
+        _format_requirement(requirement_),
+        str(requirement_.specifier),
+    )
+
+
+def _transform_requirement(
+    dependent_project_key: typing.Optional[_core.ProjectKey],
+    requirement_record: RequirementRecord,
+) -> _core.Requirement:
+    #
+    (project_key, extras, str_repr, specifier) = requirement_record
+    requirement = _core.Requirement(
+        dependent_project_key=dependent_project_key,
+        dependency_project_key=typing.cast('_core.ProjectKey', project_key),
+        extras=typing.cast('_core.Extras', tuple(extras)),
+        str_repr=str_repr,
+        specifier=specifier,
+    )
+    return requirement
+
+
+def _yield_lines(text: typing.Optional[str]) -> collections.abc.Iterator[str]:
+    for raw_line in (text or '').splitlines():
+        line = raw_line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def _parse_requirements(
+    lines: collections.abc.Iterable[str],
+) -> collections.abc.Iterator[packaging.requirements.Requirement]:
+    #
+    lines_iterator = iter(lines)
+    for line in lines_iterator:
+        item = line.partition(' #')[0].strip()
+        # pylint: disable-next=while-used
+        while item.endswith('\\'):
+            next_line = next(lines_iterator, None)
+            if next_line is None:
+                return
+            item = item[:-2].strip() + next_line.partition(' #')[0].strip()
+        yield _markers.parse_requirement(item)
+
+
+def _split_sections(
+    text: typing.Optional[str],
+) -> collections.abc.Iterator[Section]:
+    #
+    section = None
+    content: typing.List[str] = []
+    for line in _yield_lines(text):
+        if line.startswith('['):
+            if section or content:
+                yield (section, content)
+            section = line[1:-1].strip()
+            content = []
+        else:
+            content.append(line)
+    yield (section, content)
+
+
+def _filter_requirements(
+    requirements: collections.abc.Iterable[packaging.requirements.Requirement],
+    extra: typing.Optional[str],
+) -> collections.abc.Iterator[packaging.requirements.Requirement]:
+    #
+    for requirement_ in requirements:
+        if (  #
+                not requirement_.marker
+                or _markers.is_satisfied(str(requirement_.marker), extra)
+        ):
+            yield requirement_
+
+
+def _get_egg_info_dependency_map(
+    distribution_: importlib_metadata.Distribution,
+) -> DependencyMap:
+    #
+    raw_dependency_map: DependencyMap = {}
+    for file_name in ('requires.txt', 'depends.txt'):
+        text = distribution_.read_text(file_name)
+        for (extra, lines) in _split_sections(text):
+            raw_dependency_map.setdefault(extra, []).extend(
+                _parse_requirements(lines),
+            )
+    #
+    dependency_map: DependencyMap = {None: []}
+    for (section, requirements) in raw_dependency_map.items():
+        extra = None
+        is_satisfied = True
+        if section is not None:
+            (section_extra, _, marker) = section.partition(':')
+            is_satisfied = not marker or _markers.is_satisfied(marker)
+            extra = _safe_extra(section_extra) or None
+        dependency_map.setdefault(extra, []).extend(
+            requirements if is_satisfied else [],
+        )
+    return dependency_map
+
+
+def _get_dist_info_dependency_map(
+    metadata: email.message.Message,
+) -> DependencyMap:
+    #
+    requirements = list(
+        _parse_requirements(
+            line for value in metadata.get_all('Requires-Dist', [])
+            for line in _yield_lines(value)
+        )
+    )
+    #
+    common: typing.Dict[
+        typing.Tuple[object, ...],
+        packaging.requirements.Requirement,
+    ] = {}
+    for requirement_ in _filter_requirements(requirements, None):
+        hash_key = _get_requirement_hash_key(requirement_)
+        common.setdefault(hash_key, requirement_)
+    #
+    dependency_map: DependencyMap = {None: list(common.values())}
+    for extra in metadata.get_all('Provides-Extra', []):
+        dependency_map[_safe_extra(extra.strip())] = [
+            requirement_
+            for requirement_ in _filter_requirements(requirements, extra)
+            if _get_requirement_hash_key(requirement_) not in common
+        ]
+    return dependency_map
+
+
+def _parse_version_key(path: str) -> typing.List[packaging.version.Version]:
+    #
+    (name, extension) = os.path.splitext(path)
+    version_key = []
+    for part in name.split('-') + [extension]:
+        version = packaging.version.Version('0')
+        try:
+            version = packaging.version.Version(part)
+        except packaging.version.InvalidVersion:
+            pass
+        version_key.append(version)
+    return version_key
+
+
+def _get_version_key(path: str) -> typing.List[packaging.version.Version]:
+    """Get the key to sort the metadata paths, parsed only once per path."""
+    version_key = _VERSION_KEYS.get(path, None)
+    if version_key is None:
+        version_key = _parse_version_key(path)
+        _VERSION_KEYS[path] = version_key
+    return version_key
+
+
+def _is_metadata_entry(entry: os.DirEntry[str]) -> bool:
+    #
+    lower_name = entry.name.lower()
+    is_egg_info = lower_name.endswith(EGG_INFO_EXTENSION)
+    is_dist_info = (
+        lower_name.endswith(DIST_INFO_EXTENSION) and entry.is_dir()
+    )
+    return is_egg_info or is_dist_info
+
+
+def find_metadata_paths(
+    path_item: str,
+) -> collections.abc.Iterator[MetadataPath]:
+    """Find distributions metadata on a ``sys.path`` entry.
+
+    Yield the base name, the metadata path, and its stamp for each
+    distribution in the order they would be found by ``pkg_resources``.
+
+    As in the working set of ``pkg_resources``, the ``.egg`` directories and
+    the ``.egg-link`` files in the entry are skipped, the projects installed
+    this way are found through their own ``sys.path`` entries. Unlike
+    ``pkg_resources``, a zipped ``.egg`` entry is not read.
+    """
+    path_item = os.path.normcase(os.path.realpath(path_item))
+    #
+    egg_info_path = os.path.join(path_item, 'EGG-INFO')
+    if (  #
+            path_item.lower().endswith(EGG_EXTENSION)
+            and os.path.isfile(os.path.join(egg_info_path, 'PKG-INFO'))
+    ):
+        stamp = _cache.get_stamp(os.stat(egg_info_path))
+        yield (os.path.basename(path_item), egg_info_path, stamp)
+        return
+    #
+    entries: typing.List[os.DirEntry[str]] = []
+    try:
+        entries = list(os.scandir(path_item))
+    except OSError:
+        pass
+    entries = [entry for entry in entries if _is_metadata_entry(entry)]
+    #
+    paths = sorted(
+        (entry.path for entry in entries),
+        key=_get_version_key,
+        reverse=True,
+    )
+    stamps = {entry.path: _cache.get_stamp(entry.stat()) for entry in entries}
+    for path in paths:
+        yield (os.path.basename(path), path, stamps[path])
+
+
+def _is_header_line(line: bytes) -> bool:
+    #
+    return line not in (b'\n', b'\r\n', b'\r')
+
+
+def _read_header_lines(file_path: str) -> typing.List[bytes]:
+    """Read the lines of the header of the metadata file.
+
+    The header ends at the first blank line. The body that follows, often
+    the long description of the project, is not read past the buffer that
+    holds the end of the header.
+    """
+    with open(file_path, 'rb') as file_:
+        return list(itertools.takewhile(_is_header_line, file_))
+
+
+def _read_metadata(file_path: str) -> email.message.Message:
+    """Parse the header of the metadata file, empty if there is no file."""
+    lines: typing.List[bytes] = []
+    try:
+        lines = _read_header_lines(file_path)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        pass
+    return email.parser.HeaderParser().parsestr(
+        b''.join(lines).decode('utf_8'),
+    )
+
+
+def _parse_base_name(
+    base_name: str,
+) -> typing.Tuple[str, str, typing.Optional[str]]:
+    #
+    (name, extension) = os.path.splitext(base_name)
+    match = _EGG_NAME.match(name)
+    project_name = _safe_name(match.group('name') if match else 'Unknown')
+    version = match.group('version') if match else None
+    return (project_name, extension.lower(), version)
+
+
+def _read_distribution(
+    base_name: str,
+    metadata_path: str,
+) -> typing.Optional[DistributionRecord]:
+    """Read the metadata of a distribution.
+
+    Return nothing if the metadata directory is empty.
+    """
+    (project_name, extension, version) = _parse_base_name(base_name)
+    #
+    metadata = None
+    dependency_map: DependencyMap = {None: []}
+    if os.path.isdir(metadata_path):
+        if not os.listdir(metadata_path):
+            return None
+        if extension == DIST_INFO_EXTENSION:
+            metadata = _read_metadata(os.path.join(metadata_path, 'METADATA'))
+            dependency_map = _get_dist_info_dependency_map(metadata)
+        else:
+            metadata = _read_metadata(os.path.join(metadata_path, 'PKG-INFO'))
+            dependency_map = _get_egg_info_dependency_map(
+                importlib_metadata.Distribution.at(metadata_path),
+            )
+    else:
+        metadata = _read_metadata(metadata_path)
+    #
+    if extension == EGG_INFO_EXTENSION or version is None:
+        version = metadata.get('Version', version)
+    #
+    extra_records = [
+        (
+            extra, [
+                _make_requirement_record(requirement_)
+                for requirement_ in requirements
+            ]
+        ) for (extra, requirements) in dependency_map.items()
+    ]
+    distribution_record = (
+        project_name,
+        _safe_version(version) if version else None,
+        extra_records,
+    )
+    return distribution_record
+
+
+def _get_content_key(base_name: str,
+                     metadata_path: str) -> typing.Optional[str]:
+    """Get a key for the content of the metadata.
+
+    Only the ``METADATA`` of the ``dist-info`` directories are identified
+    by content, the base name is part of the content since the project name
+    and the version are read from it. The body is not part of the content,
+    since nothing is read from it.
+    """
+    content_key = None
+    if base_name.lower().endswith(DIST_INFO_EXTENSION):
+        header_lines = None
+        try:
+            header_lines = _read_header_lines(
+                os.path.join(metadata_path, 'METADATA'),
+            )
+        except OSError:
+            pass
+        if header_lines is not None:
+            digest = hashlib.sha256(os.fsencode(base_name))
+            digest.update(b''.join(header_lines))
+            content_key = digest.hexdigest()
+    return content_key
+
+
+def _read_shared_distribution(
+    cache: _cache.MetadataCache,
+    base_name: str,
+    metadata_path: str,
+) -> typing.Optional[DistributionRecord]:
+    #
+    distribution_record = typing.cast(
+        'typing.Optional[DistributionRecord]',
+        cache.get_shared(metadata_path),
+    )
+    if distribution_record is None:
+        distribution_record = _read_distribution(base_name, metadata_path)
+        if distribution_record is not None:
+            cache.set_shared(metadata_path, distribution_record)
+    return distribution_record
+
+
+def _fetch_shared_records(
+    cache: _cache.MetadataCache,
+    metadata_paths: collections.abc.Iterable[MetadataPath],
+) -> None:
+    """Fetch at once the shared records of the metadata not in the cache."""
+    content_keys = {}
+    for (base_name, metadata_path, stamp) in metadata_paths:
+        if cache.get(metadata_path, stamp) is None:
+            content_key = _get_content_key(base_name, metadata_path)
+            if content_key is not None:
+                content_keys[metadata_path] = content_key
+    cache.fetch_shared(content_keys)
+
+
+def _get_items(
+    value: object,
+    length: typing.Optional[int] = None,
+) -> typing.Optional[typing.Sequence[object]]:
+    """Get the items of a list or a tuple, of the length if any."""
+    items = None
+    if isinstance(value, (list, tuple)):
+        sequence = typing.cast('typing.Sequence[object]', value)
+        if length is None or len(sequence) == length:
+            items = sequence
+    return items
+
+
+def _is_requirement_record(value: object) -> bool:
+    #
+    items = _get_items(value, 4)
+    extras = None if items is None else _get_items(items[1])
+    return (
+        items is not None and extras is not None
+        and all(isinstance(item, str) for item in extras)
+        and all(isinstance(item, str) for item in (items[0], *items[2:]))
+    )
+
+
+def _is_extra_record(value: object) -> bool:
+    #
+    items = _get_items(value, 2)
+    requirement_records = None if items is None else _get_items(items[1])
+    return (
+        items is not None and requirement_records is not None
+        and (items[0] is None or isinstance(items[0], str)) and all(
+            _is_requirement_record(requirement_record)
+            for requirement_record in requirement_records
+        )
+    )
+
+
+def _is_distribution_record(value: object) -> bool:
+    """Tell if the value is a distribution record.
+
+    The records of the cache file are checked before they are used, since
+    the file can be damaged or changed by hand.
+    """
+    items = _get_items(value, 3)
+    extra_records = None if items is None else _get_items(items[2])
+    is_valid = (
+        items is not None and extra_records is not None
+        and isinstance(items[0], str)
+        and (items[1] is None or isinstance(items[1], str)) and
+        all(_is_extra_record(extra_record) for extra_record in extra_records)
+    )
+    # The requirements without extra are always there
+    return is_valid and None in dict(
+        typing.cast('typing.List[ExtraRecord]', extra_records),
+    )
+
+
+def get_distribution_record(
+    cache: typing.Optional[_cache.MetadataCache],
+    base_name: str,
+    metadata_path: str,
+    stamp: _cache.Stamp,
+) -> typing.Optional[DistributionRecord]:
+    """Get the record of the distribution, read from the cache if valid."""
+    distribution_record = None
+    if cache:
+        cached_record = cache.get(metadata_path, stamp)
+        if _is_distribution_record(cached_record):
+            distribution_record = typing.cast(
+                'DistributionRecord',
+                cached_record,
+            )
+    if distribution_record is None:
+        distribution_record = (
+            _read_shared_distribution(cache, base_name, metadata_path)
+            if cache and cache.is_shared() else
+            _read_distribution(base_name, metadata_path)
+        )
+        if cache and distribution_record is not None:
+            cache.set(metadata_path, stamp, distribution_record)
+    return distribution_record
+
+
+def _get_requirements(
+    distribution_record: DistributionRecord,
+    extras: _core.Extras,
+) -> typing.List[RequirementRecord]:
+    #
+    dependency_map = dict(distribution_record[2])
+    requirements = list(dependency_map[None])
+    for extra in extras:
+        requirements.extend(dependency_map.get(_safe_extra(extra), []))
+    return requirements
+
+
+def _get_extra_requirements(
+    distribution_records: typing.Dict[_core.ProjectKey, DistributionRecord],
+    project_key: _core.ProjectKey,
+    extra: _core.Extra,
+) -> typing.List[_core.Requirement]:
+    """Get the requirements specific to one extra of the project."""
+    dependency_map = dict(distribution_records[project_key][2])
+    return [
+        _transform_requirement(project_key, requirement_record)
+        for requirement_record in dependency_map.get(_safe_extra(extra), [])
+    ]
+
+
+def build_distributions(
+    preselection: _core.Selection,
+    metadata_paths: collections.abc.Iterable[MetadataPath],
+    get_record: GetDistributionRecord,
+) -> _core.Distributions:
+    """Build the graph of the distributions found at the metadata paths.
+
+    The first distribution found for a project hides the next ones, whose
+    records are not read.
+    """
+    distributions = _graph.Graph()
+    distribution_records: typing.Dict[_core.ProjectKey, DistributionRecord]
+    distribution_records = {}
+    #
+    for (base_name, metadata_path, stamp) in metadata_paths:
+        project_key = typing.cast(
+            '_core.ProjectKey',
+            _parse_base_name(base_name)[0].lower(),
+        )
+        node_id = distributions.get_id(project_key)
+        if node_id is not None and distributions.get_node(node_id).found:
+            continue
+        with _timings.phase('read metadata'):
+            distribution_record = get_record(base_name, metadata_path, stamp)
+        if distribution_record is None:
+            continue
+        distribution_records[project_key] = distribution_record
+        _core.add_distribution(
+            distributions,
+            project_key,
+            typing.cast('_core.ProjectLabel', distribution_record[0]),
+            typing.cast('_core.ProjectVersion', distribution_record[1]),
+        )
+        #
+        extras = (
+            preselection[project_key].extras
+            if project_key in preselection else ()
+        )
+        #
+        with _timings.phase('requires'):
+            requirement_records = _get_requirements(
+                distribution_record,
+                extras,
+            )
+        _timings.count('requires() calls')
+        for requirement_record in requirement_records:
+            _core.add_dependency(
+                distributions,
+                _transform_requirement(project_key, requirement_record),
+            )
+    #
+    _extras.apply_extras(
+        distributions,
+        functools.partial(_get_extra_requirements, distribution_records),
+        _extras.get_selected_extras(preselection),
+    )
+    _core.detect_conflicts(distributions)
+    #
+    return distributions
+
+
+def discover_distributions(
+    preselection: _core.Selection,
+    cache: typing.Optional[_cache.MetadataCache],
+    path_items: collections.abc.Iterable[str],
+) -> _core.Distributions:
+    """Discover the installed distributions, read from the cache if valid.
+
+    Distributions are searched for in the path items, as in ``sys.path``.
+    """
+    metadata_paths = [
+        metadata_path for path_item in path_items
+        for metadata_path in find_metadata_paths(path_item)
+    ]
+    if cache and cache.is_shared():
+        _fetch_shared_records(cache, metadata_paths)
+    return build_distributions(
+        preselection,
+        metadata_paths,
+        functools.partial(get_distribution_record, cache),
+    )
+
+
+def make_preselection(
+    user_selection: collections.abc.Iterable[str],
+    is_reverse: bool,
+) -> _core.Selection:
+    """Make the preselection from the projects selected by the user."""
+    requirements = [
+        _transform_requirement(
+            None,
+            _make_requirement_record(
+                _markers.parse_requirement(item.strip()),
+            ),
+        ) for item in user_selection
+    ]
+    return _core.make_preselection(requirements, is_reverse)
+
+
+def discover(
+    user_selection: collections.abc.Iterable[str],
+    is_reverse: bool,
+    is_cached: bool,
+) -> typing.Tuple[_core.Distributions, _core.Selection]:
+    """Discover the installed distributions and the user's preselection."""
+    #
+    cache = None
+    if is_cached:
+        cache = _cache.MetadataCache(_cache.get_cache_file_path())
+        with _timings.phase('load cache'):
+            cache.load()
+    #
+    preselection = make_preselection(user_selection, is_reverse)
+    distributions = discover_distributions(preselection, cache, sys.path)
+    #
+    if cache:
+        with _timings.phase('save cache'):
+            cache.save()
+    #
+    return (distributions, preselection)
+
+
+# EOF
@@ -0,0 +1,122 @@
+#
+
+"""Rendering of the entries as JSON, written as soon as they are reached.
+
+The nested document is written one entry per line, the closing brackets of
+the entries are written once their last child is reached, so that the whole
+document is never held in memory.
+"""
+
+from __future__ import annotations
+
+import json
+import typing
+
+from . import _output
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    from . import _core
+    #
+    Record = typing.Dict[str, typing.Union[int, str, None]]
+    Report = typing.Tuple[str, collections.abc.Iterable[str]]
+
+
+def _make_record(entry: _core.Entry) -> Record:
+    #
+    record: Record = {
+        'key': entry.project_key,
+        'project': entry.project_label,
+        'version': entry.version,
+        'status': entry.status.value,
+        'requirement': entry.requirement.str_repr,
+    }
+    return record
+
+
+def render_json(
+    entries: collections.abc.Iterator[_core.Entry],
+    children_name: str,
+) -> collections.abc.Iterator[str]:
+    """Render the entries as an array of nested objects."""
+    children_key = json.dumps(children_name)
+    # Depth of the deepest entry whose children are not closed yet
+    open_depth = -1
+    yield '['
+    for entry in entries:
+        closing = ']}' * (open_depth - entry.depth + 1)
+        separator = ',' if entry.depth <= open_depth else ''
+        record = json.dumps(_make_record(entry))
+        yield f'{closing}{separator}{record[:-1]}, {children_key}: ['
+        open_depth = entry.depth
+    yield ']}' * (open_depth + 1) + ']'
+
+
+def render_json_groups(
+    groups: collections.abc.Iterator[collections.abc.Iterator[_core.Entry]],
+    children_name: str,
+) -> collections.abc.Iterator[str]:
+    """Render each group of entries as an array, in an array."""
+    yield '['
+    for (index, entries) in enumerate(groups):
+        if index > 0:
+            yield ','
+        yield from render_json(entries, children_name)
+    yield ']'
+
+
+def render_ndjson(
+    entries: collections.abc.Iterator[_core.Entry],
+) -> collections.abc.Iterator[str]:
+    """Render each entry as an object on its own line."""
+    for entry in entries:
+        record = _make_record(entry)
+        record['depth'] = entry.depth
+        record['parent'] = entry.parent_key
+        yield json.dumps(record)
+
+
+def render_records(
+    records: collections.abc.Iterable[str],
+    output_format: str,
+) -> collections.abc.Iterator[str]:
+    """Render the objects, each already rendered on a line, in the format.
+
+    The objects are items of an array in JSON, or lines in NDJSON.
+    """
+    if output_format == _output.FORMAT_NDJSON:
+        yield from records
+        return
+    yield '['
+    for (index, record) in enumerate(records):
+        yield record if index == 0 else f',{record}'
+    yield ']'
+
+
+def render_labeled_json(
+    reports: collections.abc.Iterable[Report],
+) -> collections.abc.Iterator[str]:
+    """Render the JSON document of each environment, labeled by its path."""
+    yield '['
+    for (index, (environment_path, lines)) in enumerate(reports):
+        separator = ',' if index > 0 else ''
+        yield f'{separator}{{"environment": {json.dumps(environment_path)},'
+        yield '"projects":'
+        yield from lines
+        yield '}'
+    yield ']'
+
+
+def render_labeled_ndjson(
+    reports: collections.abc.Iterable[Report],
+) -> collections.abc.Iterator[str]:
+    """Render the records of each environment, labeled by its path."""
+    for (environment_path, lines) in reports:
+        prefix = f'{{"environment": {json.dumps(environment_path)}, '
+        for line in lines:
+            # Each line is an object
+            yield prefix + line[1:]
+
+
+# EOF
@@ -0,0 +1,109 @@
+#
+
+"""Parsing of the requirements and evaluation of the markers, memoized.
+
+The same requirement strings and the same markers (``python_version``,
+``sys_platform``, and so on) occur in the metadata of many distributions,
+each is parsed and evaluated only once. The markers are evaluated for the
+current environment, or for a target environment whose variables are read
+from a JSON file, to show the dependencies for another Python version or
+platform without running it.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import typing
+
+import packaging.markers
+import packaging.requirements
+
+if typing.TYPE_CHECKING:
+    #
+    Environment = typing.Dict[str, str]
+    Results = typing.Dict[typing.Tuple[str, str], bool]
+
+
+@dataclasses.dataclass
+class _Evaluator:
+    """Variables of the target environment, and results of the markers."""
+
+    environment: typing.Optional[Environment] = None
+    results: Results = dataclasses.field(default_factory=dict)
+
+
+_EVALUATOR = _Evaluator()
+
+# Requirements by string, they do not depend on the environment
+_REQUIREMENTS: typing.Dict[str, packaging.requirements.Requirement] = {}
+
+
+def read_target_environment(file_path: str) -> Environment:
+    """Read the variables of a target environment from a JSON file.
+
+    The file holds an object mapping the names of the marker variables to
+    their values, the variables left out keep their current values.
+    """
+    with open(file_path, encoding='utf_8') as file_:
+        content = typing.cast(object, json.load(file_))
+    if not isinstance(content, dict):
+        raise ValueError("expected an object of marker variables")
+    environment: Environment = {}
+    for (name, value) in typing.cast('typing.Dict[object, object]',
+                                     content).items():
+        if not isinstance(value, str):
+            raise ValueError(f"value of {name!r} is not a string")
+        environment[str(name)] = value
+    return environment
+
+
+def set_target_environment(environment: typing.Optional[Environment]) -> None:
+    """Evaluate the markers for the target environment, if any."""
+    _EVALUATOR.environment = environment
+    _EVALUATOR.results = {}
+
+
+def get_target_environment() -> typing.Optional[Environment]:
+    """Get the variables of the target environment, if any."""
+    return _EVALUATOR.environment
+
+
+def parse_requirement(text: str) -> packaging.requirements.Requirement:
+    """Parse the requirement string.
+
+    The requirement is shared by all the callers, it must not be modified.
+    """
+    requirement_ = _REQUIREMENTS.get(text, None)
+    if requirement_ is None:
+        requirement_ = packaging.requirements.Requirement(text)
+        _REQUIREMENTS[text] = requirement_
+    return requirement_
+
+
+def _evaluate(marker: str, extra: str) -> bool:
+    #
+    environment = dict(_EVALUATOR.environment or {})
+    environment['extra'] = extra
+    result = False
+    try:
+        result = packaging.markers.Marker(marker).evaluate(environment)
+    except packaging.markers.InvalidMarker:
+        result = False
+    return result
+
+
+def is_satisfied(marker: str, extra: typing.Optional[str] = None) -> bool:
+    """Tell if the marker is satisfied, with the extra if any.
+
+    An invalid marker is never satisfied.
+    """
+    key = (marker, extra or '')
+    result = _EVALUATOR.results.get(key, None)
+    if result is None:
+        result = _evaluate(*key)
+        _EVALUATOR.results[key] = result
+    return result
+
+
+# EOF
@@ -2,12 +2,19 @@
 
 """Meta information."""
 
-import importlib_metadata
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    import importlib_metadata
 
 PROJECT_NAME = 'deptree'
 
 
 def _get_metadata() -> importlib_metadata.PackageMetadata:
+    # Import only on demand, since importing and finding the metadata is slow
+    import importlib_metadata  # pylint: disable=import-outside-toplevel
     return importlib_metadata.metadata(PROJECT_NAME)
 
 
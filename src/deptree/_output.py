@@ -0,0 +1,80 @@
+#
+
+"""Formats of the output, and buffered writing of the rendered lines."""
+
+from __future__ import annotations
+
+import os
+import sys
+import typing
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+# Size in characters of the chunks written to the stream
+BUFFER_SIZE = 64 * 1024
+
+FORMAT_JSON = 'json'
+FORMAT_NDJSON = 'ndjson'
+FORMAT_TEXT = 'text'
+FORMATS = (FORMAT_TEXT, FORMAT_JSON, FORMAT_NDJSON)
+
+
+def _silence(stream: typing.TextIO) -> None:
+    """Point the stream to the null device.
+
+    Python flushes standard output at exit, which would raise once more now
+    that the reading end of the pipe is closed.
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, stream.fileno())
+    os.close(devnull)
+
+
+def _make_chunks(
+    lines: collections.abc.Iterable[str],
+) -> collections.abc.Iterator[str]:
+    #
+    chunk: typing.List[str] = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line) + 1
+        if size >= BUFFER_SIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk.clear()
+            size = 0
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def _write_chunks(
+    chunks: collections.abc.Iterable[str],
+    stream: typing.TextIO,
+) -> None:
+    #
+    for chunk in chunks:
+        stream.write(chunk)
+    stream.flush()
+
+
+def write_lines(
+    lines: collections.abc.Iterable[str],
+    stream: typing.TextIO,
+) -> bool:
+    """Write the lines to the stream in large chunks.
+
+    Lines are consumed lazily, as soon as the stream is closed by the reader
+    (for example a pipe into ``head``) the lines are not consumed anymore.
+    Tell if all the lines were written.
+    """
+    try:
+        _write_chunks(_make_chunks(lines), stream)
+    except BrokenPipeError:
+        if stream is sys.stdout:
+            _silence(stream)
+        return False
+    return True
+
+
+# EOF
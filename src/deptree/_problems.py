@@ -0,0 +1,226 @@
+#
+
+"""Problems of the environment, found without rendering any tree.
+
+The problems are read from the state of the graph: the projects required
+but not found, the requirements not satisfied by the version found, and
+the cycles. Each category of problems sets its own bit of the exit code,
+so that a health check can tell them apart without parsing the output.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import sys
+import typing
+
+from . import _core
+from . import _json
+from . import _output
+from . import _timings
+from . import _traversal
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+EXIT_CIRCULAR = 4
+EXIT_CONFLICT = 8
+EXIT_MISSING = 16
+EXIT_UNKNOWN = 32
+
+_EXIT_CODES = {
+    _core.Status.CIRCULAR: EXIT_CIRCULAR,
+    _core.Status.CONFLICT: EXIT_CONFLICT,
+    _core.Status.MISSING: EXIT_MISSING,
+    _core.Status.UNKNOWN: EXIT_UNKNOWN,
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Problem:
+    """Problem of a project, with the requirement involved if any.
+
+    The subject of a dependency is made of the keys of the dependent and of
+    the dependency, the one of a cycle is made of the keys of its projects.
+    """
+
+    status: _core.Status
+    subject: str
+    requirement: typing.Optional[str]
+
+
+def get_subject(
+    distributions: _core.Distributions,
+    dependent_id: int,
+    dependency_id: int,
+) -> str:
+    """Get the subject of a dependency."""
+    dependent_key = distributions.get_key(dependent_id)
+    return f'{dependent_key} -> {distributions.get_key(dependency_id)}'
+
+
+def _get_scope(
+    distributions: _core.Distributions,
+    preselection: _core.Selection,
+    is_reverse: bool,
+) -> typing.Optional[typing.Set[int]]:
+    """Get the projects reached from the selected ones, all if none."""
+    if not preselection:
+        return None
+    scope: typing.Set[int] = set()
+    visited: typing.Set[int] = set()
+    for project_key in preselection:
+        root_id = distributions.get_id(project_key)
+        if root_id is not None:
+            steps = _traversal.walk(
+                root_id,
+                (
+                    distributions.get_dependents_edges
+                    if is_reverse else distributions.get_dependencies_edges
+                ),
+                (
+                    distributions.get_dependent_id
+                    if is_reverse else distributions.get_dependency_id
+                ),
+                visited,
+            )
+            for (_, node_id, _, _) in steps:
+                scope.add(node_id)
+    return scope
+
+
+def _iter_dependency_problems(
+    distributions: _core.Distributions,
+    scope: typing.Optional[typing.Set[int]],
+) -> collections.abc.Iterator[Problem]:
+    """Find the dependencies missing or in conflict."""
+    node_ids = range(len(distributions)) if scope is None else sorted(scope)
+    for node_id in node_ids:
+        node = distributions.get_node(node_id)
+        if node.found and not node.conflicts:
+            continue
+        status = _core.Status.CONFLICT if node.found else _core.Status.MISSING
+        # The same dependency can be found more than once in the dependents
+        edges_ids = distributions.get_dependents_edges(node_id)
+        for edge_id in dict.fromkeys(edges_ids, True):
+            dependent_id = distributions.get_dependent_id(edge_id)
+            if (scope is None or dependent_id in scope) and (
+                status is _core.Status.MISSING
+                or dependent_id in node.conflicts
+            ):
+                yield Problem(
+                    status,
+                    get_subject(distributions, dependent_id, node_id),
+                    distributions.get_str_repr(edge_id),
+                )
+
+
+@_timings.phase('find problems')
+def find_problems(
+    distributions: _core.Distributions,
+    preselection: typing.Optional[_core.Selection] = None,
+    is_reverse: bool = False,
+) -> typing.List[Problem]:
+    """Find the problems, of the selected projects if any, by category.
+
+    The problems of the selected projects are the ones of the projects they
+    lead to, the selected projects that are not in the graph, and the ones
+    that are required but not found.
+    """
+    if preselection is None:
+        preselection = typing.cast('_core.Selection', {})
+    scope = _get_scope(distributions, preselection, is_reverse)
+    problems = list(_iter_dependency_problems(distributions, scope))
+    for cycle in _core.find_cycles(distributions):
+        if scope is None or any(
+            distributions.get_id(project_key) in scope for project_key in cycle
+        ):
+            problems.append(
+                Problem(_core.Status.CIRCULAR, ', '.join(cycle), None),
+            )
+    for (project_key, requirement) in preselection.items():
+        node_id = distributions.get_id(project_key)
+        if node_id is None:
+            problems.append(
+                Problem(
+                    _core.Status.UNKNOWN,
+                    project_key,
+                    requirement.str_repr,
+                ),
+            )
+        elif not distributions.get_node(node_id).found:
+            # Its dependents are not reached from it, unless in reverse
+            problems.append(
+                Problem(
+                    _core.Status.MISSING,
+                    project_key,
+                    requirement.str_repr,
+                ),
+            )
+    problems_by_subject = {
+        (problem.status.value, problem.subject): problem
+        for problem in problems
+    }
+    return [
+        problems_by_subject[subject]
+        for subject in sorted(problems_by_subject)
+    ]
+
+
+def get_exit_code(problems: collections.abc.Iterable[Problem]) -> int:
+    """Combine the bits of the categories of the problems, 0 if none."""
+    exit_code = 0
+    for problem in problems:
+        exit_code |= _EXIT_CODES[problem.status]
+    return exit_code
+
+
+def _format_problem(problem: Problem) -> str:
+    #
+    line = f'{problem.status.value} {problem.subject}'
+    if problem.requirement is not None:
+        line += f': {problem.requirement}'
+    return line
+
+
+def _make_record(problem: Problem) -> typing.Dict[str, typing.Optional[str]]:
+    #
+    record: typing.Dict[str, typing.Optional[str]] = {
+        'status': problem.status.value,
+        'subject': problem.subject,
+        'requirement': problem.requirement,
+    }
+    return record
+
+
+def render(
+    problems: typing.List[Problem],
+    output_format: str,
+) -> collections.abc.Iterator[str]:
+    """Render the problems, one per line."""
+    if output_format == _output.FORMAT_TEXT:
+        yield from (_format_problem(problem) for problem in problems)
+    else:
+        yield from _json.render_records(
+            (json.dumps(_make_record(problem)) for problem in problems),
+            output_format,
+        )
+
+
+def main(
+    distributions: _core.Distributions,
+    preselection: _core.Selection,
+    options: _core.Options,
+) -> int:
+    """Display the problems, exit with the bits of their categories."""
+    problems = find_problems(distributions, preselection, options.is_reverse)
+    with _timings.phase('render and write'):
+        _output.write_lines(
+            render(problems, options.output_format),
+            sys.stdout,
+        )
+    return get_exit_code(problems)
+
+
+# EOF
@@ -0,0 +1,50 @@
+#
+
+"""Pruning of the traversals of the dependency graph.
+
+The traversals stop at the pruning points instead of filtering their
+output, so that the cost of a query is proportional to what is shown.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import fnmatch
+import re
+import typing
+
+if typing.TYPE_CHECKING:
+    from . import _core
+
+
+@dataclasses.dataclass
+class Pruning:
+    """Where the traversals stop.
+
+    The excluded projects are neither shown nor expanded, the projects at
+    the maximum depth are shown but not expanded.
+    """
+
+    excluded: typing.Optional[typing.Pattern[str]] = None
+    max_depth: typing.Optional[int] = None
+
+
+def make_pruning(options: _core.Options) -> Pruning:
+    """Make the pruning, the patterns are globs on the project keys."""
+    pattern = '|'.join(
+        fnmatch.translate(excluded_pattern)
+        for excluded_pattern in options.excluded_patterns
+    )
+    excluded = re.compile(pattern, re.IGNORECASE) if pattern else None
+    return Pruning(excluded=excluded, max_depth=options.max_depth)
+
+
+def is_excluded(pruning: Pruning, project_key: str) -> bool:
+    """Tell if the project is excluded."""
+    return (
+        pruning.excluded is not None
+        and pruning.excluded.match(project_key) is not None
+    )
+
+
+# EOF
@@ -0,0 +1,100 @@
+#
+
+"""Reachability index of the dependency graph.
+
+The projects reached from a project are stored as a bitset over the
+identifiers of the projects: an integer whose bit ``n`` is set if the
+project of identifier ``n`` is reached. The index is built in a single pass
+over the strongly connected components, then the transitive queries on any
+number of projects are answered with bitwise operations, without walking
+the graph again.
+"""
+
+from __future__ import annotations
+
+import functools
+import typing
+
+from . import _timings
+from . import _traversal
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    from . import _core
+    #
+    Index = typing.List[int]
+
+
+def _iter_child_ids(
+    distributions: _core.Distributions,
+    is_reverse: bool,
+    node_id: int,
+) -> collections.abc.Iterator[int]:
+    #
+    if is_reverse:
+        for edge_id in distributions.get_dependents_edges(node_id):
+            yield distributions.get_dependent_id(edge_id)
+    else:
+        for edge_id in distributions.get_dependencies_edges(node_id):
+            yield distributions.get_dependency_id(edge_id)
+
+
+@_timings.phase('build reachability index')
+def build(distributions: _core.Distributions, is_reverse: bool) -> Index:
+    """Get the bitset of the projects reached from each project.
+
+    A project reaches itself only if it is in a cycle. All the projects of a
+    component share the same bitset.
+    """
+    get_child_ids = functools.partial(
+        _iter_child_ids,
+        distributions,
+        is_reverse,
+    )
+    components = _traversal.find_strongly_connected_components(
+        range(len(distributions)),
+        get_child_ids,
+    )
+    index = [0] * len(distributions)
+    # A component comes after all the components it leads to, so that their
+    # bitsets are complete, the ones of the component itself are still empty
+    for component in components:
+        members = 0
+        reached = 0
+        for node_id in component:
+            members |= 1 << node_id
+            for child_id in get_child_ids(node_id):
+                reached |= index[child_id] | (1 << child_id)
+        if reached & members:
+            reached |= members
+        for node_id in component:
+            index[node_id] = reached
+    return index
+
+
+def get_reached(
+    index: Index,
+    node_ids: collections.abc.Iterable[int],
+) -> int:
+    """Get the bitset of the projects reached from any of the projects.
+
+    A project is in it only if it is reached from another one of the
+    projects, even if it is in a cycle.
+    """
+    reached = 0
+    for node_id in node_ids:
+        reached |= index[node_id] & ~(1 << node_id)
+    return reached
+
+
+def iter_ids(bitset: int) -> collections.abc.Iterator[int]:
+    """Iterate over the identifiers of the projects in the bitset, in order."""
+    # pylint: disable-next=while-used
+    while bitset:
+        lowest_bit = bitset & -bitset
+        yield lowest_bit.bit_length() - 1
+        bitset ^= lowest_bit
+
+
+# EOF
@@ -0,0 +1,195 @@
+#
+
+"""Check of the installed projects against a requirements file.
+
+The requirements file, for example a lock file written by ``pip-compile``,
+is read once. Its requirements are the preselection of the discovery, so
+that the extras they ask for are applied. The listed projects are looked
+up in the version index of the graph, and the projects they lead to are
+reached in a single walk, so that the cost grows with the size of the file
+and of the graph only.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import re
+import sys
+import typing
+
+import packaging.utils
+
+from . import _core
+from . import _json
+from . import _markers
+from . import _output
+from . import _timings
+from . import _traversal
+from . import _versions
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+KIND_MISMATCH = 'mismatch'
+KIND_MISSING = 'missing'
+KIND_UNLISTED = 'unlisted'
+
+_COMMENT_PATTERN = re.compile(r'(?:^|\s+)#.*$')
+# Options of the file, such as ``-r``, and of a requirement, such as
+# ``--hash``
+_OPTION_PATTERN = re.compile(r'(?:^|\s+)--?[A-Za-z].*$')
+
+
+@dataclasses.dataclass(frozen=True)
+class Finding:
+    """Listed project missing or not satisfied, or unlisted project.
+
+    The requirement is ``None`` for an unlisted project, the version is
+    ``None`` for a missing one.
+    """
+
+    kind: str
+    project_key: _core.ProjectKey
+    version: typing.Optional[_core.ProjectVersion]
+    requirement: typing.Optional[str]
+
+
+def read_requirements(file_path: str) -> typing.List[str]:
+    """Read the requirements of the file that apply to the environment.
+
+    The options, such as ``-r`` or ``--hash``, are ignored, as are the
+    requirements whose markers are not satisfied. An invalid requirement
+    raises ``ValueError``.
+    """
+    with open(file_path, encoding='utf_8') as file_:
+        content = file_.read()
+    requirements = []
+    for line in content.replace('\\\n', ' ').splitlines():
+        text = _OPTION_PATTERN.sub('', _COMMENT_PATTERN.sub('', line)).strip()
+        if text:
+            marker = _markers.parse_requirement(text).marker
+            if marker is None or _markers.is_satisfied(str(marker)):
+                requirements.append(text)
+    return requirements
+
+
+def _iter_reached_ids(
+    distributions: _core.Distributions,
+    root_ids: typing.List[int],
+) -> collections.abc.Iterator[int]:
+    """Walk once from all the projects, each project is reached once."""
+    visited: typing.Set[int] = set()
+    for root_id in root_ids:
+        steps = _traversal.walk(
+            root_id,
+            distributions.get_dependencies_edges,
+            distributions.get_dependency_id,
+            visited,
+        )
+        for (_, node_id, _, _) in steps:
+            yield node_id
+
+
+@_timings.phase('check against requirements')
+def check(
+    distributions: _core.Distributions,
+    preselection: _core.Selection,
+) -> typing.List[Finding]:
+    """Find the listed projects missing or not satisfied, then the unlisted.
+
+    The unlisted projects are the ones installed that the listed ones lead
+    to.
+    """
+    version_index = _versions.make_version_index(distributions)
+    findings = []
+    listed_keys: typing.Set[str] = set()
+    listed_ids = []
+    for project_key in sorted(preselection):
+        requirement = preselection[project_key]
+        listed_keys.add(project_key)
+        listed_keys.add(packaging.utils.canonicalize_name(project_key))
+        version = _versions.get_version(version_index, project_key)
+        if version is None:
+            findings.append(
+                Finding(KIND_MISSING, project_key, None, requirement.str_repr),
+            )
+        elif not _versions.is_satisfied(requirement.specifier, version):
+            findings.append(
+                Finding(
+                    KIND_MISMATCH,
+                    project_key,
+                    version,
+                    requirement.str_repr,
+                ),
+            )
+        node_id = distributions.get_id(project_key)
+        if node_id is not None:
+            listed_ids.append(node_id)
+    unlisted: typing.Dict[_core.ProjectKey, Finding] = {}
+    for node_id in _iter_reached_ids(distributions, listed_ids):
+        project_key = distributions.get_key(node_id)
+        node = distributions.get_node(node_id)
+        if node.found and not (
+            project_key in listed_keys
+            or packaging.utils.canonicalize_name(project_key) in listed_keys
+        ):
+            unlisted[project_key] = Finding(
+                KIND_UNLISTED,
+                project_key,
+                node.version,
+                None,
+            )
+    findings.extend(unlisted[project_key] for project_key in sorted(unlisted))
+    return findings
+
+
+def _format_finding(finding: Finding) -> str:
+    #
+    label = str(finding.project_key)
+    if finding.version is not None:
+        label += f'=={finding.version}'
+    line = f'{finding.kind} {label}'
+    if finding.requirement is not None:
+        line += f': {finding.requirement}'
+    return line
+
+
+def _make_record(finding: Finding) -> typing.Dict[str, typing.Optional[str]]:
+    #
+    record: typing.Dict[str, typing.Optional[str]] = {
+        'kind': finding.kind,
+        'key': finding.project_key,
+        'version': finding.version,
+        'requirement': finding.requirement,
+    }
+    return record
+
+
+def render(
+    findings: typing.List[Finding],
+    output_format: str,
+) -> collections.abc.Iterator[str]:
+    """Render the findings, one per line."""
+    if output_format == _output.FORMAT_TEXT:
+        yield from (_format_finding(finding) for finding in findings)
+    else:
+        yield from _json.render_records(
+            (json.dumps(_make_record(finding)) for finding in findings),
+            output_format,
+        )
+
+
+def main(
+    distributions: _core.Distributions,
+    preselection: _core.Selection,
+    output_format: str,
+) -> int:
+    """Display the findings, fail if there is any."""
+    findings = check(distributions, preselection)
+    with _timings.phase('render and write'):
+        _output.write_lines(render(findings, output_format), sys.stdout)
+    return 1 if findings else 0
+
+
+# EOF
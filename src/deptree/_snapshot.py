@@ -0,0 +1,471 @@
+#
+
+"""Snapshot of the dependency graph in a SQLite file.
+
+A snapshot holds the projects, found or not, their conflicts, and their
+dependencies, so that the graph of an environment can be shown somewhere
+else without scanning it. The projects and the dependencies are read from
+the indexed tables only when they are reached, so that showing a few
+projects does not read the whole snapshot.
+"""
+
+from __future__ import annotations
+
+import array
+import contextlib
+import os
+import pathlib
+import sqlite3
+import typing
+
+from . import _core
+from . import _graph
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    # Dependent, dependency, extras, string representation, and specifier
+    EdgeRecord = typing.Tuple[int, int, str, str, str]
+    # Found, project name, version, and conflicts
+    NodeFields = typing.Tuple[
+        int,
+        typing.Optional[str],
+        typing.Optional[str],
+        str,
+    ]
+    # Key, and the fields of the node
+    NodeRecord = typing.Tuple[
+        str,
+        int,
+        typing.Optional[str],
+        typing.Optional[str],
+        str,
+    ]
+
+SNAPSHOT_FORMAT_VERSION = '1'
+
+# Size of the file that can be mapped in memory for reading
+_MMAP_SIZE = 1 << 30
+
+_SCHEMA = (
+    'CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID',
+    (
+        'CREATE TABLE nodes (id INTEGER PRIMARY KEY, key TEXT UNIQUE,'
+        ' found INTEGER, project_name TEXT, version TEXT, conflicts TEXT)'
+    ),
+    (
+        'CREATE TABLE edges (id INTEGER PRIMARY KEY, dependent_id INTEGER,'
+        ' dependency_id INTEGER, extras TEXT, str_repr TEXT, specifier TEXT)'
+    ),
+    'CREATE INDEX edges_dependent_id ON edges (dependent_id, id)',
+    # Every addition of a dependency counts as a dependent, in order
+    (
+        'CREATE TABLE dependents (dependency_id INTEGER, position INTEGER,'
+        ' edge_id INTEGER, PRIMARY KEY (dependency_id, position))'
+        ' WITHOUT ROWID'
+    ),
+)
+
+
+class SnapshotError(_core.DeptreeException):
+    """File that is not a readable snapshot."""
+
+
+def _iter_nodes(
+    distributions: _core.Distributions,
+) -> collections.abc.Iterator[typing.Tuple[object, ...]]:
+    #
+    for node_id in range(len(distributions)):
+        node = distributions.get_node(node_id)
+        yield (
+            node_id,
+            distributions.get_key(node_id),
+            node.found,
+            node.project_name,
+            node.version,
+            ' '.join(str(dependent_id) for dependent_id in node.conflicts),
+        )
+
+
+def _iter_edges(
+    distributions: _core.Distributions,
+) -> collections.abc.Iterator[typing.Tuple[object, ...]]:
+    #
+    for edge_id in range(distributions.get_edges_count()):
+        yield (
+            edge_id,
+            distributions.get_dependent_id(edge_id),
+            distributions.get_dependency_id(edge_id),
+            ' '.join(distributions.get_extras(edge_id)),
+            distributions.get_str_repr(edge_id),
+            distributions.get_specifier(edge_id),
+        )
+
+
+def _iter_dependents(
+    distributions: _core.Distributions,
+) -> collections.abc.Iterator[typing.Tuple[int, int, int]]:
+    #
+    for node_id in range(len(distributions)):
+        edge_ids = distributions.get_dependents_edges(node_id)
+        for (position, edge_id) in enumerate(edge_ids):
+            yield (node_id, position, edge_id)
+
+
+def _write(
+    connection: sqlite3.Connection,
+    distributions: _core.Distributions,
+) -> None:
+    #
+    with connection:
+        for statement in _SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            'INSERT INTO meta VALUES (?, ?)',
+            (
+                ('format', SNAPSHOT_FORMAT_VERSION),
+                ('nodes', str(len(distributions))),
+                ('edges', str(distributions.get_edges_count())),
+            ),
+        )
+        connection.executemany(
+            'INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?)',
+            _iter_nodes(distributions),
+        )
+        connection.executemany(
+            'INSERT INTO edges VALUES (?, ?, ?, ?, ?, ?)',
+            _iter_edges(distributions),
+        )
+        connection.executemany(
+            'INSERT INTO dependents VALUES (?, ?, ?)',
+            _iter_dependents(distributions),
+        )
+
+
+def _write_file(file_path: str, distributions: _core.Distributions) -> None:
+    #
+    with contextlib.closing(sqlite3.connect(file_path)) as connection:
+        _write(connection, distributions)
+
+
+def save(distributions: _core.Distributions, file_path: str) -> None:
+    """Write the snapshot of the graph, replacing the file if any."""
+    temporary_path = f'{file_path}.{os.getpid()}.tmp'
+    try:
+        # Left over by an interrupted run
+        os.remove(temporary_path)
+    except FileNotFoundError:
+        pass
+    try:
+        _write_file(temporary_path, distributions)
+    except sqlite3.Error as exception:
+        # Not created if the directory does not exist, for example
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise SnapshotError(str(exception)) from exception
+    os.replace(temporary_path, file_path)
+
+
+def _make_node(
+    found: int,
+    project_name: typing.Optional[str],
+    version: typing.Optional[str],
+    conflicts: str,
+) -> _graph.Node:
+    #
+    return _graph.Node(
+        [int(dependent_id) for dependent_id in conflicts.split()],
+        bool(found),
+        typing.cast('typing.Optional[_core.ProjectLabel]', project_name),
+        typing.cast('typing.Optional[_core.ProjectVersion]', version),
+    )
+
+
+def _read_meta(connection: sqlite3.Connection) -> typing.Dict[str, str]:
+    #
+    # The pages are read from the mapped file instead of copied
+    connection.execute(f'PRAGMA mmap_size = {_MMAP_SIZE}')
+    return dict(
+        typing.cast(
+            'typing.List[typing.Tuple[str, str]]',
+            connection.execute('SELECT name, value FROM meta').fetchall(),
+        ),
+    )
+
+
+class SnapshotGraph(_graph.Graph):
+    """Graph read from a snapshot, one project at a time, read only.
+
+    The projects and the dependencies keep the identifiers they had in the
+    graph the snapshot was made of.
+    """
+
+    __slots__ = (
+        '_connection',
+        '_counts',
+        '_edge_records',
+        '_node_ids',
+        '_node_records',
+        '_rows_dependencies',
+        '_rows_dependents',
+    )
+
+    def __init__(self, file_path: str) -> None:
+        """Open the snapshot file."""
+        super().__init__()
+        uri = pathlib.Path(file_path).resolve().as_uri() + '?mode=ro'
+        try:
+            self._connection = sqlite3.connect(uri, uri=True)
+        except sqlite3.Error as exception:
+            raise SnapshotError(str(exception)) from exception
+        self._node_ids: typing.Dict[str, typing.Optional[int]] = {}
+        self._node_records: typing.Dict[int, typing.Tuple[str,
+                                                          _graph.Node]] = {}
+        self._edge_records: typing.Dict[int, EdgeRecord] = {}
+        self._rows_dependencies: typing.Dict[int, array.array[int]] = {}
+        self._rows_dependents: typing.Dict[int, array.array[int]] = {}
+        try:
+            meta = _read_meta(self._connection)
+        except sqlite3.Error as exception:
+            self._connection.close()
+            raise SnapshotError(str(exception)) from exception
+        if meta.get('format') != SNAPSHOT_FORMAT_VERSION:
+            self._connection.close()
+            raise SnapshotError("unsupported snapshot format")
+        # Count of projects, and of dependencies
+        self._counts = (int(meta['nodes']), int(meta['edges']))
+
+    def close(self) -> None:
+        """Close the snapshot file."""
+        self._connection.close()
+
+    def __contains__(self, project_key: object) -> bool:
+        """Tell if the project is in the graph."""
+        return (
+            isinstance(project_key, str)
+            and self.get_id(typing.cast('_core.ProjectKey', project_key)
+                            ) is not None
+        )
+
+    def __iter__(self) -> collections.abc.Iterator[_core.ProjectKey]:
+        """Iterate over the project keys, in order of addition."""
+        return (self.get_key(node_id) for node_id in range(len(self)))
+
+    def __len__(self) -> int:
+        """Get the count of projects."""
+        return self._counts[0]
+
+    def add_node(self, project_key: _core.ProjectKey) -> _graph.Node:
+        """Refuse to change the graph."""
+        raise TypeError("snapshot graph is read only")
+
+    def add_edge(
+        self,
+        dependent_key: _core.ProjectKey,
+        dependency_key: _core.ProjectKey,
+        extras: _core.Extras,
+        str_repr: str,
+        specifier: str,
+    ) -> int:
+        """Refuse to change the graph."""
+        raise TypeError("snapshot graph is read only")
+
+    def _query(
+        self,
+        statement: str,
+        parameters: typing.Tuple[object, ...] = (),
+    ) -> typing.List[typing.Tuple[object, ...]]:
+        """Get the rows of the query, a damaged file is a snapshot error."""
+        try:
+            rows = typing.cast(
+                'typing.List[typing.Tuple[object, ...]]',
+                self._connection.execute(statement, parameters).fetchall(),
+            )
+        except sqlite3.Error as exception:
+            raise SnapshotError(str(exception)) from exception
+        return rows
+
+    def _query_one(
+        self,
+        statement: str,
+        parameters: typing.Tuple[object, ...],
+    ) -> typing.Tuple[object, ...]:
+        """Get the row of the query, a missing row is a snapshot error."""
+        rows = self._query(statement, parameters)
+        if not rows:
+            raise SnapshotError("incomplete snapshot")
+        return rows[0]
+
+    def read_all(self) -> None:
+        """Read all the projects and the dependencies at once.
+
+        This is faster than reading them one at a time, when all of them
+        are shown anyway.
+        """
+        nodes = typing.cast(
+            'typing.List[typing.Tuple[int, str, int, typing.Optional[str],'
+            ' typing.Optional[str], str]]',
+            self._query('SELECT * FROM nodes'),
+        )
+        for (node_id, key, *node_fields) in nodes:
+            self._node_ids[key] = node_id
+            self._node_records[node_id] = (
+                key,
+                _make_node(*typing.cast('NodeFields', node_fields)),
+            )
+        rows_dependencies = self._rows_dependencies
+        rows_dependents = self._rows_dependents
+        for node_id in range(len(self)):
+            rows_dependencies[node_id] = array.array('l')
+            rows_dependents[node_id] = array.array('l')
+        edges = typing.cast(
+            'typing.List[typing.Tuple[int, int, int, str, str, str]]',
+            self._query('SELECT * FROM edges ORDER BY id'),
+        )
+        for (edge_id, *edge_record) in edges:
+            self._edge_records[edge_id] = typing.cast(
+                'EdgeRecord',
+                tuple(edge_record),
+            )
+            rows_dependencies[self._edge_records[edge_id][0]].append(edge_id)
+        dependents = typing.cast(
+            'typing.List[typing.Tuple[int, int]]',
+            self._query(
+                'SELECT dependency_id, edge_id FROM dependents'
+                ' ORDER BY dependency_id, position',
+            ),
+        )
+        for (dependency_id, edge_id) in dependents:
+            rows_dependents[dependency_id].append(edge_id)
+
+    def _get_node_record(self, node_id: int) -> typing.Tuple[str, _graph.Node]:
+        node_record = self._node_records.get(node_id, None)
+        if node_record is None:
+            (key, found, project_name, version, conflicts) = typing.cast(
+                'NodeRecord',
+                self._query_one(
+                    'SELECT key, found, project_name, version, conflicts'
+                    ' FROM nodes WHERE id = ?',
+                    (node_id, ),
+                ),
+            )
+            node_record = (
+                key,
+                _make_node(found, project_name, version, conflicts),
+            )
+            self._node_records[node_id] = node_record
+        return node_record
+
+    def _get_edge_record(self, edge_id: int) -> EdgeRecord:
+        edge_record = self._edge_records.get(edge_id, None)
+        if edge_record is None:
+            edge_record = typing.cast(
+                'EdgeRecord',
+                self._query_one(
+                    'SELECT dependent_id, dependency_id, extras, str_repr,'
+                    ' specifier FROM edges WHERE id = ?',
+                    (edge_id, ),
+                ),
+            )
+            self._edge_records[edge_id] = edge_record
+        return edge_record
+
+    def get_id(
+        self,
+        project_key: _core.ProjectKey,
+    ) -> typing.Optional[int]:
+        """Get the identifier of the project, if it is in the graph."""
+        if project_key not in self._node_ids:
+            rows = typing.cast(
+                'typing.List[typing.Tuple[int]]',
+                self._query(
+                    'SELECT id FROM nodes WHERE key = ?',
+                    (project_key, ),
+                ),
+            )
+            self._node_ids[project_key] = rows[0][0] if rows else None
+        return self._node_ids[project_key]
+
+    def get_key(self, node_id: int) -> _core.ProjectKey:
+        """Get the key of the project."""
+        key = self._get_node_record(node_id)[0]
+        return typing.cast('_core.ProjectKey', key)
+
+    def get_node(self, node_id: int) -> _graph.Node:
+        """Get the node of the project."""
+        return self._get_node_record(node_id)[1]
+
+    def get_dependencies_edges(self, node_id: int) -> array.array[int]:
+        """Get the edges to the dependencies, in order of addition."""
+        edge_ids = self._rows_dependencies.get(node_id, None)
+        if edge_ids is None:
+            edge_ids = array.array('l')
+            rows = typing.cast(
+                'typing.List[typing.Tuple[int, int, int, str, str, str]]',
+                self._query(
+                    'SELECT id, dependent_id, dependency_id, extras,'
+                    ' str_repr, specifier FROM edges'
+                    ' WHERE dependent_id = ? ORDER BY id',
+                    (node_id, ),
+                ),
+            )
+            for (edge_id, *edge_record) in rows:
+                edge_ids.append(edge_id)
+                self._edge_records[edge_id] = typing.cast(
+                    'EdgeRecord',
+                    tuple(edge_record),
+                )
+            self._rows_dependencies[node_id] = edge_ids
+        return edge_ids
+
+    def get_dependents_edges(self, node_id: int) -> array.array[int]:
+        """Get the edges from the dependents, in order of addition."""
+        edge_ids = self._rows_dependents.get(node_id, None)
+        if edge_ids is None:
+            rows = typing.cast(
+                'typing.List[typing.Tuple[int]]',
+                self._query(
+                    'SELECT edge_id FROM dependents'
+                    ' WHERE dependency_id = ? ORDER BY position',
+                    (node_id, ),
+                ),
+            )
+            edge_ids = array.array('l', (row[0] for row in rows))
+            self._rows_dependents[node_id] = edge_ids
+        return edge_ids
+
+    def get_dependent_id(self, edge_id: int) -> int:
+        """Get the identifier of the dependent project of the edge."""
+        return self._get_edge_record(edge_id)[0]
+
+    def get_dependency_id(self, edge_id: int) -> int:
+        """Get the identifier of the dependency project of the edge."""
+        return self._get_edge_record(edge_id)[1]
+
+    def get_edges_count(self) -> int:
+        """Get the count of dependencies."""
+        return self._counts[1]
+
+    def get_extras(self, edge_id: int) -> _core.Extras:
+        """Get the extras required by the edge."""
+        extras = self._get_edge_record(edge_id)[2]
+        return typing.cast('_core.Extras', tuple(extras.split()))
+
+    def get_specifier(self, edge_id: int) -> str:
+        """Get the version specifier required by the edge."""
+        return self._get_edge_record(edge_id)[4]
+
+    def get_specifiers(self, edge_id: int) -> typing.List[str]:
+        """Get the version specifier required by the edge.
+
+        The specifiers of the earlier additions of the edge are not in the
+        snapshot, the conflicts they lead to are.
+        """
+        return [self.get_specifier(edge_id)]
+
+    def get_str_repr(self, edge_id: int) -> str:
+        """Get the requirement of the edge as written."""
+        return self._get_edge_record(edge_id)[3]
+
+
+# EOF
@@ -0,0 +1,109 @@
+#
+
+"""Wall time of the phases of a run, and counts of what they went through.
+
+Nothing is recorded unless enabled, so that the phases cost next to nothing
+in a normal run. A phase entered several times adds up its durations.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import sys
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    Counts = typing.Dict[str, int]
+    Durations = typing.Dict[str, float]
+
+_KIBIBYTE = 1024
+_MEBIBYTE = 1024 * 1024
+# Platform whose peak memory is counted in bytes instead of kibibytes
+_PLATFORM_BYTES = 'darwin'
+
+
+@dataclasses.dataclass
+class _Recorder:
+    """Durations in seconds and counts, in order of first record."""
+
+    counts: Counts = dataclasses.field(default_factory=dict)
+    durations: Durations = dataclasses.field(default_factory=dict)
+    is_enabled: bool = False
+
+
+_RECORDER = _Recorder()
+
+
+def enable() -> None:
+    """Start recording."""
+    _RECORDER.is_enabled = True
+
+
+def is_enabled() -> bool:
+    """Tell if recording."""
+    return _RECORDER.is_enabled
+
+
+@contextlib.contextmanager
+def phase(name: str) -> collections.abc.Iterator[None]:
+    """Add the wall time spent in the context to the duration of the phase."""
+    if not _RECORDER.is_enabled:
+        yield
+        return
+    durations = _RECORDER.durations
+    # Phases are reported in the order they are entered, not left
+    durations.setdefault(name, 0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        durations[name] += time.perf_counter() - start
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add the value to the counter."""
+    if _RECORDER.is_enabled:
+        _RECORDER.counts[name] = _RECORDER.counts.get(name, 0) + value
+
+
+def _get_peak_memory() -> typing.Optional[int]:
+    """Get the peak resident memory of the process in bytes, if known."""
+    peak_memory = None
+    try:
+        # Not available on all platforms, for example Windows
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        pass
+    else:
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != _PLATFORM_BYTES:
+            peak_memory *= _KIBIBYTE
+    return peak_memory
+
+
+def _format_report() -> collections.abc.Iterator[str]:
+    #
+    yield f"{'phase':<32}{'time (ms)':>12}"
+    for (name, duration) in _RECORDER.durations.items():
+        yield f"{name:<32}{duration * 1000:>12.1f}"
+    yield ""
+    yield f"{'counter':<32}{'count':>12}"
+    for (name, value) in _RECORDER.counts.items():
+        yield f"{name:<32}{value:>12}"
+    peak_memory = _get_peak_memory()
+    if peak_memory is not None:
+        yield f"{'peak memory (MiB)':<32}{peak_memory / _MEBIBYTE:>12.1f}"
+
+
+def report(stream: typing.TextIO) -> None:
+    """Write the durations of the phases and the counters."""
+    for line in _format_report():
+        stream.write(line + '\n')
+    stream.flush()
+
+
+# EOF
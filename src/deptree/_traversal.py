@@ -0,0 +1,200 @@
+#
+
+"""Iterative depth first traversal of the dependency graph."""
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+
+Key = typing.TypeVar('Key', bound='collections.abc.Hashable')
+Edge = typing.TypeVar('Edge')
+
+
+class Path(typing.Generic[Key]):
+    """Chain of keys from the root to the current node of a traversal.
+
+    Keys are pushed when a node is entered and popped when it is left, so
+    that the path is never copied, membership is tested in constant time.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._keys: typing.List[Key] = []
+        self._keys_set: typing.Set[Key] = set()
+
+    def __contains__(self, key: object) -> bool:
+        """Tell if the key is in the path."""
+        return key in self._keys_set
+
+    def __len__(self) -> int:
+        """Get the length of the path."""
+        return len(self._keys)
+
+    def push(self, key: Key) -> None:
+        """Enter the node for the key."""
+        self._keys.append(key)
+        self._keys_set.add(key)
+
+    def pop(self) -> Key:
+        """Leave the current node."""
+        key = self._keys.pop()
+        self._keys_set.discard(key)
+        return key
+
+
+def _is_expanded(
+    key: Key,
+    depth: int,
+    max_depth: typing.Optional[int],
+    visited: typing.Optional[typing.Set[Key]],
+) -> bool:
+    #
+    return (
+        (max_depth is None or depth < max_depth)
+        and (visited is None or key not in visited)
+    )
+
+
+def walk(
+    root_key: Key,
+    get_children: collections.abc.Callable[[Key],
+                                           collections.abc.Iterable[Edge]],
+    get_key: collections.abc.Callable[[Edge], Key],
+    visited: typing.Optional[typing.Set[Key]] = None,
+    max_depth: typing.Optional[int] = None,
+) -> collections.abc.Iterator[typing.Tuple[int, Key, typing.Optional[Edge],
+                                           bool]]:
+    """Walk depth first from the root node, without recursion.
+
+    Yield the depth, the key of the node reached, the edge it is reached
+    through (none for the root), and whether the node is already in the
+    current path (circular) for each node, in pre-order.
+
+    Without ``visited`` every path is followed, as needed to display a tree.
+    With ``visited`` each node is expanded only once, and the keys of the
+    nodes reached are added to it, so that it can be shared by several
+    walks. A key is added right after it is first yielded, so that the
+    caller can tell if the node was reached before.
+
+    With ``max_depth`` the nodes at that depth are yielded but neither
+    expanded nor added to ``visited``, the nodes below are never reached.
+    """
+    path: Path[Key] = Path()
+    stack: typing.List[collections.abc.Iterator[Edge]] = []
+    yield (0, root_key, None, False)
+    if _is_expanded(root_key, 0, max_depth, visited):
+        if visited is not None:
+            visited.add(root_key)
+        path.push(root_key)
+        stack.append(iter(get_children(root_key)))
+    # pylint: disable-next=while-used
+    while stack:
+        edge = next(stack[-1], None)
+        if edge is None:
+            stack.pop()
+            path.pop()
+        else:
+            key = get_key(edge)
+            depth = len(path)
+            is_circular = key in path
+            yield (depth, key, edge, is_circular)
+            if not is_circular and _is_expanded(
+                key,
+                depth,
+                max_depth,
+                visited,
+            ):
+                if visited is not None:
+                    visited.add(key)
+                path.push(key)
+                stack.append(iter(get_children(key)))
+
+
+class _ComponentsFinder(typing.Generic[Key]):
+    """Tarjan's algorithm, with an explicit stack instead of recursion."""
+
+    def __init__(
+        self,
+        get_children: collections.abc.Callable[[Key],
+                                               collections.abc.Iterable[Key]],
+    ) -> None:
+        """Initialize."""
+        self._get_children = get_children
+        self._indexes: typing.Dict[Key, int] = {}
+        self._low_links: typing.Dict[Key, int] = {}
+        # Position in the pending keys, for the keys not in a component yet
+        self._positions: typing.Dict[Key, int] = {}
+        self._pending: typing.List[Key] = []
+        self._stack: typing.List[typing.Tuple[Key,
+                                              collections.abc.Iterator[Key]]
+                                 ] = []
+        self._components: typing.List[typing.List[Key]] = []
+
+    def _enter(self, key: Key) -> None:
+        self._indexes[key] = len(self._indexes)
+        self._low_links[key] = self._indexes[key]
+        self._positions[key] = len(self._pending)
+        self._pending.append(key)
+        self._stack.append((key, iter(self._get_children(key))))
+
+    def _leave(self, key: Key) -> None:
+        self._stack.pop()
+        if self._stack:
+            parent_key = self._stack[-1][0]
+            self._low_links[parent_key] = min(
+                self._low_links[parent_key],
+                self._low_links[key],
+            )
+        if self._low_links[key] == self._indexes[key]:
+            position = self._positions[key]
+            component = self._pending[position:]
+            del self._pending[position:]
+            for member_key in component:
+                del self._positions[member_key]
+            self._components.append(component)
+
+    def get_components(self) -> typing.List[typing.List[Key]]:
+        """Get the components found so far."""
+        return self._components
+
+    def visit(self, root_key: Key) -> None:
+        """Find the components reachable from the key."""
+        if root_key not in self._indexes:
+            self._enter(root_key)
+        # pylint: disable-next=while-used
+        while self._stack:
+            (key, children) = self._stack[-1]
+            child_key = next(children, None)
+            if child_key is None:
+                self._leave(key)
+            elif child_key not in self._indexes:
+                self._enter(child_key)
+            elif child_key in self._positions:
+                self._low_links[key] = min(
+                    self._low_links[key],
+                    self._indexes[child_key],
+                )
+
+
+def find_strongly_connected_components(
+    keys: collections.abc.Iterable[Key],
+    get_children: collections.abc.Callable[[Key],
+                                           collections.abc.Iterable[Key]],
+) -> typing.List[typing.List[Key]]:
+    """Find the strongly connected components of a graph in a single pass.
+
+    Components are listed in reverse topological order, a component comes
+    after all the components it leads to. The first key of a component is
+    the first one reached, for a component that no other component leads to
+    it is the first of its keys in ``keys``.
+    """
+    finder = _ComponentsFinder(get_children)
+    for key in keys:
+        finder.visit(key)
+    return finder.get_components()
+
+
+# EOF
@@ -0,0 +1,92 @@
+#
+
+"""Versions of the installed projects, and checks of the version specifiers.
+
+Each specifier is parsed only once, however many requirements share it, and
+each version is checked against it only once.
+"""
+
+from __future__ import annotations
+
+import typing
+
+import packaging.specifiers
+import packaging.utils
+import packaging.version
+
+if typing.TYPE_CHECKING:
+    from . import _core
+    #
+    VersionIndex = typing.Dict[str, _core.ProjectVersion]
+
+_SPECIFIER_SETS: typing.Dict[str, packaging.specifiers.SpecifierSet] = {}
+_CHECKS: typing.Dict[typing.Tuple[str, str], bool] = {}
+
+
+def _parse_specifier(specifier: str) -> packaging.specifiers.SpecifierSet:
+    #
+    specifier_set = _SPECIFIER_SETS.get(specifier, None)
+    if specifier_set is None:
+        specifier_set = packaging.specifiers.SpecifierSet(specifier)
+        _SPECIFIER_SETS[specifier] = specifier_set
+    return specifier_set
+
+
+def _check(specifier: str, version: str) -> bool:
+    #
+    specifier_set = _parse_specifier(specifier)
+    result = False
+    try:
+        result = specifier_set.contains(
+            packaging.version.Version(version),
+            prereleases=True,
+        )
+    except packaging.version.InvalidVersion:
+        result = not specifier_set
+    return result
+
+
+def is_satisfied(specifier: str, version: str) -> bool:
+    """Tell if the version satisfies the specifier, any version if empty."""
+    result = _CHECKS.get((specifier, version), None)
+    if result is None:
+        result = _check(specifier, version)
+        _CHECKS[(specifier, version)] = result
+    return result
+
+
+def make_version_index(distributions: _core.Distributions) -> VersionIndex:
+    """Map the key of each found distribution to its version.
+
+    The canonicalized key maps to the version as well, so that a dependency
+    on a project spelled differently is still checked.
+    """
+    version_index: VersionIndex = {}
+    found_versions = []
+    for (node_id, project_key) in enumerate(distributions):
+        node = distributions.get_node(node_id)
+        if node.found and node.version is not None:
+            found_versions.append((project_key, node.version))
+    for (project_key, version) in found_versions:
+        canonical_key = packaging.utils.canonicalize_name(project_key)
+        version_index[canonical_key] = version
+    for (project_key, version) in found_versions:
+        version_index[project_key] = version
+    return version_index
+
+
+def get_version(
+    version_index: VersionIndex,
+    project_key: str,
+) -> typing.Optional[_core.ProjectVersion]:
+    """Get the version of the project, if found, even if spelled otherwise."""
+    version = version_index.get(project_key, None)
+    if version is None:
+        version = version_index.get(
+            packaging.utils.canonicalize_name(project_key),
+            None,
+        )
+    return version
+
+
+# EOF
@@ -0,0 +1,335 @@
+#
+
+"""Display again each time the installed distributions change.
+
+The directories of ``sys.path`` are watched with inotify where available,
+otherwise they are checked at regular intervals. Only the directories that
+changed are scanned again, and only the metadata of the distributions whose
+stamp changed is read again, the records of the other distributions are kept
+in memory. The graph is then built again from the records, its edges are
+stored in rows that are rebuilt as a whole after any change anyway.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import functools
+import os
+import select
+import struct
+import sys
+import time
+import typing
+
+from . import _cache
+from . import _core
+from . import _importlib_metadata
+from . import _output
+from . import _timings
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    # File descriptor, and the directory of each watch descriptor
+    Inotify = typing.Tuple[int, typing.Dict[int, str]]
+    # Metadata paths found on each path item of ``sys.path``
+    MetadataPaths = typing.Dict[
+        str,
+        typing.List[_importlib_metadata.MetadataPath],
+    ]
+    # Stamp, and record of each metadata path
+    Records = typing.Dict[
+        str,
+        typing.Tuple[
+            _cache.Stamp,
+            typing.Optional[_importlib_metadata.DistributionRecord],
+        ],
+    ]
+
+# Seconds between two checks, when inotify is not available
+POLL_INTERVAL = 1.0
+# Seconds without events before checking, an installation changes many files
+SETTLE_DELAY = 0.2
+
+_CLEAR_SCREEN = '\x1b[H\x1b[2J'
+_EVENTS_BUFFER_SIZE = 64 * 1024
+# Watch descriptor, mask, cookie, and size of the name that follows
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Events of inotify for the entries of a watched directory
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_MASK = (
+    _IN_MODIFY | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+    | _IN_DELETE
+)
+# Events were lost, the directories that changed are not known
+_IN_Q_OVERFLOW = 0x00004000
+
+
+def _get_directory_path(path_item: str) -> str:
+    #
+    return os.path.realpath(path_item)
+
+
+def _get_directory_paths() -> typing.List[str]:
+    #
+    directory_paths = {
+        _get_directory_path(path_item)
+        for path_item in sys.path if os.path.isdir(path_item or '.')
+    }
+    return sorted(directory_paths)
+
+
+def _load_libc() -> typing.Optional[ctypes.CDLL]:
+    #
+    libc = None
+    # Not found on Windows, for example
+    libc_name = ctypes.util.find_library('c')
+    if libc_name is not None:
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+        except OSError:
+            pass
+    return libc
+
+
+def _add_watches(
+    libc: ctypes.CDLL,
+    file_descriptor: int,
+    directory_paths: collections.abc.Iterable[str],
+) -> typing.Optional[typing.Dict[int, str]]:
+    """Watch each directory, none if any of them can not be watched.
+
+    The count of watches is limited, for example.
+    """
+    watches: typing.Optional[typing.Dict[int, str]] = {}
+    for directory_path in directory_paths:
+        watch_descriptor = typing.cast(
+            int,
+            libc.inotify_add_watch(
+                file_descriptor,
+                os.fsencode(directory_path),
+                _IN_MASK,
+            ),
+        )
+        if watch_descriptor < 0 or watches is None:
+            watches = None
+        else:
+            watches[watch_descriptor] = directory_path
+    return watches
+
+
+def _open_inotify(
+    directory_paths: collections.abc.Iterable[str],
+) -> typing.Optional[Inotify]:
+    """Watch the directories, if inotify is available for all of them.
+
+    Return the file descriptor to read the events from, and the directory
+    of each watch.
+    """
+    inotify = None
+    libc = _load_libc()
+    if libc is not None and hasattr(libc, 'inotify_init1'):
+        file_descriptor = typing.cast(int, libc.inotify_init1(os.O_CLOEXEC))
+        if file_descriptor >= 0:
+            watches = _add_watches(libc, file_descriptor, directory_paths)
+            if watches is None:
+                os.close(file_descriptor)
+            else:
+                inotify = (file_descriptor, watches)
+    return inotify
+
+
+def _read_events(
+    file_descriptor: int,
+    timeout: typing.Optional[float],
+) -> bytes:
+    """Wait for events, and read them.
+
+    Nothing is read if there were no events before the timeout.
+    """
+    data = b''
+    poller = select.poll()
+    poller.register(file_descriptor, select.POLLIN)
+    events = poller.poll(None if timeout is None else timeout * 1000)
+    if events:
+        data = os.read(file_descriptor, _EVENTS_BUFFER_SIZE)
+    return data
+
+
+def _get_changed_directories(
+    data: bytes,
+    watches: typing.Dict[int, str],
+) -> typing.Optional[typing.Set[str]]:
+    """Get the directories of the events, none if some events were lost."""
+    directory_paths: typing.Optional[typing.Set[str]] = set()
+    offset = 0
+    # pylint: disable-next=while-used
+    while offset < len(data):
+        (watch_descriptor, mask, _, name_size) = typing.cast(
+            'typing.Tuple[int, int, int, int]',
+            _EVENT_HEADER.unpack_from(data, offset),
+        )
+        offset += _EVENT_HEADER.size + name_size
+        if mask & _IN_Q_OVERFLOW or directory_paths is None:
+            directory_paths = None
+        elif watch_descriptor in watches:
+            directory_paths.add(watches[watch_descriptor])
+    return directory_paths
+
+
+def _wait(
+    inotify: typing.Optional[Inotify]
+) -> typing.Optional[typing.Set[str]]:
+    """Wait for a change, or for the next check without inotify.
+
+    Tell the directories that changed, none if they are not known.
+    """
+    directory_paths = None
+    if inotify is None:
+        time.sleep(POLL_INTERVAL)
+    else:
+        (file_descriptor, watches) = inotify
+        data = _read_events(file_descriptor, None)
+        chunks = [data]
+        # pylint: disable-next=while-used
+        while data:
+            data = _read_events(file_descriptor, SETTLE_DELAY)
+            chunks.append(data)
+        directory_paths = _get_changed_directories(b''.join(chunks), watches)
+    return directory_paths
+
+
+def _scan(
+    metadata_paths: MetadataPaths,
+    directory_paths: typing.Optional[typing.Set[str]],
+) -> bool:
+    """Find the metadata paths again, in the directories that changed.
+
+    All the directories are scanned if the ones that changed are not known.
+    Tell if any metadata path was added, removed, or changed.
+    """
+    is_changed = False
+    for path_item in sys.path:
+        if (
+            directory_paths is None or path_item not in metadata_paths
+            or _get_directory_path(path_item) in directory_paths
+        ):
+            new_metadata_paths = list(
+                _importlib_metadata.find_metadata_paths(path_item),
+            )
+            if new_metadata_paths != metadata_paths.get(path_item, None):
+                metadata_paths[path_item] = new_metadata_paths
+                is_changed = True
+    return is_changed
+
+
+def _get_record(
+    cache: typing.Optional[_cache.MetadataCache],
+    records: Records,
+    base_name: str,
+    metadata_path: str,
+    stamp: _cache.Stamp,
+) -> typing.Optional[_importlib_metadata.DistributionRecord]:
+    """Get the record kept in memory, read it again if its stamp changed."""
+    entry = records.get(metadata_path, None)
+    if entry is None or entry[0] != stamp:
+        entry = (
+            stamp,
+            _importlib_metadata.get_distribution_record(
+                cache,
+                base_name,
+                metadata_path,
+                stamp,
+            ),
+        )
+        records[metadata_path] = entry
+    return entry[1]
+
+
+def _display(
+    distributions: _core.Distributions,
+    preselection: _core.Selection,
+    options: _core.Options,
+) -> bool:
+    """Display the distributions, tell if the output is still open."""
+    stdout = typing.cast(typing.TextIO, sys.stdout)
+    if stdout.isatty():
+        stdout.write(_CLEAR_SCREEN)
+    lines = _core.render(distributions, preselection, options)
+    with _timings.phase('render and write'):
+        is_open = _output.write_lines(lines, stdout)
+    return is_open
+
+
+def _watch(
+    preselection: _core.Selection,
+    options: _core.Options,
+    cache: typing.Optional[_cache.MetadataCache],
+    inotify: typing.Optional[Inotify],
+) -> None:
+    """Display again after each change, until the output is closed."""
+    metadata_paths: MetadataPaths = {}
+    records: Records = {}
+    directory_paths = None
+    is_open = True
+    # pylint: disable-next=while-used
+    while is_open:
+        if _scan(metadata_paths, directory_paths):
+            distributions = _importlib_metadata.build_distributions(
+                preselection,
+                (
+                    metadata_path for path_item in sys.path
+                    for metadata_path in metadata_paths[path_item]
+                ),
+                functools.partial(_get_record, cache, records),
+            )
+            # Only the records of the metadata paths still found are kept
+            records = {
+                metadata_path: records[metadata_path]
+                for path_item_metadata_paths in metadata_paths.values()
+                for (_, metadata_path, _) in path_item_metadata_paths
+                if metadata_path in records
+            }
+            if cache:
+                cache.save()
+            is_open = _display(distributions, preselection, options)
+        if is_open:
+            directory_paths = _wait(inotify)
+
+
+def main(
+    user_selection: collections.abc.Iterable[str],
+    options: _core.Options,
+    is_cached: bool,
+) -> int:
+    """Display the distributions again after each change, until interrupted.
+
+    The watch also stops when the reader closes the output.
+    """
+    cache = None
+    if is_cached:
+        cache = _cache.MetadataCache(_cache.get_cache_file_path())
+        cache.load()
+    preselection = _importlib_metadata.make_preselection(
+        user_selection,
+        options.is_reverse,
+    )
+    inotify = _open_inotify(_get_directory_paths())
+    try:
+        _watch(preselection, options, cache, inotify)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if inotify is not None:
+            os.close(inotify[0])
+    return 0
+
+
+# EOF
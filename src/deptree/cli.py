@@ -2,26 +2,131 @@
 
 """Command line interface."""
 
+from __future__ import annotations
+
 import argparse
+import contextlib
+import sys
 import typing
 
 from . import _i18n
 from . import _meta
-from . import _pkg_resources
+from . import _output
+from . import _timings
+
+# The other modules are imported only once the arguments are parsed, so that
+# showing the help or the version does not wait for them
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    from . import _core
+    from . import _snapshot
 
 _ = _i18n._
 
+BACKEND_IMPORTLIB_METADATA = 'importlib-metadata'
+BACKEND_PKG_RESOURCES = 'pkg-resources'
+BACKENDS = (BACKEND_IMPORTLIB_METADATA, BACKEND_PKG_RESOURCES)
 
-def main() -> int:
-    """CLI main function."""
-    args_parser = argparse.ArgumentParser(
-        allow_abbrev=False,
-        description=_meta.get_summary(),
-    )
+
+class _ArgumentsParser(argparse.ArgumentParser):
+    """Parser of the arguments, reading the summary only to show the help."""
+
+    def format_help(self) -> str:
+        """Format the help, with the project's summary as description."""
+        if self.description is None:
+            self.description = _meta.get_summary()
+        return super().format_help()
+
+
+class _VersionAction(argparse.Action):
+    """Show the version, reading it only when asked for."""
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: object,
+        option_string: typing.Optional[str] = None,
+    ) -> None:
+        """Show the version and exit."""
+        print(_meta.get_version())
+        parser.exit()
+
+
+def _read_projects(file_: typing.TextIO) -> typing.List[str]:
+    """Read the projects to show, one per line.
+
+    Empty lines and lines starting with ``#`` are ignored.
+    """
+    lines = [line.strip() for line in file_]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def _read_projects_file(file_path: str) -> typing.List[str]:
+    #
+    with open(file_path, encoding='utf_8') as file_:
+        return _read_projects(file_)
+
+
+def _discover(
+    backend: str,
+    user_selection: typing.List[str],
+    is_reverse: bool,
+    is_cached: bool,
+) -> typing.Tuple[_core.Distributions, _core.Selection]:
+    #
+    if backend == BACKEND_PKG_RESOURCES:
+        # Import only on demand, since importing is slow
+        with _timings.phase('import pkg_resources'):
+            # pylint: disable-next=import-outside-toplevel
+            from . import _pkg_resources
+        (distributions, preselection) = _pkg_resources.discover(
+            user_selection,
+            is_reverse,
+        )
+    else:
+        # pylint: disable-next=import-outside-toplevel
+        from . import _importlib_metadata
+        (distributions, preselection) = _importlib_metadata.discover(
+            user_selection,
+            is_reverse,
+            is_cached,
+        )
+    _timings.count('nodes', len(distributions))
+    _timings.count('edges', distributions.get_edges_count())
+    return (distributions, preselection)
+
+
+@contextlib.contextmanager
+def _profile(
+    file_path: typing.Optional[str],
+) -> collections.abc.Iterator[None]:
+    """Profile the context, and dump the statistics to the file if any."""
+    if file_path is None:
+        yield
+        return
+    # Import only on demand, since it is needed only in this mode
+    import cProfile  # pylint: disable=import-outside-toplevel
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(file_path)
+
+
+def _make_args_parser() -> argparse.ArgumentParser:
+    #
+    args_parser = _ArgumentsParser(allow_abbrev=False)
     args_parser.add_argument(
         '--version',
-        action='version',
-        version=_meta.get_version(),
+        action=_VersionAction,
+        default=argparse.SUPPRESS,
+        dest=argparse.SUPPRESS,
+        help=_("show program's version number and exit"),
+        nargs=0,
     )
     args_parser.add_argument(
         '-r',
@@ -35,21 +140,538 @@ def main() -> int:
         action='store_true',
         help=_("show flat list instead of tree"),
     )
+    args_parser.add_argument(
+        '--compact',
+        action='store_true',
+        help=_("show the dependencies of each project only once in tree"),
+    )
+    args_parser.add_argument(
+        '--cycles',
+        action='store_true',
+        help=_("show dependency cycles instead of tree"),
+    )
+    args_parser.add_argument(
+        '--check',
+        action='store_true',
+        help=_(
+            "show only the problems, missing, unknown, conflicting, or "
+            "circular projects, and exit with the sum of their codes"
+        ),
+    )
+    args_parser.add_argument(
+        '--max-depth',
+        help=_("show the projects down to this depth only, 0 for the top"),
+        metavar='N',
+        type=int,
+    )
+    args_parser.add_argument(
+        '--exclude',
+        action='append',
+        dest='excluded_patterns',
+        help=_(
+            "hide the projects matching this pattern, and what only they "
+            "lead to, can be repeated"
+        ),
+        metavar='PATTERN',
+    )
+    args_parser.add_argument(
+        '--from-file',
+        action='append',
+        dest='projects_files',
+        help=_(
+            "also show the projects listed in this file, one per line, can "
+            "be repeated"
+        ),
+        metavar='FILE',
+    )
+    args_parser.add_argument(
+        '--stdin',
+        action='store_true',
+        help=_("also show the projects listed on standard input"),
+    )
+    args_parser.add_argument(
+        '--format',
+        choices=_output.FORMATS,
+        default=_output.FORMAT_TEXT,
+        help=_("format of the output"),
+    )
+    args_parser.add_argument(
+        '--watch',
+        action='store_true',
+        help=_("show again each time the installed projects change"),
+    )
+    args_parser.add_argument(
+        '--path',
+        action='append',
+        dest='environment_paths',
+        help=_(
+            "show the projects of this environment (or directory of "
+            "projects) instead of the current one, can be repeated"
+        ),
+        metavar='DIR',
+    )
+    args_parser.add_argument(
+        '--env-list',
+        help=_("file listing environments to show, one path per line"),
+        metavar='FILE',
+    )
+    args_parser.add_argument(
+        '--backend',
+        choices=BACKENDS,
+        default=BACKEND_IMPORTLIB_METADATA,
+        help=_("library used to discover the installed projects"),
+    )
+    args_parser.add_argument(
+        '--save-snapshot',
+        help=_("also write the graph of the installed projects to this file"),
+        metavar='FILE',
+    )
+    args_parser.add_argument(
+        '--load-snapshot',
+        help=_(
+            "show the projects from this file, written with --save-snapshot, "
+            "instead of the installed ones"
+        ),
+        metavar='FILE',
+    )
+    args_parser.add_argument(
+        '--diff',
+        dest='diff_paths',
+        help=_(
+            "show what changed from the OLD environment (or snapshot) to the "
+            "NEW one"
+        ),
+        metavar=('OLD', 'NEW'),
+        nargs=2,
+    )
+    args_parser.add_argument(
+        '--check-against',
+        help=_(
+            "check that the projects listed in this requirements (or lock) "
+            "file are installed and satisfied, and that the projects they "
+            "need are listed, fail otherwise"
+        ),
+        metavar='FILE',
+    )
+    args_parser.add_argument(
+        '--target-env',
+        help=_(
+            "JSON file of the environment markers variables (such as "
+            "'python_version' or 'sys_platform') to evaluate the "
+            "requirements for, instead of the current ones"
+        ),
+        metavar='FILE',
+    )
+    args_parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=_("do not use the cache of the installed projects metadata"),
+    )
+    args_parser.add_argument(
+        '--timings',
+        action='store_true',
+        help=_(
+            "report the time spent in each phase, and counts, on standard "
+            "error"
+        ),
+    )
+    args_parser.add_argument(
+        '--profile',
+        help=_("write profiling statistics of the run to this file"),
+        metavar='FILE',
+    )
     args_parser.add_argument(
         'selected_projects',
         help=_("name of project whose dependencies (or dependents) to show"),
         metavar='project',
         nargs='*',
     )
-    args = args_parser.parse_args()
+    return args_parser
+
+
+def _get_environment_paths(args: argparse.Namespace) -> typing.List[str]:
+    #
+    environment_paths = list(
+        typing.cast(
+            typing.Optional[typing.List[str]],
+            args.environment_paths,
+        ) or [],
+    )
+    environments_list_path = typing.cast(typing.Optional[str], args.env_list)
+    if environments_list_path is not None:
+        # pylint: disable-next=import-outside-toplevel
+        from . import _environments
+        environment_paths.extend(
+            _environments.read_environments_list(environments_list_path),
+        )
+    return environment_paths
+
+
+def _add_listed_projects(
+    args_parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+) -> None:
+    """Add the projects listed in files, or on standard input, if any.
+
+    All the projects are shown from a single discovery, each in its own
+    tree (or list).
+    """
+    selected_projects = typing.cast(typing.List[str], args.selected_projects)
+    for file_path in typing.cast(
+        typing.Optional[typing.List[str]],
+        args.projects_files,
+    ) or []:
+        try:
+            selected_projects.extend(_read_projects_file(file_path))
+        except OSError as exception:
+            message = _("can not read the projects list: {}")
+            args_parser.error(message.format(exception))
+    if typing.cast(bool, args.stdin):
+        selected_projects.extend(_read_projects(sys.stdin))
+
+
+def _set_target_environment(
+    args_parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    backend: str,
+    environment_paths: typing.List[str],
+) -> None:
+    """Evaluate the markers for the target environment, if any."""
+    file_path = typing.cast(typing.Optional[str], args.target_env)
+    if file_path is None:
+        return
+    if environment_paths:
+        args_parser.error(
+            _("--target-env is only available for one environment"),
+        )
+    if backend != BACKEND_IMPORTLIB_METADATA:
+        message = _("--target-env needs the {} backend")
+        args_parser.error(message.format(BACKEND_IMPORTLIB_METADATA))
+    from . import _markers  # pylint: disable=import-outside-toplevel
+    try:
+        environment = _markers.read_target_environment(file_path)
+    except (OSError, ValueError) as exception:
+        message = _("can not read the target environment: {}")
+        args_parser.error(message.format(exception))
+    _markers.set_target_environment(environment)
+
+
+def _check_modes_args(
+    args_parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    environment_paths: typing.List[str],
+) -> None:
+    #
+    is_loaded = typing.cast(
+        typing.Optional[str], args.load_snapshot
+    ) is not None
+    is_saved = typing.cast(
+        typing.Optional[str], args.save_snapshot
+    ) is not None
+    is_watched = typing.cast(bool, args.watch)
+    if (is_loaded or is_saved) and (is_watched or environment_paths):
+        args_parser.error(
+            _(
+                "--load-snapshot and --save-snapshot are not available with "
+                "--watch or --path"
+            ),
+        )
+    if is_loaded and typing.cast(typing.Optional[str], args.target_env):
+        args_parser.error(
+            _("--target-env is not available with --load-snapshot"),
+        )
+    diff_paths = typing.cast(
+        typing.Optional[typing.List[str]], args.diff_paths
+    )
+    is_selected = bool(typing.cast(typing.List[str], args.selected_projects))
+    is_other_mode = is_loaded or is_saved or is_watched or environment_paths
+    if diff_paths and (is_selected or is_other_mode):
+        args_parser.error(
+            _(
+                "--diff is not available with projects, --watch, --path, or "
+                "snapshots"
+            ),
+        )
+    is_checked = typing.cast(
+        typing.Optional[str], args.check_against
+    ) is not None
+    is_reverse = typing.cast(bool, args.reverse)
+    is_excluded = any(
+        (is_selected, is_reverse, is_watched, environment_paths, diff_paths),
+    )
+    if is_checked and is_excluded:
+        args_parser.error(
+            _(
+                "--check-against is not available with projects, --reverse, "
+                "--watch, --path, or --diff"
+            ),
+        )
+    is_health_checked = typing.cast(bool, args.check)
+    if is_health_checked and (
+        is_checked or is_watched or environment_paths or diff_paths
+    ):
+        args_parser.error(
+            _(
+                "--check is not available with --check-against, --watch, "
+                "--path, or --diff"
+            ),
+        )
+
+
+def _make_options(args: argparse.Namespace) -> _core.Options:
     #
-    result = _pkg_resources.main(
-        typing.cast(typing.List[str], args.selected_projects),
-        typing.cast(bool, args.reverse),
-        typing.cast(bool, args.flat),
+    from . import _core  # pylint: disable=import-outside-toplevel
+    options = _core.Options(
+        excluded_patterns=tuple(
+            typing.cast(
+                typing.Optional[typing.List[str]],
+                args.excluded_patterns,
+            ) or (),
+        ),
+        is_compact=typing.cast(bool, args.compact),
+        is_cycles=typing.cast(bool, args.cycles),
+        is_flat=typing.cast(bool, args.flat),
+        is_reverse=typing.cast(bool, args.reverse),
+        max_depth=typing.cast(typing.Optional[int], args.max_depth),
+        output_format=typing.cast(str, args.format),
     )
+    return options
+
+
+@contextlib.contextmanager
+def _open_snapshot(
+    args_parser: argparse.ArgumentParser,
+    file_path: typing.Optional[str],
+) -> collections.abc.Iterator[typing.Optional[_snapshot.SnapshotGraph]]:
+    """Open the snapshot file if any, for the context, then close it.
+
+    The projects are read from the snapshot only once they are reached, a
+    damaged snapshot is reported whenever it is found out.
+    """
+    if file_path is None:
+        yield None
+        return
+    from . import _snapshot  # pylint: disable=import-outside-toplevel
+    message = _("can not read the snapshot: {}")
+    snapshot_graph = None
+    try:
+        snapshot_graph = _snapshot.SnapshotGraph(file_path)
+    except _snapshot.SnapshotError as exception:
+        args_parser.error(message.format(exception))
+    try:
+        yield snapshot_graph
+    except _snapshot.SnapshotError as exception:
+        args_parser.error(message.format(exception))
+    finally:
+        snapshot_graph.close()
+
+
+def _load_snapshot(
+    args_parser: argparse.ArgumentParser,
+    distributions: _snapshot.SnapshotGraph,
+    user_selection: typing.List[str],
+    is_reverse: bool,
+) -> typing.Tuple[_core.Distributions, _core.Selection]:
+    #
+    # pylint: disable-next=import-outside-toplevel
+    from . import _importlib_metadata
+    preselection = _importlib_metadata.make_preselection(
+        user_selection,
+        is_reverse,
+    )
+    # The dependencies of the extras are only known while discovering
+    if any(requirement.extras for requirement in preselection.values()):
+        args_parser.error(_("extras can not be selected with --load-snapshot"))
+    if not preselection:
+        distributions.read_all()
+    return (distributions, preselection)
+
+
+def _save_snapshot(
+    args_parser: argparse.ArgumentParser,
+    distributions: _core.Distributions,
+    file_path: str,
+) -> None:
+    #
+    from . import _snapshot  # pylint: disable=import-outside-toplevel
+    with _timings.phase('save snapshot'):
+        try:
+            _snapshot.save(distributions, file_path)
+        except (OSError, _snapshot.SnapshotError) as exception:
+            message = _("can not write the snapshot: {}")
+            args_parser.error(message.format(exception))
+
+
+def _show_diff(
+    args_parser: argparse.ArgumentParser,
+    diff_paths: typing.List[str],
+    options: _core.Options,
+    is_cached: bool,
+) -> int:
+    """Display what changed between two environments or snapshots."""
+    from . import _diff  # pylint: disable=import-outside-toplevel
+    from . import _snapshot  # pylint: disable=import-outside-toplevel
+    (old_path, new_path) = diff_paths
+    with _timings.phase('discover'):
+        try:
+            (old_distributions, new_distributions) = (
+                _diff.load(old_path, is_cached),
+                _diff.load(new_path, is_cached),
+            )
+        except _snapshot.SnapshotError as exception:
+            message = _("can not read the snapshot: {}")
+            args_parser.error(message.format(exception))
+    return _diff.main(
+        old_distributions,
+        new_distributions,
+        options.output_format,
+    )
+
+
+def _read_requirements(
+    args_parser: argparse.ArgumentParser,
+    file_path: str,
+) -> typing.List[str]:
+    #
+    from . import _requirements  # pylint: disable=import-outside-toplevel
+    requirements = []
+    try:
+        requirements = _requirements.read_requirements(file_path)
+    except (OSError, ValueError) as exception:
+        message = _("can not read the requirements file: {}")
+        args_parser.error(message.format(exception))
+    return requirements
+
+
+def _show(
+    args_parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    options: _core.Options,
+) -> int:
+    """Display the distributions of the current environment, or a snapshot."""
+    from . import _core  # pylint: disable=import-outside-toplevel
+    diff_paths = typing.cast(
+        typing.Optional[typing.List[str]], args.diff_paths
+    )
+    if diff_paths:
+        return _show_diff(
+            args_parser,
+            diff_paths,
+            options,
+            not typing.cast(bool, args.no_cache),
+        )
+    user_selection = typing.cast(typing.List[str], args.selected_projects)
+    check_path = typing.cast(typing.Optional[str], args.check_against)
+    if check_path is not None:
+        user_selection = _read_requirements(args_parser, check_path)
+    load_path = typing.cast(typing.Optional[str], args.load_snapshot)
+    save_path = typing.cast(typing.Optional[str], args.save_snapshot)
+    with _open_snapshot(args_parser, load_path) as snapshot_graph:
+        with _timings.phase('discover'):
+            (distributions, preselection) = (
+                _discover(
+                    typing.cast(str, args.backend),
+                    user_selection,
+                    options.is_reverse,
+                    not typing.cast(bool, args.no_cache),
+                ) if snapshot_graph is None else _load_snapshot(
+                    args_parser,
+                    snapshot_graph,
+                    user_selection,
+                    options.is_reverse,
+                )
+            )
+        if save_path is not None:
+            _save_snapshot(args_parser, distributions, save_path)
+        if check_path is not None:
+            # pylint: disable-next=import-outside-toplevel
+            from . import _requirements
+            return _requirements.main(
+                distributions,
+                preselection,
+                options.output_format,
+            )
+        if typing.cast(bool, args.check):
+            # pylint: disable-next=import-outside-toplevel
+            from . import _problems
+            return _problems.main(distributions, preselection, options)
+        return _core.main(distributions, preselection, options)
+
+
+def _show_environments(
+    args_parser: argparse.ArgumentParser,
+    environment_paths: typing.List[str],
+    user_selection: typing.List[str],
+    options: _core.Options,
+    is_cached: bool,
+) -> int:
+    """Show the distributions of each environment, scanned in parallel."""
+    # pylint: disable-next=import-outside-toplevel
+    from . import _environments
+    try:
+        exit_code = _environments.main(
+            environment_paths,
+            user_selection,
+            options,
+            is_cached,
+        )
+    except _environments.InvalidEnvironment as exception:
+        message = _("not a directory: {}")
+        args_parser.error(message.format(exception))
+    return exit_code
+
+
+def main() -> int:
+    """CLI main function."""
+    args_parser = _make_args_parser()
+    args = args_parser.parse_args()
+    _add_listed_projects(args_parser, args)
+    #
+    user_selection = typing.cast(typing.List[str], args.selected_projects)
+    backend = typing.cast(str, args.backend)
+    is_cached = not typing.cast(bool, args.no_cache)
+    is_timed = typing.cast(bool, args.timings)
+    is_watched = typing.cast(bool, args.watch)
+    environment_paths = _get_environment_paths(args)
+    #
+    if environment_paths and is_watched:
+        args_parser.error(_("--watch is only available for one environment"))
+    is_importlib_needed = is_watched or bool(environment_paths)
+    if is_importlib_needed and backend != BACKEND_IMPORTLIB_METADATA:
+        message = _("--watch and --path need the {} backend")
+        args_parser.error(message.format(BACKEND_IMPORTLIB_METADATA))
+    max_depth = typing.cast(typing.Optional[int], args.max_depth)
+    if max_depth is not None and max_depth < 0:
+        args_parser.error(_("--max-depth can not be negative"))
+    if is_timed and is_importlib_needed:
+        args_parser.error(
+            _("--timings is not available with --watch or --path"),
+        )
+    _set_target_environment(args_parser, args, backend, environment_paths)
+    _check_modes_args(args_parser, args, environment_paths)
+    #
+    options = _make_options(args)
+    if is_timed:
+        _timings.enable()
+    with _profile(typing.cast(typing.Optional[str], args.profile)):
+        if environment_paths:
+            exit_code = _show_environments(
+                args_parser,
+                environment_paths,
+                user_selection,
+                options,
+                is_cached,
+            )
+        elif is_watched:
+            # Import only on demand, since it is needed only in this mode
+            from . import _watch  # pylint: disable=import-outside-toplevel
+            exit_code = _watch.main(user_selection, options, is_cached)
+        else:
+            exit_code = _show(args_parser, args, options)
+    if is_timed:
+        _timings.report(typing.cast(typing.TextIO, sys.stderr))
     #
-    return result
+    return exit_code
 
 
 # EOF
@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+
+"""Benchmark on synthetic environments.
+
+A synthetic environment is a directory of fake ``dist-info`` directories,
+whose dependency graph has a configurable shape. The discovery (with each
+backend), the selection, and the rendering are timed separately, for each
+combination of ``--flat`` and ``--reverse``.
+
+The timings are compared to the baseline stored next to this file. A
+baseline is only meaningful on the machine it was measured on, save it
+again before comparing on another machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import dataclasses
+import functools
+import json
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+import typing
+
+import deptree._core
+import deptree._importlib_metadata
+
+if typing.TYPE_CHECKING:
+    import collections.abc
+    #
+    Requirements = typing.List[typing.Dict[str, str]]
+    Timings = typing.Dict[str, float]
+    Baseline = typing.Dict[str, Timings]
+
+BASELINE_FILE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'benchmark_baseline.json',
+)
+BASELINE_FORMAT_VERSION = 1
+
+# Name, and whether it is flat and reverse, the trees are compact since the
+# size of a full tree grows exponentially with the depth
+MODES = (
+    ('tree', False, False),
+    ('reverse', False, True),
+    ('flat', True, False),
+    ('reverse-flat', True, True),
+)
+
+SEED = 0
+
+SHAPE_FIELDS = (
+    'projects',
+    'depth',
+    'fan_out',
+    'diamonds',
+    'cycles',
+    'missing',
+    'conflicts',
+    'description',
+)
+
+VERSION = '1.0'
+
+DESCRIPTION_LINE = 'Long description of the project, as in a README.\n'
+
+
+@dataclasses.dataclass
+# pylint: disable-next=too-many-instance-attributes
+class Shape:
+    """Shape of the dependency graph of a synthetic environment.
+
+    The projects are spread over layers, each project depends on projects
+    of the next layer. Then diamonds, cycles, requirements on missing
+    projects, and requirements that the installed version does not satisfy
+    are added. Each project has a long description of about ``description``
+    KiB, after the header of its metadata.
+    """
+
+    projects: int = 2000
+    depth: int = 6
+    fan_out: int = 3
+    diamonds: int = 50
+    cycles: int = 10
+    missing: int = 20
+    conflicts: int = 20
+    description: int = 0
+
+    def get_key(self) -> str:
+        """Get a key identifying the shape."""
+        return ','.join(
+            f'{name}={typing.cast(int, getattr(self, name))}'
+            for name in SHAPE_FIELDS
+        )
+
+
+def _get_project_name(index: int) -> str:
+    #
+    return f'synthetic_{index:05d}'
+
+
+def _get_project_index(project_name: str) -> int:
+    #
+    return int(project_name.rsplit('_', 1)[1])
+
+
+def _add_layers(
+    rng: random.Random,
+    layers: typing.List[typing.List[int]],
+    requirements: Requirements,
+    fan_out: int,
+) -> None:
+    #
+    for (layer, next_layer) in zip(layers, layers[1:]):
+        for index in layer:
+            count = min(fan_out, len(next_layer))
+            for dependency_index in rng.sample(next_layer, count):
+                name = _get_project_name(dependency_index)
+                requirements[index][name] = f'{name}>={VERSION}'
+
+
+def _add_diamonds(
+    rng: random.Random,
+    layers: typing.List[typing.List[int]],
+    requirements: Requirements,
+    count: int,
+) -> None:
+    """Make two dependencies of a project depend on the same project."""
+    for _ in range(count if layers[2:] else 0):
+        layer_index = rng.randrange(len(layers) - 2)
+        index = rng.choice(layers[layer_index])
+        bottom_name = _get_project_name(rng.choice(layers[layer_index + 2]))
+        names = sorted(requirements[index])
+        for name in rng.sample(names, min(2, len(names))):
+            requirements[_get_project_index(name)][bottom_name] = bottom_name
+
+
+def _add_cycles(
+    rng: random.Random,
+    layers: typing.List[typing.List[int]],
+    requirements: Requirements,
+    count: int,
+) -> None:
+    """Make a project deep below a project of the first layer depend on it."""
+    for _ in range(count):
+        top_index = rng.choice(layers[0])
+        index = top_index
+        for _ in range(rng.randrange(1, len(layers) + 1)):
+            names = sorted(requirements[index])
+            if names:
+                index = _get_project_index(rng.choice(names))
+        if index != top_index:
+            top_name = _get_project_name(top_index)
+            requirements[index][top_name] = top_name
+
+
+def _make_requirements(shape: Shape) -> Requirements:
+    """Make the requirements of each project, by name of the dependency."""
+    rng = random.Random(SEED)
+    layers: typing.List[typing.List[int]] = [[] for _ in range(shape.depth)]
+    for index in range(shape.projects):
+        layers[index * shape.depth // shape.projects].append(index)
+    requirements: Requirements = [{} for _ in range(shape.projects)]
+    _add_layers(rng, layers, requirements, shape.fan_out)
+    _add_diamonds(rng, layers, requirements, shape.diamonds)
+    _add_cycles(rng, layers, requirements, shape.cycles)
+    for missing_index in range(shape.missing):
+        name = f'missing_{missing_index:05d}'
+        requirements[rng.randrange(shape.projects)][name] = name
+    for _ in range(shape.conflicts):
+        name = _get_project_name(rng.randrange(shape.projects))
+        requirements[rng.randrange(shape.projects)][name] = f'{name}>=2.0'
+    return requirements
+
+
+def generate_environment(directory_path: str, shape: Shape) -> None:
+    """Write the ``dist-info`` directories of the synthetic environment."""
+    description = DESCRIPTION_LINE * (
+        shape.description * 1024 // len(DESCRIPTION_LINE)
+    )
+    for (index, requirements) in enumerate(_make_requirements(shape)):
+        name = _get_project_name(index)
+        dist_info_path = pathlib.Path(
+            directory_path,
+            f'{name}-{VERSION}.dist-info',
+        )
+        dist_info_path.mkdir()
+        lines = [
+            'Metadata-Version: 2.1',
+            f'Name: {name}',
+            f'Version: {VERSION}',
+        ]
+        lines.extend(
+            f'Requires-Dist: {requirement}'
+            for requirement in requirements.values()
+        )
+        if description:
+            lines.extend(('', description))
+        (dist_info_path / 'METADATA').write_text(
+            '\n'.join(lines) + '\n',
+            encoding='utf_8',
+        )
+
+
+def _time(
+    timings: Timings,
+    name: str,
+    function: collections.abc.Callable[[], object],
+) -> None:
+    """Call the function, keep its duration if it is the shortest so far."""
+    start = time.perf_counter()
+    function()
+    duration = time.perf_counter() - start
+    timings[name] = min(timings.get(name, duration), duration)
+
+
+def _discover_importlib_metadata(
+    site_path: str,
+) -> deptree._core.Distributions:
+    #
+    return (
+        # pylint: disable=protected-access
+        deptree._importlib_metadata.discover_distributions(
+            typing.cast('deptree._core.Selection', {}),
+            None,
+            [site_path],
+        )
+    )
+
+
+def _discover_pkg_resources(site_path: str) -> deptree._core.Distributions:
+    #
+    # Import only on demand, since importing is slow
+    # pylint: disable-next=import-outside-toplevel,import-private-name
+    from deptree import _pkg_resources
+    return (
+        # pylint: disable=protected-access
+        _pkg_resources._discover_distributions(
+            typing.cast('deptree._core.Selection', {}),
+            [site_path],
+        )
+    )
+
+
+def _select(
+    distributions: deptree._core.Distributions,
+    is_flat: bool,
+    is_reverse: bool,
+) -> deptree._core.Selection:
+    #
+    return (
+        # pylint: disable=protected-access
+        deptree._core._select(
+            distributions,
+            typing.cast('deptree._core.Selection', {}),
+            is_reverse,
+            is_flat,
+        )
+    )
+
+
+def _render(
+    distributions: deptree._core.Distributions,
+    selection: deptree._core.Selection,
+    options: deptree._core.Options,
+) -> None:
+    #
+    lines = (
+        # pylint: disable=protected-access
+        deptree._core._render_selection(distributions, selection, options)
+    )
+    collections.deque(lines, maxlen=0)
+
+
+def _run_once(
+    site_path: str,
+    timings: Timings,
+    is_pkg_resources: bool,
+) -> None:
+    #
+    _time(
+        timings,
+        'discover importlib-metadata',
+        functools.partial(_discover_importlib_metadata, site_path),
+    )
+    if is_pkg_resources:
+        _time(
+            timings,
+            'discover pkg-resources',
+            functools.partial(_discover_pkg_resources, site_path),
+        )
+    distributions = _discover_importlib_metadata(site_path)
+    # pylint: disable-next=protected-access
+    make_options = deptree._core.Options
+    for (mode, is_flat, is_reverse) in MODES:
+        _time(
+            timings,
+            f'select {mode}',
+            functools.partial(_select, distributions, is_flat, is_reverse),
+        )
+        _time(
+            timings,
+            f'render {mode}',
+            functools.partial(
+                _render,
+                distributions,
+                _select(distributions, is_flat, is_reverse),
+                make_options(
+                    is_compact=not is_flat,
+                    is_flat=is_flat,
+                    is_reverse=is_reverse,
+                ),
+            ),
+        )
+
+
+def run(shape: Shape, repeat: int, is_pkg_resources: bool) -> Timings:
+    """Time each step on a synthetic environment, keep the best times."""
+    timings: Timings = {}
+    with tempfile.TemporaryDirectory() as site_path:
+        generate_environment(site_path, shape)
+        for _ in range(repeat):
+            _run_once(site_path, timings, is_pkg_resources)
+    return timings
+
+
+def _load_baseline() -> Baseline:
+    #
+    baseline: Baseline = {}
+    text = '{}'
+    try:
+        text = pathlib.Path(BASELINE_FILE_PATH).read_text(encoding='utf_8')
+    except OSError:
+        pass
+    content = typing.cast(typing.Dict[str, object], json.loads(text))
+    if content.get('version') == BASELINE_FORMAT_VERSION:
+        baseline = typing.cast('Baseline', content.get('results', {}))
+    return baseline
+
+
+def _save_baseline(baseline: Baseline) -> None:
+    #
+    content = {'version': BASELINE_FORMAT_VERSION, 'results': baseline}
+    pathlib.Path(BASELINE_FILE_PATH).write_text(
+        json.dumps(content, indent=2, sort_keys=True) + '\n',
+        encoding='utf_8',
+    )
+
+
+def _report(
+    timings: Timings,
+    baseline_timings: Timings,
+    threshold: float,
+) -> bool:
+    """Print the timings next to the baseline, tell if none regressed."""
+    is_ok = True
+    print(f"{'step':<32}{'time (ms)':>12}{'baseline':>12}{'ratio':>8}")
+    for (name, duration) in timings.items():
+        baseline_duration = baseline_timings.get(name, None)
+        if baseline_duration is None:
+            print(f"{name:<32}{duration * 1000:>12.1f}{'-':>12}{'-':>8}")
+        else:
+            ratio = duration / baseline_duration
+            is_regression = ratio > threshold
+            is_ok = is_ok and not is_regression
+            print(
+                f"{name:<32}{duration * 1000:>12.1f}"
+                f"{baseline_duration * 1000:>12.1f}{ratio:>8.2f}"
+                f"{'  !!! REGRESSION' if is_regression else ''}",
+            )
+    return is_ok
+
+
+def main() -> int:
+    """Run the benchmark, compare to the baseline, or save it."""
+    args_parser = argparse.ArgumentParser(
+        description="Benchmark on synthetic environments",
+    )
+    default_shape = Shape()
+    for name in SHAPE_FIELDS:
+        args_parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            default=typing.cast(int, getattr(default_shape, name)),
+            type=int,
+        )
+    args_parser.add_argument('--repeat', default=3, type=int)
+    args_parser.add_argument(
+        '--threshold',
+        default=1.5,
+        help="highest ratio to the baseline that is not a regression",
+        type=float,
+    )
+    args_parser.add_argument(
+        '--no-pkg-resources',
+        action='store_true',
+        help="do not time the discovery with 'pkg_resources'",
+    )
+    args_parser.add_argument(
+        '--save-baseline',
+        action='store_true',
+        help="store the timings as the baseline for this shape",
+    )
+    args = args_parser.parse_args()
+    #
+    shape = Shape(
+        *(typing.cast(int, getattr(args, name)) for name in SHAPE_FIELDS),
+    )
+    timings = run(
+        shape,
+        typing.cast(int, args.repeat),
+        not typing.cast(bool, args.no_pkg_resources),
+    )
+    baseline = _load_baseline()
+    print(shape.get_key())
+    is_ok = _report(
+        timings,
+        baseline.get(shape.get_key(), {}),
+        typing.cast(float, args.threshold),
+    )
+    if typing.cast(bool, args.save_baseline):
+        baseline[shape.get_key()] = timings
+        _save_baseline(baseline)
+    return 0 if is_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# EOF
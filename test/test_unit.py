@@ -1,8 +1,41 @@
 """Unit tests."""
 
+# pylint: disable=too-many-lines
+
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import typing
 import unittest
 
+import packaging.requirements
+
 import deptree
+import deptree._cache
+import deptree._core
+import deptree._diff
+import deptree._environments
+import deptree._graph
+import deptree._importlib_metadata
+import deptree._markers
+import deptree._output
+import deptree._problems
+import deptree._requirements
+import deptree._snapshot
+import deptree._timings
+import deptree._traversal
+import deptree._watch
+import deptree.cli
+
+# Seconds to import the command line interface, heavy modules are imported
+# only once the arguments are parsed
+IMPORT_TIME_BUDGET = 0.25
 
 
 class TestSelectType(unittest.TestCase):
@@ -12,11 +45,11 @@ class TestSelectType(unittest.TestCase):
         """Set up."""
         self.get_select_type = (
             # pylint: disable=protected-access
-            deptree._pkg_resources._get_select_type
+            deptree._core._get_select_type
         )
         self.select_type = (
             # pylint: disable=protected-access
-            deptree._pkg_resources._SelectType
+            deptree._core._SelectType
         )
 
     def test_select_type_all(self) -> None:
@@ -99,4 +132,1399 @@ class TestSelectType(unittest.TestCase):
         )
 
 
+class TestDetectConflicts(unittest.TestCase):
+    """Detection of conflicts."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        self.graph_class = (
+            # pylint: disable=protected-access
+            deptree._graph.Graph
+        )
+
+    def test_detect_conflicts(self) -> None:
+        """Dependents with unsatisfied requirements should be listed."""
+        distributions = self.graph_class()
+        for (project_key, specifier) in (('a', '>=2'), ('b', '<2')):
+            self.core.add_distribution(
+                distributions,
+                typing.cast('deptree._core.ProjectKey', project_key),
+                typing.cast('deptree._core.ProjectLabel', project_key),
+                None,
+            )
+            self.core.add_dependency(
+                distributions,
+                self.core.Requirement(
+                    dependent_project_key=typing.cast(
+                        'deptree._core.ProjectKey',
+                        project_key,
+                    ),
+                    dependency_project_key=typing.cast(
+                        'deptree._core.ProjectKey',
+                        'c',
+                    ),
+                    extras=(),
+                    str_repr=f'c{specifier}',
+                    specifier=specifier,
+                ),
+            )
+        self.core.add_distribution(
+            distributions,
+            typing.cast('deptree._core.ProjectKey', 'c'),
+            typing.cast('deptree._core.ProjectLabel', 'c'),
+            typing.cast('deptree._core.ProjectVersion', '1.5'),
+        )
+        self.core.detect_conflicts(distributions)
+        distribution = self.core.get_distribution(
+            distributions,
+            typing.cast('deptree._core.ProjectKey', 'c'),
+        )
+        conflicts: typing.List[str] = ['a']
+        self.assertEqual(
+            distribution.conflicts if distribution else None,
+            conflicts,
+        )
+
+    def test_detect_conflicts_repeated(self) -> None:
+        """Every addition of a dependency should be checked."""
+        distributions = self.graph_class()
+        for (project_key, version) in (('a', '1'), ('c', '1.5')):
+            self.core.add_distribution(
+                distributions,
+                typing.cast('deptree._core.ProjectKey', project_key),
+                typing.cast('deptree._core.ProjectLabel', project_key),
+                typing.cast('deptree._core.ProjectVersion', version),
+            )
+        # The second one is added by an extra, for example
+        for specifier in ('>=2', ''):
+            self.core.add_dependency(
+                distributions,
+                self.core.Requirement(
+                    dependent_project_key=typing.cast(
+                        'deptree._core.ProjectKey',
+                        'a',
+                    ),
+                    dependency_project_key=typing.cast(
+                        'deptree._core.ProjectKey',
+                        'c',
+                    ),
+                    extras=(),
+                    str_repr=f'c{specifier}',
+                    specifier=specifier,
+                ),
+            )
+        self.core.detect_conflicts(distributions)
+        distribution = self.core.get_distribution(
+            distributions,
+            typing.cast('deptree._core.ProjectKey', 'c'),
+        )
+        conflicts: typing.List[str] = ['a']
+        self.assertEqual(
+            distribution.conflicts if distribution else None,
+            conflicts,
+        )
+
+
+class TestDependencyGraph(unittest.TestCase):
+    """Queries on the graph of the installed projects."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        distributions = (
+            # pylint: disable=protected-access
+            deptree._graph.Graph()
+        )
+        for project_key in ('a', 'b'):
+            core.add_distribution(
+                distributions,
+                typing.cast('deptree._core.ProjectKey', project_key),
+                typing.cast('deptree._core.ProjectLabel', project_key.upper()),
+                typing.cast('deptree._core.ProjectVersion', '1'),
+            )
+        for (dependent_key, dependency_key, specifier) in (
+            ('a', 'b', '>=2'),
+            ('a', 'c', ''),
+            ('b', 'a', ''),
+        ):
+            core.add_dependency(
+                distributions,
+                core.Requirement(
+                    typing.cast('deptree._core.ProjectKey', dependent_key),
+                    typing.cast('deptree._core.ProjectKey', dependency_key),
+                    typing.cast('deptree._core.Extras', ()),
+                    f'{dependency_key}{specifier}',
+                    specifier,
+                ),
+            )
+        core.detect_conflicts(distributions)
+        self.distributions = distributions
+        self.graph = deptree.DependencyGraph(distributions)
+
+    def test_dependencies(self) -> None:
+        """Direct requirements of a project should be listed."""
+        str_reprs = [
+            requirement.str_repr
+            for requirement in self.graph.dependencies('A')
+        ]
+        expected_str_reprs: typing.List[str] = ['b>=2', 'c']
+        self.assertEqual(str_reprs, expected_str_reprs)
+        with self.assertRaises(deptree.UnknownProject):
+            self.graph.dependencies('d')
+
+    def test_transitive_dependents(self) -> None:
+        """All the projects needing a project should be listed once."""
+        project_keys = list(self.graph.transitive_dependents('c'))
+        expected_project_keys: typing.List[str] = ['a', 'b']
+        self.assertEqual(project_keys, expected_project_keys)
+        project_keys = list(self.graph.transitive_dependents('c'))
+        self.assertEqual(project_keys, expected_project_keys)
+
+    def test_transitive_dependencies(self) -> None:
+        """The projects needed by any of the projects should be listed."""
+        project_keys = list(self.graph.transitive_dependencies('a'))
+        expected_project_keys: typing.List[str] = ['b', 'c']
+        self.assertEqual(project_keys, expected_project_keys)
+        project_keys = list(self.graph.transitive_dependencies('a', 'B'))
+        expected_project_keys = ['a', 'b', 'c']
+        self.assertEqual(project_keys, expected_project_keys)
+        project_keys = list(self.graph.transitive_dependencies('c'))
+        expected_project_keys = []
+        self.assertEqual(project_keys, expected_project_keys)
+
+    def test_problems(self) -> None:
+        """Conflicts, missing projects, and cycles should be listed."""
+        conflicts = [
+            requirement.str_repr for requirement in self.graph.conflicts()
+        ]
+        expected_conflicts: typing.List[str] = ['b>=2']
+        self.assertEqual(conflicts, expected_conflicts)
+        missing = [
+            requirement.str_repr for requirement in self.graph.missing()
+        ]
+        expected_missing: typing.List[str] = ['c']
+        self.assertEqual(missing, expected_missing)
+        cycles = list(self.graph.cycles())
+        expected_cycles: typing.List[typing.List[str]] = [['a', 'b']]
+        self.assertEqual(cycles, expected_cycles)
+
+    def test_snapshot(self) -> None:
+        """A snapshot should be read as the graph it was written from."""
+        snapshot = (
+            # pylint: disable=protected-access
+            deptree._snapshot
+        )
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'snapshot.db')
+            snapshot.save(self.distributions, file_path)
+            for is_read_all in (False, True):
+                distributions = snapshot.SnapshotGraph(file_path)
+                if is_read_all:
+                    distributions.read_all()
+                graph = deptree.DependencyGraph(distributions)
+                for project_key in ('a', 'b', 'c'):
+                    self.assertEqual(
+                        graph.get_distribution(project_key),
+                        self.graph.get_distribution(project_key),
+                    )
+                conflicts = [
+                    requirement.str_repr for requirement in graph.conflicts()
+                ]
+                expected_conflicts: typing.List[str] = ['b>=2']
+                self.assertEqual(conflicts, expected_conflicts)
+                cycles = [' '.join(cycle) for cycle in graph.cycles()]
+                expected_cycles: typing.List[str] = ['a b']
+                self.assertEqual(cycles, expected_cycles)
+                self.assertNotIn('d', distributions)
+                distributions.close()
+            missing_path = os.path.join(directory_path, 'missing', 'x.db')
+            with self.assertRaises(snapshot.SnapshotError):
+                snapshot.save(self.distributions, missing_path)
+            file_names = os.listdir(directory_path)
+            expected_file_names: typing.List[str] = ['snapshot.db']
+            self.assertEqual(file_names, expected_file_names)
+
+    def test_snapshot_damaged(self) -> None:
+        """A damaged snapshot should fail once it is read."""
+        snapshot = (
+            # pylint: disable=protected-access
+            deptree._snapshot
+        )
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'snapshot.db')
+            snapshot.save(self.distributions, file_path)
+            with contextlib.closing(sqlite3.connect(file_path)) as connection:
+                connection.execute('DROP TABLE edges')
+            distributions = snapshot.SnapshotGraph(file_path)
+            with self.assertRaises(snapshot.SnapshotError):
+                distributions.get_dependencies_edges(0)
+            distributions.close()
+
+
+class TestDiff(unittest.TestCase):
+    """Changes between the graphs of two environments."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.diff = (
+            # pylint: disable=protected-access
+            deptree._diff.diff
+        )
+        self.render = (
+            # pylint: disable=protected-access
+            deptree._diff.render
+        )
+        core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        self.graphs: typing.Dict[str, 'deptree._core.Distributions'] = {}
+        for (name, versions, requirements) in (
+            (
+                'old',
+                [('a', '1'), ('b', '1'), ('c', '1')],
+                [('a', 'b', ''), ('b', 'c', '')],
+            ),
+            (
+                'new',
+                [('a', '1'), ('b', '2'), ('d', '1')],
+                [('a', 'b', '<2'), ('b', 'c', ''), ('b', 'a', '')],
+            ),
+        ):
+            distributions = (
+                # pylint: disable=protected-access
+                deptree._graph.Graph()
+            )
+            for (key, version) in versions:
+                core.add_distribution(
+                    distributions,
+                    typing.cast('deptree._core.ProjectKey', key),
+                    typing.cast('deptree._core.ProjectLabel', key.upper()),
+                    typing.cast('deptree._core.ProjectVersion', version),
+                )
+            for (dependent, dependency, specifier) in requirements:
+                core.add_dependency(
+                    distributions,
+                    core.Requirement(
+                        typing.cast('deptree._core.ProjectKey', dependent),
+                        typing.cast('deptree._core.ProjectKey', dependency),
+                        typing.cast('deptree._core.Extras', ()),
+                        f'{dependency}{specifier}',
+                        specifier,
+                    ),
+                )
+            core.detect_conflicts(distributions)
+            self.graphs[name] = distributions
+
+    def test_diff(self) -> None:
+        """Projects, dependencies, and problems should be compared."""
+        changes = self.diff(self.graphs['old'], self.graphs['new'])
+        lines = list(self.render(changes, 'text'))
+        expected_lines = [
+            '~ project b: B==1 -> B==2',
+            '- project c: C==1',
+            '+ project d: D==1',
+            '~ dependency a -> b: b -> b<2',
+            '+ dependency b -> a: a',
+            '+ conflict a -> b: b<2',
+            '+ missing b -> c: c',
+            '+ cycle a, b',
+        ]
+        self.assertEqual(lines, expected_lines)
+        self.assertFalse(self.diff(self.graphs['new'], self.graphs['new']))
+
+
+class TestProblems(unittest.TestCase):
+    """Problems found without rendering."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.find_problems = (
+            # pylint: disable=protected-access
+            deptree._problems.find_problems
+        )
+        self.get_exit_code = (
+            # pylint: disable=protected-access
+            deptree._problems.get_exit_code
+        )
+        self.render = (
+            # pylint: disable=protected-access
+            deptree._problems.render
+        )
+        self.make_preselection = (
+            # pylint: disable=protected-access
+            deptree._importlib_metadata.make_preselection
+        )
+        core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        distributions = (
+            # pylint: disable=protected-access
+            deptree._graph.Graph()
+        )
+        for (project_key, version) in (
+            ('a', '1'),
+            ('b', '1'),
+            ('d', '1'),
+        ):
+            core.add_distribution(
+                distributions,
+                typing.cast('deptree._core.ProjectKey', project_key),
+                typing.cast('deptree._core.ProjectLabel', project_key.upper()),
+                typing.cast('deptree._core.ProjectVersion', version),
+            )
+        for (dependent_key, dependency_key, specifier) in (
+            ('a', 'b', '>=2'),
+            ('a', 'c', ''),
+            ('b', 'a', ''),
+        ):
+            core.add_dependency(
+                distributions,
+                core.Requirement(
+                    typing.cast('deptree._core.ProjectKey', dependent_key),
+                    typing.cast('deptree._core.ProjectKey', dependency_key),
+                    typing.cast('deptree._core.Extras', ()),
+                    f'{dependency_key}{specifier}',
+                    specifier,
+                ),
+            )
+        core.detect_conflicts(distributions)
+        self.distributions = distributions
+
+    def test_find_problems(self) -> None:
+        """Problems should be found by category, in the selection if any."""
+        problems = self.find_problems(self.distributions)
+        lines = [
+            f'{problem.status.value} {problem.subject}' for problem in problems
+        ]
+        expected_lines = ['circular a, b', 'conflict a -> b', 'missing a -> c']
+        self.assertEqual(lines, expected_lines)
+        expected_exit_code = (
+            # pylint: disable=protected-access
+            deptree._problems.EXIT_CIRCULAR | deptree._problems.EXIT_CONFLICT
+            | deptree._problems.EXIT_MISSING
+        )
+        self.assertEqual(self.get_exit_code(problems), expected_exit_code)
+        problems = self.find_problems(
+            self.distributions,
+            self.make_preselection(['d', 'z'], False),
+        )
+        lines = [
+            f'{problem.status.value} {problem.subject}' for problem in problems
+        ]
+        expected_lines = ['unknown z']
+        self.assertEqual(lines, expected_lines)
+        expected_exit_code = (
+            # pylint: disable=protected-access
+            deptree._problems.EXIT_UNKNOWN
+        )
+        self.assertEqual(self.get_exit_code(problems), expected_exit_code)
+        problems = self.find_problems(
+            self.distributions,
+            self.make_preselection(['c'], False),
+        )
+        lines = list(self.render(problems, 'text'))
+        expected_lines = ['missing c: c']
+        self.assertEqual(lines, expected_lines)
+        expected_exit_code = (
+            # pylint: disable=protected-access
+            deptree._problems.EXIT_MISSING
+        )
+        self.assertEqual(self.get_exit_code(problems), expected_exit_code)
+
+
+class TestRequirements(unittest.TestCase):
+    """Check of the installed projects against a requirements file."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.read_requirements = (
+            # pylint: disable=protected-access
+            deptree._requirements.read_requirements
+        )
+        self.check = (
+            # pylint: disable=protected-access
+            deptree._requirements.check
+        )
+        self.make_preselection = (
+            # pylint: disable=protected-access
+            deptree._importlib_metadata.make_preselection
+        )
+        core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        distributions = (
+            # pylint: disable=protected-access
+            deptree._graph.Graph()
+        )
+        for (project_key, version) in (
+            ('a', '1'),
+            ('b', '1'),
+            ('c', '1'),
+            ('d', '1'),
+        ):
+            core.add_distribution(
+                distributions,
+                typing.cast('deptree._core.ProjectKey', project_key),
+                typing.cast('deptree._core.ProjectLabel', project_key.upper()),
+                typing.cast('deptree._core.ProjectVersion', version),
+            )
+        for (dependent_key, dependency_key, specifier) in (
+            ('a', 'b', '>=2'),
+            ('b', 'c', ''),
+        ):
+            core.add_dependency(
+                distributions,
+                core.Requirement(
+                    typing.cast('deptree._core.ProjectKey', dependent_key),
+                    typing.cast('deptree._core.ProjectKey', dependency_key),
+                    typing.cast('deptree._core.Extras', ()),
+                    f'{dependency_key}{specifier}',
+                    specifier,
+                ),
+            )
+        core.detect_conflicts(distributions)
+        self.distributions = distributions
+
+    def test_check(self) -> None:
+        """Mismatches, missing and unlisted projects should be found."""
+        content = (
+            "# Locked\n"
+            "a==1 \\\n"
+            "    --hash=sha256:0123\n"
+            "b==2  # via a\n"
+            "e==1\n"
+            "f==1 ; python_version < '3'\n"
+            "--index-url https://example.org/simple\n"
+        )
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'requirements.txt')
+            with open(file_path, 'w', encoding='utf_8') as file_:
+                file_.write(content)
+            requirements = self.read_requirements(file_path)
+        expected_requirements: typing.List[str] = ['a==1', 'b==2', 'e==1']
+        self.assertEqual(requirements, expected_requirements)
+        findings = self.check(
+            self.distributions,
+            self.make_preselection(requirements, False),
+        )
+        summary = [
+            (finding.kind, finding.project_key, finding.version)
+            for finding in findings
+        ]
+        expected_summary = [
+            ('mismatch', 'b', '1'),
+            ('missing', 'e', None),
+            ('unlisted', 'c', '1'),
+        ]
+        self.assertEqual(summary, expected_summary)
+
+
+class TestTraversal(unittest.TestCase):
+    """Iterative traversal of the dependency graph."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.walk = (
+            # pylint: disable=protected-access
+            deptree._traversal.walk
+        )
+        self.find_strongly_connected_components = (
+            # pylint: disable=protected-access
+            deptree._traversal.find_strongly_connected_components
+        )
+        self.graph = {
+            'a': ['b', 'c'],
+            'b': ['c'],
+            'c': ['a'],
+        }
+
+    def test_walk_tree(self) -> None:
+        """Every path should be followed until it is circular."""
+        steps = list(self.walk('a', self.graph.__getitem__, str))
+        expected_steps = [
+            (0, 'a', None, False),
+            (1, 'b', 'b', False),
+            (2, 'c', 'c', False),
+            (3, 'a', 'a', True),
+            (1, 'c', 'c', False),
+            (2, 'a', 'a', True),
+        ]
+        self.assertEqual(steps, expected_steps)
+
+    def test_walk_visited(self) -> None:
+        """Each node should be expanded only once."""
+        visited: typing.Set[str] = set()
+        steps = list(self.walk('a', self.graph.__getitem__, str, visited))
+        expected_steps = [
+            (0, 'a', None, False),
+            (1, 'b', 'b', False),
+            (2, 'c', 'c', False),
+            (3, 'a', 'a', True),
+            (1, 'c', 'c', False),
+        ]
+        self.assertEqual(steps, expected_steps)
+        expected_visited = {'a', 'b', 'c'}
+        self.assertEqual(visited, expected_visited)
+
+    def test_walk_max_depth(self) -> None:
+        """Nodes at the maximum depth should not be expanded nor visited."""
+        visited: typing.Set[str] = set()
+        steps = list(self.walk('a', self.graph.__getitem__, str, visited, 1))
+        expected_steps = [
+            (0, 'a', None, False),
+            (1, 'b', 'b', False),
+            (1, 'c', 'c', False),
+        ]
+        self.assertEqual(steps, expected_steps)
+        expected_visited = {'a'}
+        self.assertEqual(visited, expected_visited)
+
+    def test_walk_deep(self) -> None:
+        """Depth should not be limited by the recursion limit."""
+        depth = 10000
+
+        def get_children(node: int) -> typing.List[int]:
+            return [node + 1] if node < depth else []
+
+        def get_key(edge: int) -> int:
+            return edge
+
+        walk_steps = self.walk(0, get_children, get_key)
+        steps = list(walk_steps)
+        self.assertEqual(len(steps), depth + 1)
+        last_step = (depth, depth, depth, False)
+        self.assertEqual(steps[-1], last_step)
+
+    def test_find_strongly_connected_components(self) -> None:
+        """Components should be listed after the components they lead to."""
+        graph = dict(self.graph, d=['a', 'e'], e=[])
+        components = self.find_strongly_connected_components(
+            graph,
+            graph.__getitem__,
+        )
+        expected_components = [['a', 'b', 'c'], ['e'], ['d']]
+        self.assertEqual(components, expected_components)
+
+
+class TestSelectRoots(unittest.TestCase):
+    """Selection of the roots of the dependency graph."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        self.graph_class = (
+            # pylint: disable=protected-access
+            deptree._graph.Graph
+        )
+
+    def test_select_roots_cycles(self) -> None:
+        """One project of each independent cycle should be selected."""
+        distributions = self.graph_class()
+        cycles_count = 150
+        for index in range(cycles_count):
+            project_keys = [
+                typing.cast('deptree._core.ProjectKey', f'p{index}{suffix}')
+                for suffix in ('a', 'b')
+            ]
+            for project_key in project_keys:
+                self.core.add_distribution(
+                    distributions,
+                    project_key,
+                    typing.cast('deptree._core.ProjectLabel', project_key),
+                    None,
+                )
+            for (dependent_key, dependency_key) in (
+                project_keys,
+                project_keys[::-1],
+            ):
+                self.core.add_dependency(
+                    distributions,
+                    self.core.Requirement(
+                        dependent_key,
+                        dependency_key,
+                        typing.cast('deptree._core.Extras', ()),
+                        dependency_key,
+                    ),
+                )
+        selection = typing.cast('deptree._core.Selection', {})
+        # pylint: disable-next=protected-access
+        self.core._select_roots(distributions, selection, False)
+        selected_keys: typing.List[str] = sorted(selection)
+        expected_keys = sorted(f'p{index}a' for index in range(cycles_count))
+        self.assertEqual(selected_keys, expected_keys)
+        self.assertEqual(
+            len(self.core.find_cycles(distributions)),
+            cycles_count,
+        )
+
+
+class TestDisplayCompact(unittest.TestCase):
+    """Display of the trees with each subtree only once, in all formats."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        self.graph_class = (
+            # pylint: disable=protected-access
+            deptree._graph.Graph
+        )
+        self.distributions = self.graph_class()
+        graph = {
+            'a': ['b', 'c'],
+            'b': ['d'],
+            'c': ['d'],
+            'd': ['e'],
+            'e': [],
+        }
+        for project_key in graph:
+            self.core.add_distribution(
+                self.distributions,
+                typing.cast('deptree._core.ProjectKey', project_key),
+                typing.cast('deptree._core.ProjectLabel', project_key),
+                typing.cast('deptree._core.ProjectVersion', '1'),
+            )
+        for (project_key, dependency_keys) in graph.items():
+            for dependency_key in dependency_keys:
+                self.core.add_dependency(
+                    self.distributions,
+                    self.core.Requirement(
+                        typing.cast('deptree._core.ProjectKey', project_key),
+                        typing.cast(
+                            'deptree._core.ProjectKey',
+                            dependency_key,
+                        ),
+                        typing.cast('deptree._core.Extras', ()),
+                        dependency_key,
+                    ),
+                )
+
+    def _display(
+        self,
+        project_key: str,
+        is_reverse: bool,
+        output_format: str = 'text',
+    ) -> str:
+        options = self.core.Options(
+            is_compact=True,
+            is_reverse=is_reverse,
+            output_format=output_format,
+        )
+        return self._display_with_options(project_key, options)
+
+    def _display_with_options(
+        self,
+        project_key: str,
+        options: deptree._core.Options,
+    ) -> str:
+        preselection = typing.cast('deptree._core.Selection', {})
+        preselection[typing.cast('deptree._core.ProjectKey', project_key)] = (
+            self.core.make_requirement(
+                typing.cast('deptree._core.ProjectKey', project_key),
+                options.is_reverse,
+            )
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.core.main(self.distributions, preselection, options)
+        return output.getvalue()
+
+    def test_display_forward_compact(self) -> None:
+        """Subtree of a dependency should be displayed only once."""
+        expected_output = (
+            'a==1  # a\n'
+            '  b==1  # b\n'
+            '    d==1  # d\n'
+            '      e==1  # e\n'
+            '  c==1  # c\n'
+            '    d  # !!! SEE ABOVE d\n'
+        )
+        self.assertEqual(self._display('a', False), expected_output)
+
+    def test_display_reverse_compact(self) -> None:
+        """Subtree of a dependent should be displayed only once."""
+        expected_output = (
+            'e==1  # -\n'
+            '  d==1  # e\n'
+            '    b==1  # d\n'
+            '      a==1  # b\n'
+            '    c==1  # d\n'
+            '      a==1  # c\n'
+        )
+        self.assertEqual(self._display('e', True), expected_output)
+
+    def test_display_pruned(self) -> None:
+        """Excluded projects and projects below the depth should be hidden."""
+        options = self.core.Options(excluded_patterns=('[c]', ), max_depth=2)
+        expected_output = ('a==1  # a\n'
+                           '  b==1  # b\n'
+                           '    d==1  # d\n')
+        self.assertEqual(
+            self._display_with_options('a', options),
+            expected_output,
+        )
+        options = self.core.Options(excluded_patterns=('B', ), is_flat=True)
+        expected_output = (
+            'a==1\n'
+            '# c\n'
+            '\n'
+            'c==1\n'
+            '# d\n'
+            '\n'
+            'd==1\n'
+            '# e\n'
+            '\n'
+            'e==1\n'
+            '\n'
+        )
+        self.assertEqual(
+            self._display_with_options('a', options),
+            expected_output,
+        )
+
+    def test_display_json(self) -> None:
+        """Tree should be nested, with the status of each project."""
+        output = typing.cast(
+            typing.List[typing.Dict[str, object]],
+            json.loads(self._display('b', False, 'json')),
+        )
+        expected_output: typing.List[typing.Dict[str, object]] = [
+            {
+                'key':
+                'b',
+                'project':
+                'b',
+                'version':
+                '1',
+                'status':
+                'found',
+                'requirement':
+                'b',
+                'dependencies': [
+                    {
+                        'key':
+                        'd',
+                        'project':
+                        'd',
+                        'version':
+                        '1',
+                        'status':
+                        'found',
+                        'requirement':
+                        'd',
+                        'dependencies': [
+                            {
+                                'key': 'e',
+                                'project': 'e',
+                                'version': '1',
+                                'status': 'found',
+                                'requirement': 'e',
+                                'dependencies': [],
+                            }
+                        ],
+                    }
+                ],
+            }
+        ]
+        self.assertEqual(output, expected_output)
+
+    def test_display_ndjson(self) -> None:
+        """Each project should be on its own line, with its parent."""
+        lines = self._display('a', False, 'ndjson').splitlines()
+        records = [
+            typing.cast(typing.Dict[str, object], json.loads(line))
+            for line in lines
+        ]
+        parents = [(record['key'], record['parent']) for record in records]
+        expected_parents = [
+            ('a', None),
+            ('b', 'a'),
+            ('d', 'b'),
+            ('e', 'd'),
+            ('c', 'a'),
+            ('d', 'c'),
+        ]
+        self.assertEqual(parents, expected_parents)
+        self.assertEqual(records[-1]['status'], 'repeated')
+
+
+class _ClosedStream(io.StringIO):
+    """Stream whose reader is gone."""
+
+    def write(self, text: str) -> int:
+        """Fail to write."""
+        raise BrokenPipeError
+
+
+class TestOutput(unittest.TestCase):
+    """Buffered writing of the rendered lines."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.output = (
+            # pylint: disable=protected-access
+            deptree._output
+        )
+        self.consumed_count = 0
+
+    def _make_lines(self, count: int) -> typing.Iterator[str]:
+        for index in range(count):
+            self.consumed_count += 1
+            yield str(index)
+
+    def test_write_lines(self) -> None:
+        """All lines should be written, each on its own line."""
+        stream = io.StringIO()
+        count = self.output.BUFFER_SIZE
+        is_complete = self.output.write_lines(self._make_lines(count), stream)
+        self.assertTrue(is_complete)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), count)
+        self.assertEqual(lines[-1], str(count - 1))
+
+    def test_write_lines_closed(self) -> None:
+        """Lines should not be consumed after the reader is gone."""
+        count = self.output.BUFFER_SIZE
+        stream = _ClosedStream()
+        is_complete = self.output.write_lines(self._make_lines(count), stream)
+        self.assertFalse(is_complete)
+        self.assertLess(self.consumed_count, count)
+
+
+class TestTimings(unittest.TestCase):
+    """Wall time of the phases and counters."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.timings = (
+            # pylint: disable=protected-access
+            deptree._timings
+        )
+        self.recorder = (
+            # pylint: disable=protected-access
+            self.timings._RECORDER
+        )
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.recorder.counts.clear()
+        self.recorder.durations.clear()
+        self.recorder.is_enabled = False
+
+    def test_disabled(self) -> None:
+        """Nothing should be recorded unless enabled."""
+        with self.timings.phase('phase'):
+            self.timings.count('counter')
+        self.assertFalse(self.recorder.counts)
+        self.assertFalse(self.recorder.durations)
+
+    def test_enabled(self) -> None:
+        """Phases should add up, and be reported in order of entry."""
+        self.timings.enable()
+        for _ in range(2):
+            with self.timings.phase('outer'):
+                with self.timings.phase('inner'):
+                    self.timings.count('counter', 3)
+        expected_names = ('outer', 'inner')
+        self.assertEqual(' '.join(self.recorder.durations), 'outer inner')
+        self.assertEqual(self.recorder.counts.get('counter'), 6)
+        stream = io.StringIO()
+        self.timings.report(stream)
+        lines = stream.getvalue().splitlines()
+        names = tuple(line.split(' ')[0] for line in lines[1:3])
+        self.assertEqual(names, expected_names)
+
+
+def _import(statement: str) -> str:
+    """Run the statement in a new interpreter, get the import times."""
+    completed_process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return completed_process.stderr
+
+
+class TestStartup(unittest.TestCase):
+    """Import of the command line interface."""
+
+    def test_lazy_imports(self) -> None:
+        """Only light modules should be imported before parsing."""
+        statement = (
+            "import sys, deptree.cli; "
+            "print(*sys.modules, sep='\\n', file=sys.stderr)"
+        )
+        module_names = _import(statement).splitlines()
+        for module_name in (
+            'deptree._core',
+            'importlib_metadata',
+            'multiprocessing',
+            'packaging',
+            'pkg_resources',
+        ):
+            self.assertNotIn(module_name, module_names)
+
+    def test_import_time_budget(self) -> None:
+        """Importing should take less time than the budget."""
+        lines = _import('import deptree.cli').splitlines()
+        # Cumulative time in microseconds of the last top level import
+        microseconds = int(lines[-1].split('|')[1])
+        self.assertLess(microseconds / 1000000, IMPORT_TIME_BUDGET)
+
+
+class TestImportlibMetadata(unittest.TestCase):
+    """Implementation based on ``importlib.metadata``."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.backend = (
+            # pylint: disable=protected-access
+            deptree._importlib_metadata
+        )
+
+    def test_format_requirement(self) -> None:
+        """Requirement should be formatted as by ``pkg_resources``."""
+        requirement_ = packaging.requirements.Requirement(
+            'Foo.Bar[B_ar,a] (>=1.0,!=1.5); os.name == "posix"',
+        )
+        self.assertEqual(
+            # pylint: disable-next=protected-access
+            self.backend._format_requirement(requirement_),
+            'Foo.Bar[a,b_ar]!=1.5,>=1.0; os_name == "posix"',
+        )
+        self.assertEqual(
+            # pylint: disable-next=protected-access
+            self.backend._get_project_key(requirement_),
+            'foo.bar',
+        )
+
+    def test_version_key(self) -> None:
+        """Metadata paths should be sorted by descending version."""
+        paths = [
+            'bar',
+            'foo',
+            'Python-2.7.2.egg',
+            'Python-2.7.10.egg',
+            'Setuptools-1.2.3b1.egg',
+        ]
+        paths.sort(
+            # pylint: disable-next=protected-access
+            key=self.backend._get_version_key,
+            reverse=True,
+        )
+        expected_paths = [
+            'Python-2.7.10.egg',
+            'Python-2.7.2.egg',
+            'Setuptools-1.2.3b1.egg',
+            'bar',
+            'foo',
+        ]
+        self.assertEqual(paths, expected_paths)
+
+    def test_egg_entries(self) -> None:
+        """Eggs should be found only as ``sys.path`` entries, unzipped."""
+        with tempfile.TemporaryDirectory() as directory_path:
+            site_path = os.path.join(directory_path, 'site')
+            project_path = os.path.join(directory_path, 'foo')
+            egg_path = os.path.join(directory_path, 'Bar-1.0.egg')
+            zipped_egg_path = os.path.join(directory_path, 'Baz-1.0.egg')
+            metadata_paths = [
+                os.path.join(site_path, 'Qux-1.0.egg', 'EGG-INFO'),
+                os.path.join(project_path, 'foo.egg-info'),
+                os.path.join(egg_path, 'EGG-INFO'),
+            ]
+            for path in metadata_paths:
+                os.makedirs(path)
+                with open(
+                    os.path.join(path, 'PKG-INFO'),
+                    'w',
+                    encoding='utf_8',
+                ):
+                    pass
+            # Develop install, the project is found through its own entry
+            with open(
+                os.path.join(site_path, 'foo.egg-link'),
+                'w',
+                encoding='utf_8',
+            ) as file_:
+                file_.write(f'{project_path}\n.\n')
+            with open(zipped_egg_path, 'wb'):
+                pass
+            path_items = [site_path, project_path, egg_path, zipped_egg_path]
+            base_names: typing.List[str] = []
+            for path_item in path_items:
+                base_names.extend(
+                    metadata_path[0] for metadata_path in
+                    self.backend.find_metadata_paths(path_item)
+                )
+        expected_base_names = ['foo.egg-info', 'Bar-1.0.egg']
+        self.assertEqual(base_names, expected_base_names)
+
+    def test_read_metadata_header(self) -> None:
+        """Only the header of the metadata should be read."""
+        content = (
+            b'Name: Foo\r\n'
+            b'Requires-Dist: bar\r\n'
+            b'Summary: Long\r\n'
+            b'  summary\r\n'
+            b'\r\n'
+            b'Requires-Dist: baz\r\n'
+        )
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'METADATA')
+            with open(file_path, 'wb') as file_:
+                file_.write(content)
+            # pylint: disable-next=protected-access
+            metadata = self.backend._read_metadata(file_path)
+            # pylint: disable-next=protected-access
+            missing_metadata = self.backend._read_metadata(directory_path)
+        self.assertEqual(len(metadata), 3)
+        self.assertEqual(metadata['Requires-Dist'], 'bar')
+        self.assertEqual(metadata['Summary'], 'Long\r\n  summary')
+        self.assertEqual(len(missing_metadata), 0)
+
+    def test_transitive_extras(self) -> None:
+        """Extras required by dependencies should be applied, once each."""
+        metadata = {
+            'alpha': ['beta[x]'],
+            'beta': [
+                'gamma[y]; extra == "x"',
+                'epsilon; extra == "z"',
+            ],
+            'gamma': [
+                'beta[x]; extra == "y"',
+                'delta; extra == "y"',
+            ],
+            'delta': [],
+        }
+        with tempfile.TemporaryDirectory() as directory_path:
+            for (name, requirements) in metadata.items():
+                dist_info_path = os.path.join(
+                    directory_path,
+                    f'{name}-1.0.dist-info',
+                )
+                os.mkdir(dist_info_path)
+                lines = [f'Name: {name}', 'Version: 1.0']
+                lines.extend(f'Provides-Extra: {extra}' for extra in 'xyz')
+                lines.extend(f'Requires-Dist: {item}' for item in requirements)
+                with open(
+                    os.path.join(dist_info_path, 'METADATA'),
+                    'w',
+                    encoding='utf_8',
+                ) as file_:
+                    file_.write('\n'.join(lines) + '\n')
+            distributions = self.backend.discover_distributions(
+                typing.cast('deptree._core.Selection', {}),
+                None,
+                [directory_path],
+            )
+        dependencies = {}
+        for name in metadata:
+            node_id = distributions.get_id(
+                typing.cast('deptree._core.ProjectKey', name),
+            )
+            assert node_id is not None
+            dependencies[name] = sorted(
+                distributions.get_key(distributions.get_dependency_id(edge))
+                for edge in distributions.get_dependencies_edges(node_id)
+            )
+        expected_dependencies = {
+            'alpha': ['beta'],
+            'beta': ['gamma'],
+            'gamma': ['beta', 'delta'],
+            'delta': [],
+        }
+        self.assertEqual(dependencies, expected_dependencies)
+
+    def test_malformed_cached_record(self) -> None:
+        """Metadata should be read again if the cached record is malformed."""
+        records: typing.List[typing.List[object]] = [
+            ['foo'],
+            ['foo', '1.0', {}],
+            ['foo', '1.0', []],
+            ['foo', '1.0', [[None, [['bar']]]]],
+            ['foo', '1.0', [[None, [['bar', 'x', 'bar', '']]]]],
+        ]
+        with tempfile.TemporaryDirectory() as directory_path:
+            dist_info_path = os.path.join(directory_path, 'foo-1.0.dist-info')
+            os.mkdir(dist_info_path)
+            with open(
+                os.path.join(dist_info_path, 'METADATA'),
+                'w',
+                encoding='utf_8',
+            ) as file_:
+                file_.write('Name: foo\nVersion: 1.0\nRequires-Dist: bar\n')
+            metadata_paths = list(
+                self.backend.find_metadata_paths(directory_path),
+            )
+            (_, metadata_path, stamp) = metadata_paths[0]
+            for record in records:
+                # pylint: disable-next=protected-access
+                cache = deptree._cache.MetadataCache(None)
+                cache.set(metadata_path, stamp, record)
+                distributions = self.backend.discover_distributions(
+                    typing.cast('deptree._core.Selection', {}),
+                    cache,
+                    [directory_path],
+                )
+                node_id = distributions.get_id(
+                    typing.cast('deptree._core.ProjectKey', 'foo'),
+                )
+                assert node_id is not None
+                edges = list(distributions.get_dependencies_edges(node_id))
+                self.assertEqual(len(edges), 1)
+                dependency_id = distributions.get_dependency_id(edges[0])
+                self.assertEqual(distributions.get_key(dependency_id), 'bar')
+                self.assertNotEqual(cache.get(metadata_path, stamp), record)
+
+
+class TestMarkers(unittest.TestCase):
+    """Memoized parsing of the requirements and evaluation of the markers."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.markers = (
+            # pylint: disable=protected-access
+            deptree._markers
+        )
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.markers.set_target_environment(None)
+
+    def test_parse_requirement(self) -> None:
+        """The same requirement string should be parsed only once."""
+        requirement_ = self.markers.parse_requirement('foo>=1; extra == "a"')
+        self.assertIs(
+            self.markers.parse_requirement('foo>=1; extra == "a"'),
+            requirement_,
+        )
+
+    def test_target_environment(self) -> None:
+        """Markers should be evaluated for the target environment."""
+        marker = 'sys_platform == "win32" and extra == "a"'
+        self.markers.set_target_environment({'sys_platform': 'linux'})
+        self.assertFalse(self.markers.is_satisfied(marker, 'a'))
+        self.markers.set_target_environment({'sys_platform': 'win32'})
+        self.assertTrue(self.markers.is_satisfied(marker, 'a'))
+        self.assertFalse(self.markers.is_satisfied(marker))
+        self.assertFalse(self.markers.is_satisfied('sys_platform ==='))
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'environment.json')
+            with open(file_path, 'w', encoding='utf_8') as file_:
+                file_.write('{"python_version": 3.8}')
+            with self.assertRaises(ValueError):
+                self.markers.read_target_environment(file_path)
+
+
+class TestEnvironments(unittest.TestCase):
+    """Scan of several environments."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.core = (
+            # pylint: disable=protected-access
+            deptree._core
+        )
+        self.environments = (
+            # pylint: disable=protected-access
+            deptree._environments
+        )
+        self.get_path_items = (
+            # pylint: disable=protected-access
+            deptree._environments._get_path_items
+        )
+
+    def test_get_path_items(self) -> None:
+        """Directories of distributions of an environment should be found."""
+        with tempfile.TemporaryDirectory() as directory_path:
+            site_path = os.path.join(
+                directory_path,
+                'lib',
+                'python3.11',
+                'site-packages',
+            )
+            os.makedirs(site_path)
+            expected_path_items: typing.List[str] = [site_path]
+            self.assertEqual(
+                self.get_path_items(directory_path),
+                expected_path_items,
+            )
+            self.assertEqual(
+                self.get_path_items(site_path),
+                expected_path_items,
+            )
+
+    def test_invalid_environment(self) -> None:
+        """Path that is not a directory should be rejected before any scan."""
+        options = self.core.Options()
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'file')
+            with open(file_path, 'w', encoding='utf_8'):
+                pass
+            for path in (file_path, os.path.join(directory_path, 'missing')):
+                with self.assertRaises(self.environments.InvalidEnvironment):
+                    self.environments.main(
+                        [directory_path, path],
+                        [],
+                        options,
+                        False,
+                    )
+
+
+class TestMetadataCache(unittest.TestCase):
+    """Cache of the metadata of the installed distributions."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.metadata_cache_class = (
+            # pylint: disable=protected-access
+            deptree._cache.MetadataCache
+        )
+        self.shared_records_class = (
+            # pylint: disable=protected-access
+            deptree._cache.SharedRecords
+        )
+
+    def test_round_trip(self) -> None:
+        """Record should be valid only as long as the stamp is unchanged."""
+        record = ['foo', '1.0']
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'cache.json')
+            cache = self.metadata_cache_class(file_path)
+            cache.load()
+            self.assertIsNone(cache.get('foo.dist-info', (1, 2)))
+            cache.set('foo.dist-info', (1, 2), record)
+            cache.save()
+            #
+            cache = self.metadata_cache_class(file_path)
+            cache.load()
+            self.assertEqual(cache.get('foo.dist-info', (1, 2)), record)
+            self.assertIsNone(cache.get('foo.dist-info', (1, 3)))
+
+    def test_invalid_file(self) -> None:
+        """Cache file not as expected should be an empty cache."""
+        record = ['foo', '1.0']
+        texts = [
+            'not JSON',
+            '[]',
+            '{"version": 1, "entries": []}',
+            '{"version": 1, "entries": {"foo.dist-info": [[1, 2]]}}',
+            '{"version": 1, "entries": {"foo.dist-info": [1, ["foo"]]}}',
+            '{"version": 1, "entries": {"foo.dist-info": [[1, "2"], []]}}',
+        ]
+        with tempfile.TemporaryDirectory() as directory_path:
+            file_path = os.path.join(directory_path, 'cache.json')
+            for text in texts:
+                with open(file_path, 'w', encoding='utf_8') as file_:
+                    file_.write(text)
+                cache = self.metadata_cache_class(file_path)
+                cache.load()
+                self.assertIsNone(cache.get('foo.dist-info', (1, 2)))
+                cache.set('foo.dist-info', (1, 2), record)
+                cache.save()
+                #
+                cache = self.metadata_cache_class(file_path)
+                cache.load()
+                self.assertEqual(cache.get('foo.dist-info', (1, 2)), record)
+
+    def test_shared(self) -> None:
+        """Records should be shared by content, fetched and updated at once."""
+        record = ['foo', '1.0']
+        shared_records = self.shared_records_class()
+        cache = self.metadata_cache_class(None, shared_records)
+        cache.fetch_shared({'a/foo.dist-info': 'foo-key'})
+        self.assertIsNone(cache.get_shared('a/foo.dist-info'))
+        cache.set_shared('a/foo.dist-info', record)
+        self.assertEqual(len(shared_records), 0)
+        cache.save()
+        #
+        content_keys = {
+            'b/foo.dist-info': 'foo-key',
+            'b/bar.dist-info': 'bar-key',
+        }
+        cache = self.metadata_cache_class(None, shared_records)
+        cache.fetch_shared(content_keys)
+        self.assertEqual(cache.get_shared('b/foo.dist-info'), record)
+        self.assertIsNone(cache.get_shared('b/bar.dist-info'))
+        self.assertIsNone(cache.get_shared('b/baz.dist-info'))
+
+    def test_in_memory(self) -> None:
+        """Records not used since the last save should be dropped."""
+        record = ['foo', '1.0']
+        cache = self.metadata_cache_class(None)
+        cache.load()
+        cache.set('foo.dist-info', (1, 2), record)
+        cache.save()
+        self.assertEqual(cache.get('foo.dist-info', (1, 2)), record)
+        cache.save()
+        cache.save()
+        self.assertIsNone(cache.get('foo.dist-info', (1, 2)))
+
+
+class TestWatch(unittest.TestCase):
+    """Display again each time the installed distributions change."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.get_changed_directories = (
+            # pylint: disable=protected-access
+            deptree._watch._get_changed_directories
+        )
+
+    def test_changed_directories(self) -> None:
+        """Only the directories of the events should be scanned again."""
+        watches = {1: 'foo', 2: 'bar', 3: 'baz'}
+        # Watch descriptor, mask, and name padded with null bytes
+        events = [
+            (1, 0x100, b'a.dist-info\0'),
+            (3, 0x200, b''),
+            (1, 0x200, b'b.dist-info\0'),
+        ]
+        data = b''.join(
+            struct.pack('iIII', watch, mask, 0, len(name)) + name
+            for (watch, mask, name) in events
+        )
+        expected_directories: typing.Set[str] = {'foo', 'baz'}
+        self.assertEqual(
+            self.get_changed_directories(data, watches),
+            expected_directories,
+        )
+        # Events lost, the directories that changed are not known
+        data += struct.pack('iIII', -1, 0x4000, 0, 0)
+        self.assertIsNone(self.get_changed_directories(data, watches))
+
+
+class TestProjectsList(unittest.TestCase):
+    """List of the projects to show, read from a file or standard input."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        # pylint: disable-next=protected-access
+        self.read_projects = deptree.cli._read_projects
+
+    def test_read_projects(self) -> None:
+        """Empty lines and comments should be ignored."""
+        file_ = io.StringIO("# Advisory\nsix\n\n  Foo[bar]>=1 \n")
+        projects = self.read_projects(file_)
+        expected_projects: typing.List[str] = ['six', 'Foo[bar]>=1']
+        self.assertEqual(projects, expected_projects)
+
+
 # EOF